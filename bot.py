@@ -4,37 +4,98 @@ Bot canggih untuk mendownload video, audio, dan gambar dari berbagai platform
 """
 
 import os
+import html
+import math
 import asyncio
 import logging
-from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+import contextlib
+from collections import Counter
+from typing import Dict, Optional
+from telegram import (
+    Bot, Update, InlineQueryResultArticle, InputTextMessageContent,
+    InlineQueryResultCachedAudio, InlineQueryResultCachedDocument,
+    InlineQueryResultCachedPhoto, InlineQueryResultCachedVideo, InlineQueryResultsButton,
+    InputMediaAudio, InputMediaPhoto, InputMediaVideo
+)
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     ContextTypes,
     filters
 )
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
 
 from config import (
     BOT_TOKEN, WELCOME_MESSAGE, HELP_MESSAGE, ABOUT_MESSAGE,
-    ADMIN_IDS, MAX_FILE_SIZE, SUPPORTED_PLATFORMS
+    ADMIN_IDS, MAX_FILE_SIZE, MAX_VIDEO_DURATION, SUPPORTED_PLATFORMS,
+    BOT_MODE, BOT_ROLE, LOCAL_BOT_API_URL, LOCAL_MODE, UPLOAD_READ_TIMEOUT, UPLOAD_WRITE_TIMEOUT,
+    BATCH_INFO_CONCURRENCY, BATCH_MAX_ITEMS, BATCH_PARALLEL,
+    INLINE_CACHE_TIME, INLINE_DEBOUNCE, INLINE_WARMUP_CHAT_ID, INLINE_WARMUP_WORKERS,
+    PROGRESS_EDIT_INTERVAL
 )
 from keyboards import (
     get_main_keyboard, get_platform_keyboard, get_download_options_keyboard,
     get_quality_keyboard, get_cancel_keyboard, get_admin_keyboard,
-    get_close_keyboard
+    get_close_keyboard, get_job_keyboard, get_batch_keyboard
 )
+from cache import FileIdCache
 from downloader import MediaDownloader
+from executor import JobCancelled, SingleFlight
+from formats import MediaRejected
+from instagram import peek_pool as peek_instagram_pool
+from jobqueue import DownloadQueue, JobExists, QueueFull, SharedJobQueue
+from platforms import LinkResolver, detect_platform, is_playlist_url, media_id
+from pipeline import get_pipeline
+from progress import StatusUpdater
+from ratelimit import RateLimiter
+from sessions import CallbackSessions
+from upload import UploadBudget, build_request, upload_file, upload_media_group
+from webhook import serve_webhook
 from utils import (
     ensure_directories, format_size, format_duration, is_valid_url,
-    truncate_text, get_platform_icon, StatsManager, logger
+    truncate_text, get_platform_icon, progress_bar, StatsManager, logger,
+    wait_for_shutdown, extract_urls
 )
 
 # Inisialisasi
 downloader = MediaDownloader()
 stats_manager = StatsManager()
+file_id_cache = FileIdCache()
+download_flights = SingleFlight(on_release=lambda result: downloader.release(*result))
+# Batch yang sedang berjalan: job_id -> {'items': [...], 'cancelled': Event}
+running_batches: Dict[str, dict] = {}
+
+def cancel_running_job(job_id: str) -> bool:
+    """Batalkan job yang sedang berjalan, termasuk semua download di dalam batch"""
+    cancelled = download_flights.cancel(job_id)
+    batch = running_batches.get(job_id)
+    if batch is not None:
+        batch['cancelled'].set()
+        for index in range(len(batch['items'])):
+            cancelled = download_flights.cancel(f"{job_id}:{index}") or cancelled
+    return cancelled
+
+if BOT_ROLE == 'all':
+    download_queue = DownloadQueue(on_cancel=cancel_running_job)
+else:
+    # Front dan worker berbagi journal; hanya worker yang menjalankan job
+    download_queue = SharedJobQueue(consume=BOT_ROLE == 'worker', on_cancel=cancel_running_job)
+callback_sessions = CallbackSessions()
+link_resolver = LinkResolver()
+rate_limiter = RateLimiter()
+# Inline mode: query terakhir per user (debounce) dan warm-up link yang sedang berjalan
+inline_latest: Dict[int, str] = {}
+inline_warmups: Dict[str, asyncio.Task] = {}
+inline_errors: Dict[str, str] = {}
+inline_warmup_slots = asyncio.Semaphore(INLINE_WARMUP_WORKERS)
+upload_budget = UploadBudget()
+
+# Batas item per send_media_group dari Telegram
+MEDIA_GROUP_SIZE = 10
 
 # Banner URL (ganti dengan URL banner Anda atau gunakan local)
 BANNER_URL = "https://via.placeholder.com/800x300/0088cc/ffffff?text=📥+MediaDown+Bot"
@@ -63,7 +124,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler command /help"""
     await update.message.reply_text(
-        HELP_MESSAGE,
+        HELP_MESSAGE.format(max_file_size=format_size(MAX_FILE_SIZE), batch_max_items=BATCH_MAX_ITEMS),
         parse_mode=ParseMode.HTML,
         reply_markup=get_main_keyboard()
     )
@@ -92,6 +153,30 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     downloads, users = stats_manager.get_stats()
+    breakdown = '\n'.join(
+        f"{get_platform_icon(platform)} {platform.title()} ({download_type}): {count}"
+        for platform, download_type, count in stats_manager.get_download_breakdown()[:10]
+    ) or '-'
+    # Pool dibuat saat download Instagram pertama; login tidak dijalankan dari /stats
+    instagram_pool = peek_instagram_pool()
+    instagram_accounts = '\n'.join(
+        f"• {account['name']}: sisa {account['remaining']}/jam"
+        + (' (sibuk)' if account['busy'] else '')
+        + (' (kena limit)' if account['cooling'] else '')
+        for account in (instagram_pool.status() if instagram_pool else [])
+    ) or '-'
+    ffmpeg_jobs = '\n'.join(
+        f"• {mode}: {count} job, rata-rata {seconds:.1f} detik"
+        for mode, (count, seconds) in downloader.processor.summary().items()
+    ) or '-'
+    fetch = downloader.fetcher.summary()
+    limits = rate_limiter.summary()
+    limited = ', '.join(f"{scope} {count}" for scope, count in limits['limited'].items()) or '-'
+    pipeline_stages = '\n'.join(
+        f"• {name}: {depth['active']}/{depth['workers']} aktif, {depth['waiting']} menunggu, "
+        f"{depth['completed']} selesai (rata-rata {depth['average']:.1f} detik)"
+        for name, depth in get_pipeline().depths().items()
+    )
     
     stats_text = f"""
 <b>📊 Statistik Bot</b>
@@ -100,10 +185,58 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 📥 Total Downloads: {downloads}
 📱 Platform Aktif: {len(SUPPORTED_PLATFORMS)}
 
+<b>📈 Download per Platform:</b>
+{breakdown}
+
 <b>🖥️ Server Status:</b>
 ✅ Bot Online
 ✅ Download Service: Active
 ✅ Database: Connected
+
+<b>⚙️ Worker Pool:</b>
+🔧 Mode: {downloader.executor.mode} ({downloader.executor.max_workers} worker)
+⏳ Job Aktif: {downloader.executor.active_jobs()}
+🔗 Request Digabung: {download_flights.coalesced}
+📋 Antrian: {download_queue.queued()} menunggu, {download_queue.running()} berjalan
+📤 Upload In-flight: {format_size(upload_budget.in_flight)}
+🔑 Sesi Callback: {len(callback_sessions)}
+
+<b>🏭 Pipeline:</b>
+{pipeline_stages}
+
+<b>🚦 Rate Limit:</b>
+✅ Diizinkan: {limits['allowed']} (+{limits['exempted']} admin)
+⛔ Ditolak: {limited}
+🪣 Bucket Aktif: {limits['buckets']}
+
+<b>🗂 Info Cache:</b>
+📦 Entry: {len(downloader.info_cache)}
+🎯 Hit/Miss: {downloader.info_cache.hits}/{downloader.info_cache.misses}
+
+<b>♻️ File ID Cache:</b>
+📦 Media Tersimpan: {len(file_id_cache)}
+🎯 Hit/Miss: {file_id_cache.hits}/{file_id_cache.misses}
+
+<b>💾 Cache Disk:</b>
+📦 {len(downloader.storage)} file, {format_size(downloader.storage.used)} / {format_size(downloader.storage.max_bytes)}
+🎯 Hit/Miss: {downloader.storage.hits}/{downloader.storage.misses}
+💰 Hemat Download: {format_size(downloader.storage.bytes_saved)}
+🧹 Tergusur: {downloader.storage.evictions}
+
+<b>🎞 FFmpeg ({downloader.processor.executor.max_workers} worker):</b>
+{ffmpeg_jobs}
+
+<b>⚡ Fetch Langsung ({downloader.fetcher.connections} koneksi/file):</b>
+📦 {fetch['files']} file, {format_size(fetch['bytes'])} ({format_size(fetch['speed'])}/detik)
+🔁 Dilanjutkan: {format_size(fetch['resumed'])}
+↩️ Fallback yt-dlp: {fetch['fallbacks']}
+
+<b>📸 Akun Instagram:</b>
+{instagram_accounts}
+
+<b>🔗 Link Pendek:</b>
+📦 Tersimpan: {len(link_resolver)}
+🎯 Hit/Miss: {link_resolver.hits}/{link_resolver.misses}
     """
     
     await update.message.reply_text(
@@ -112,11 +245,25 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=get_admin_keyboard()
     )
 
+def rate_limit_text(retry_after: float) -> str:
+    """Pesan untuk user yang terkena rate limit"""
+    return (
+        "⏳ <b>Terlalu banyak permintaan!</b>\n\n"
+        f"Coba lagi dalam {math.ceil(retry_after)} detik."
+    )
+
 async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk URL yang dikirim user"""
-    url = update.message.text.strip()
+    text = update.message.text.strip()
+    urls = extract_urls(text)
     user = update.effective_user
     
+    # Banyak link sekaligus atau link playlist diproses sebagai satu batch
+    if len(urls) > 1 or urls and is_playlist_url(urls[0]):
+        await handle_batch(update, urls)
+        return
+    url = urls[0] if urls else text
+    
     # Validasi URL
     if not is_valid_url(url):
         await update.message.reply_text(
@@ -127,17 +274,30 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    # Deteksi platform
-    platform = downloader.detect_platform(url)
+    # Bucket user dan chat dicek (tanpa dipotong) sebelum resolve: link pendek sudah memicu request keluar
+    retry_after = rate_limiter.peek(user.id, update.effective_chat.id)
+    if retry_after:
+        await update.message.reply_text(rate_limit_text(retry_after), parse_mode=ParseMode.HTML)
+        return
+    
+    # Kanonikalisasi URL (buang tracking, ikuti link pendek) lalu deteksi platform
+    url = await link_resolver.resolve(url)
+    platform = detect_platform(url)
     
     if not platform:
         await update.message.reply_text(
             "❌ <b>Platform tidak didukung!</b>\n\n"
-            "Bot mendukung: YouTube, Instagram, TikTok, Twitter, Facebook, Reddit, Pinterest, SoundCloud",
+            f"Bot mendukung: {', '.join(name.title() for name in SUPPORTED_PLATFORMS)}",
             parse_mode=ParseMode.HTML
         )
         return
     
+    # Setiap link baru memicu ekstraksi info ke platform sumber
+    retry_after = rate_limiter.check(user.id, update.effective_chat.id, platform)
+    if retry_after:
+        await update.message.reply_text(rate_limit_text(retry_after), parse_mode=ParseMode.HTML)
+        return
+    
     # Kirim pesan processing
     processing_msg = await update.message.reply_text(
         f"{get_platform_icon(platform)} <b>Mendeteksi link {platform.title()}...</b>\n"
@@ -168,10 +328,25 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
 <b>Pilih opsi download:</b>
         """
         
+        if info['duration'] and info['duration'] > MAX_VIDEO_DURATION:
+            info_text += (
+                f"\n⚠️ Durasi melebihi batas {format_duration(MAX_VIDEO_DURATION)}, "
+                f"media ini tidak bisa didownload."
+            )
+        
+        # Tombol memakai token sesi (URL panjang tidak muat di callback_data 64 byte)
+        token = callback_sessions.create(
+            url=url,
+            platform=platform,
+            media_key=media_id(url),
+            chat_id=update.effective_chat.id,
+            info=info
+        )
+        
         await processing_msg.edit_text(
             info_text,
             parse_mode=ParseMode.HTML,
-            reply_markup=get_download_options_keyboard(url, platform)
+            reply_markup=get_download_options_keyboard(token, platform)
         )
         
     except Exception as e:
@@ -181,6 +356,104 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode=ParseMode.HTML
         )
 
+async def handle_batch(update: Update, urls: list):
+    """Handler untuk banyak link dalam satu pesan (atau playlist)"""
+    retry_after = rate_limiter.check(
+        update.effective_user.id, update.effective_chat.id, cost=len(urls[:BATCH_MAX_ITEMS])
+    )
+    if retry_after:
+        await update.message.reply_text(rate_limit_text(retry_after), parse_mode=ParseMode.HTML)
+        return
+    
+    processing_msg = await update.message.reply_text(
+        f"📚 <b>Memproses {len(urls)} link...</b>\n"
+        "⏳ Mohon tunggu sebentar...",
+        parse_mode=ParseMode.HTML
+    )
+    
+    try:
+        urls = await asyncio.gather(*(link_resolver.resolve(url) for url in urls[:BATCH_MAX_ITEMS]))
+        items, skipped = await collect_batch_items(urls)
+    except Exception as e:
+        logger.error(f"Error processing batch: {e}")
+        await processing_msg.edit_text(
+            f"❌ <b>Terjadi kesalahan:</b>\n<code>{html.escape(str(e))}</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    
+    lines = [f"<b>📚 Batch {len(items)} media</b>", ""]
+    for number, item in enumerate(items, 1):
+        duration = f" ({format_duration(item['duration'])})" if item['duration'] else ""
+        lines.append(
+            f"{number}. {get_platform_icon(item['platform'])} "
+            f"{html.escape(truncate_text(item['title'], 40))}{duration}"
+        )
+    if skipped:
+        lines += ["", f"⚠️ <b>Dilewati ({len(skipped)}):</b>"]
+        lines += [
+            f"• {html.escape(truncate_text(label, 40))} — {html.escape(truncate_text(reason, 60))}"
+            for label, reason in skipped[:10]
+        ]
+    
+    if not items:
+        await processing_msg.edit_text('\n'.join(lines[2:]), parse_mode=ParseMode.HTML)
+        return
+    
+    token = callback_sessions.create(
+        url='\n'.join(item['url'] for item in items),
+        platform='batch',
+        media_key='',
+        chat_id=update.effective_chat.id
+    )
+    lines += ["", "<b>Pilih format untuk semua media:</b>"]
+    await processing_msg.edit_text(
+        '\n'.join(lines),
+        parse_mode=ParseMode.HTML,
+        reply_markup=get_batch_keyboard(token)
+    )
+
+async def collect_batch_items(urls: list) -> tuple:
+    """
+    Flatten playlist dan ambil info tiap link secara paralel.
+    Return (items, skipped): item unik maksimal BATCH_MAX_ITEMS, dan
+    (label, alasan) untuk link yang tidak bisa diproses.
+    """
+    semaphore = asyncio.Semaphore(BATCH_INFO_CONCURRENCY)
+    
+    async def expand(url: str) -> tuple:
+        platform = detect_platform(url)
+        if not platform:
+            return [], [(url, "platform tidak didukung")]
+        async with semaphore:
+            if is_playlist_url(url):
+                try:
+                    entries = await downloader.expand_playlist(url)
+                except Exception as e:
+                    return [], [(url, str(e))]
+                return [{**entry, 'platform': detect_platform(entry['url']) or platform} for entry in entries], []
+            info = await downloader.get_info(url)
+        if 'error' in info:
+            return [], [(url, info['error'])]
+        return [{'url': url, 'platform': platform, 'title': info['title'], 'duration': info['duration']}], []
+    
+    items, skipped, seen = [], [], set()
+    for found, errors in await asyncio.gather(*(expand(url) for url in urls)):
+        skipped.extend(errors)
+        for item in found:
+            key = media_id(item['url'])
+            if key in seen:
+                continue
+            seen.add(key)
+            if item['duration'] and item['duration'] > MAX_VIDEO_DURATION:
+                skipped.append((item['title'], f"durasi melebihi {format_duration(MAX_VIDEO_DURATION)}"))
+            else:
+                items.append(item)
+    
+    if len(items) > BATCH_MAX_ITEMS:
+        skipped.append((f"{len(items) - BATCH_MAX_ITEMS} media lain", f"batas {BATCH_MAX_ITEMS} media per batch"))
+    return items[:BATCH_MAX_ITEMS], skipped
+
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk callback buttons"""
     query = update.callback_query
@@ -198,7 +471,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     elif data == 'help':
         await query.edit_message_text(
-            HELP_MESSAGE,
+            HELP_MESSAGE.format(max_file_size=format_size(MAX_FILE_SIZE), batch_max_items=BATCH_MAX_ITEMS),
             parse_mode=ParseMode.HTML,
             reply_markup=get_main_keyboard()
         )
@@ -228,21 +501,47 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_cancel_keyboard()
         )
     
-    elif data.startswith('dl_video|'):
-        url = data.split('|', 1)[1]
-        await process_download(query, context, url, 'video')
-    
-    elif data.startswith('dl_audio|'):
-        url = data.split('|', 1)[1]
-        await process_download(query, context, url, 'audio')
-    
-    elif data.startswith('dl_hd|'):
-        url = data.split('|', 1)[1]
-        await process_download(query, context, url, 'hd')
+    elif data.split('|', 1)[0] in ('dl_video', 'dl_audio', 'dl_hd', 'info'):
+        action, token = data.split('|', 1)
+        session = callback_sessions.get(token, chat_id=query.message.chat_id)
+        
+        if session is None:
+            await query.edit_message_text(
+                "⌛ <b>Sesi sudah kedaluwarsa</b>\n\n"
+                "Kirimkan ulang link untuk memulai download.",
+                parse_mode=ParseMode.HTML,
+                reply_markup=get_main_keyboard()
+            )
+        elif action == 'info':
+            await show_media_info(query, token, session)
+        else:
+            platform = session['platform']
+            if platform == 'batch':
+                # Tiap item batch dihitung pada platform sumbernya sendiri
+                urls = session['url'].splitlines()
+                retry_after = rate_limiter.check(
+                    query.from_user.id, query.message.chat_id, cost=len(urls),
+                    platforms=Counter(detect_platform(url) or 'unknown' for url in urls)
+                )
+            else:
+                retry_after = rate_limiter.check(query.from_user.id, query.message.chat_id, platform)
+            if retry_after:
+                # Pesan opsi tetap ada agar tombol bisa ditekan lagi nanti
+                await query.message.reply_text(rate_limit_text(retry_after), parse_mode=ParseMode.HTML)
+            else:
+                await enqueue_download(query, context, session, action.replace('dl_', ''))
     
-    elif data.startswith('info|'):
-        url = data.split('|', 1)[1]
-        await show_media_info(query, url)
+    elif data.startswith('cancel_job|'):
+        job_id = data.split('|', 1)[1]
+        if download_queue.cancel(job_id):
+            await query.edit_message_text(
+                "❌ <b>Download dibatalkan</b>\n\n"
+                "Kirimkan URL baru untuk memulai download.",
+                parse_mode=ParseMode.HTML,
+                reply_markup=get_main_keyboard()
+            )
+        else:
+            download_queue.cancel_running(job_id)
     
     elif data == 'cancel':
         await query.edit_message_text(
@@ -255,113 +554,881 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data == 'close':
         await query.delete_message()
 
-async def process_download(query, context, url: str, download_type: str):
-    """Proses download dan kirim file"""
-    platform = downloader.detect_platform(url)
+async def build_caption(bot, metadata: dict, platform: str, file_size: int) -> str:
+    """Caption untuk file yang dikirim"""
+    return f"""
+<b>✅ Download Berhasil!</b>
+
+📝 {truncate_text(metadata['title'], 100)}
+👤 {metadata['uploader']}
+📱 {platform.title()}
+📦 {format_size(file_size)}
+
+<b>🤖 @{(await bot.get_me()).username}</b>
+        """
+
+async def send_media(bot, chat_id: int, file_type: str, media, caption: str, metadata: dict):
+    """Kirim media (file atau file_id) sesuai tipenya"""
+    timeouts = {'write_timeout': UPLOAD_WRITE_TIMEOUT, 'read_timeout': UPLOAD_READ_TIMEOUT}
+    if file_type == 'audio':
+        return await bot.send_audio(
+            chat_id=chat_id,
+            audio=media,
+            caption=caption,
+            parse_mode=ParseMode.HTML,
+            title=metadata['title'],
+            performer=metadata['uploader'],
+            **timeouts
+        )
+    if file_type == 'photo':
+        return await bot.send_photo(
+            chat_id=chat_id,
+            photo=media,
+            caption=caption,
+            parse_mode=ParseMode.HTML,
+            **timeouts
+        )
+    if file_type == 'document':
+        return await bot.send_document(
+            chat_id=chat_id,
+            document=media,
+            caption=caption,
+            parse_mode=ParseMode.HTML,
+            **timeouts
+        )
+    return await bot.send_video(
+        chat_id=chat_id,
+        video=media,
+        caption=caption,
+        parse_mode=ParseMode.HTML,
+        supports_streaming=True,
+        **timeouts
+    )
+
+def get_sent_file_id(message) -> tuple:
+    """Ambil (file_type, file_id) dari Message hasil upload"""
+    for file_type in ('video', 'audio', 'document'):
+        attachment = getattr(message, file_type, None)
+        if attachment:
+            return file_type, attachment.file_id
+    if message.photo:
+        # Ukuran foto terbesar ada di urutan terakhir
+        return 'photo', message.photo[-1].file_id
+    return None, None
+
+def input_media(file_type: str, media, caption: Optional[str] = None):
+    """InputMedia untuk send_media_group (file_id, InputFile, atau path lokal)"""
+    if file_type == 'photo':
+        return InputMediaPhoto(media, caption=caption, parse_mode=ParseMode.HTML)
+    if file_type == 'audio':
+        return InputMediaAudio(media, caption=caption, parse_mode=ParseMode.HTML)
+    return InputMediaVideo(media, caption=caption, parse_mode=ParseMode.HTML, supports_streaming=True)
+
+async def send_album(bot, chat_id: int, items: list, caption: str, open_batch) -> list:
+    """
+    Kirim item album dalam batch send_media_group (maks. 10 item per batch).
+    ``open_batch(batch, caption)`` mengirim satu batch dan mengembalikan list Message.
+    Caption hanya dipasang di item pertama.
+    """
+    messages = []
+    for start in range(0, len(items), MEDIA_GROUP_SIZE):
+        batch = items[start:start + MEDIA_GROUP_SIZE]
+        messages.extend(await open_batch(batch, caption if start == 0 else None))
+    return messages
+
+async def send_cached_media(bot, chat_id: int, media_key: str, download_type: str,
+                            quality: str, platform: str, count: bool = True) -> bool:
+    """Kirim ulang media dari file_id cache, return False jika tidak ada atau tidak valid"""
+    cached = file_id_cache.get(media_key, download_type, quality, count=count)
+    if not cached:
+        return False
+    try:
+        caption = await build_caption(bot, cached, platform, cached['file_size'] or 0)
+        await send_media(bot, chat_id, cached['file_type'], cached['file_id'], caption, cached)
+        return True
+    except BadRequest as e:
+        logger.warning(f"File ID cache tidak valid untuk {media_key}: {e}")
+        file_id_cache.invalidate(media_key, download_type, quality)
+        return False
+
+def album_key(media_key: str, platform: str, download_type: str) -> str:
+    """Kunci file_id album: carousel Instagram per media, bagian audio/video per tipe download"""
+    return media_key if platform == 'instagram' else f"{media_key}|{download_type}"
+
+async def send_cached_album(bot, chat_id: int, media_key: str, platform: str, count: bool = True) -> bool:
+    """Kirim ulang album dari file_id cache (satu request per 10 item)"""
+    cached = file_id_cache.get_album(media_key, count=count)
+    if not cached:
+        return False
+    try:
+        caption = await build_caption(bot, cached[0], platform, sum(item['file_size'] or 0 for item in cached))
+        await send_album(
+            bot, chat_id, cached, caption,
+            lambda batch, text: bot.send_media_group(
+                chat_id=chat_id,
+                media=[input_media(item['file_type'], item['file_id'], text if index == 0 else None)
+                       for index, item in enumerate(batch)]
+            )
+        )
+        return True
+    except BadRequest as e:
+        logger.warning(f"File ID album tidak valid untuk {media_key}: {e}")
+        file_id_cache.invalidate_album(media_key)
+        return False
+
+async def upload_album(bot, chat_id: int, message_id: int, media_key: str, platform: str, metadata: dict,
+                       reply_markup=None):
+    """Upload item album dari disk dan simpan file_id tiap item"""
+    items = [item for item in metadata['items'] if item['file_size'] <= MAX_FILE_SIZE]
+    if len(items) < len(metadata['items']):
+        logger.warning(f"{len(metadata['items']) - len(items)} item album {media_key} melebihi batas ukuran")
+    total_size = sum(item['file_size'] for item in items)
+    caption = await build_caption(bot, metadata, platform, total_size)
+    
+    uploaded = [0]
+    upload_status = StatusUpdater(
+        bot, chat_id, message_id,
+        lambda sent: render_upload_status(metadata, total_size, sent, upload_status.elapsed()),
+        reply_markup=reply_markup,
+        refresh=True
+    )
+    upload_status.update(0)
+    
+    async def send_batch(batch, text):
+        batch_size = sum(item['file_size'] for item in batch)
+        async with upload_budget.reserve(0 if LOCAL_MODE else batch_size):
+            messages = await upload_media_group(
+                lambda media: bot.send_media_group(
+                    chat_id=chat_id,
+                    media=[input_media(item['type'], file, text if index == 0 else None)
+                           for index, (item, file) in enumerate(zip(batch, media))],
+                    write_timeout=UPLOAD_WRITE_TIMEOUT,
+                    read_timeout=UPLOAD_READ_TIMEOUT
+                ),
+                [item['path'] for item in batch],
+                on_progress=lambda sent: upload_status.update(uploaded[0] + sent)
+            )
+        uploaded[0] += batch_size
+        return messages
+    
+    async with upload_status:
+        messages = await send_album(bot, chat_id, items, caption, send_batch)
     
-    # Update pesan
-    await query.edit_message_text(
+    # Simpan file_id tiap item agar album berikutnya cukup dikirim ulang
+    cache_album_file_ids(media_key, items, messages, metadata)
+
+def cache_album_file_ids(media_key: str, items: list, messages: list, metadata: dict) -> bool:
+    """Simpan file_id semua item album; tidak disimpan jika ada item tanpa file_id"""
+    cached = []
+    for item, message in zip(items, messages):
+        file_type, file_id = get_sent_file_id(message)
+        if not file_id:
+            return False
+        cached.append({'file_id': file_id, 'file_type': file_type, 'file_size': item['file_size']})
+    file_id_cache.set_album(media_key, cached, metadata)
+    return True
+
+def media_file_type(file_path: str, download_type: str) -> str:
+    """Tipe pengiriman Telegram untuk file hasil download"""
+    if download_type == 'audio' or file_path.endswith('.mp3'):
+        return 'audio'
+    if file_path.endswith('.jpg'):
+        return 'photo'
+    return 'video'
+
+async def run_download(url: str, platform: str, download_type: str, progress=None):
+    """Download berdasarkan platform dan tipe (dijalankan di worker pool)"""
+    if platform == 'instagram':
+        return await downloader.download_instagram(url, progress=progress)
+    if platform == 'tiktok':
+        return await downloader.download_tiktok(url, progress=progress)
+    if download_type == 'audio':
+        return await downloader.download_video(url, audio_only=True, progress=progress)
+    if download_type == 'hd':
+        return await downloader.download_video(url, quality='hd', progress=progress)
+    return await downloader.download_video(url, progress=progress)
+
+def render_download_status(platform: str, download_type: str, snapshot: dict) -> str:
+    """Teks status download dari snapshot progress"""
+    header = (
         f"⏳ <b>Sedang mendownload...</b>\n\n"
         f"📱 Platform: {platform.title()}\n"
         f"📦 Tipe: {download_type.upper()}\n\n"
-        f"Mohon tunggu, ini mungkin memerlukan waktu beberapa menit...",
-        parse_mode=ParseMode.HTML
     )
     
-    try:
-        # Download berdasarkan tipe
-        if platform == 'instagram':
-            file_path, metadata = await downloader.download_instagram(url)
-        elif platform == 'tiktok':
-            file_path, metadata = await downloader.download_tiktok(url)
-        else:
-            if download_type == 'audio':
-                file_path, metadata = await downloader.download_video(url, audio_only=True)
-            elif download_type == 'hd':
-                file_path, metadata = await downloader.download_video(url, quality='hd')
-            else:
-                file_path, metadata = await downloader.download_video(url)
-        
-        # Cek ukuran file
-        file_size = os.path.getsize(file_path)
-        
-        if file_size > MAX_FILE_SIZE:
-            await query.edit_message_text(
-                f"❌ <b>File terlalu besar!</b>\n\n"
-                f"Ukuran: {format_size(file_size)}\n"
-                f"Maksimal: {format_size(MAX_FILE_SIZE)}\n\n"
-                f"Coba download versi dengan kualitas lebih rendah.",
-                parse_mode=ParseMode.HTML
-            )
-            downloader.cleanup(file_path)
+    if not snapshot:
+        return header + "Mohon tunggu, ini mungkin memerlukan waktu beberapa menit..."
+    
+    if snapshot['phase'] == 'processing':
+        return header + f"⚙️ Memproses file ({snapshot.get('step') or 'ffmpeg'})..."
+    
+    downloaded, total = snapshot['downloaded'], snapshot['total']
+    lines = []
+    if total:
+        lines.append(f"{progress_bar(downloaded / total)} {downloaded * 100 // total}%")
+        lines.append(f"📥 {format_size(downloaded)} / {format_size(total)}")
+    else:
+        lines.append(f"📥 {format_size(downloaded)}")
+    speed = f"⚡ {format_size(snapshot['speed'])}/s" if snapshot['speed'] else "⚡ -"
+    eta = f"⏱ ETA {format_duration(int(snapshot['eta']))}" if snapshot.get('eta') is not None else ""
+    lines.append(f"{speed}  {eta}".rstrip())
+    return header + '\n'.join(lines)
+
+def render_upload_status(metadata: dict, file_size: int, sent: int, elapsed: float) -> str:
+    """Teks status upload dari jumlah byte yang sudah terkirim"""
+    text = (
+        f"📤 <b>Mengupload file...</b>\n\n"
+        f"📁 {truncate_text(metadata['title'], 30)}\n"
+    )
+    if not sent:
+        return text + f"📦 {format_size(file_size)}\n⏱ {format_duration(int(elapsed))}"
+    
+    speed = sent / elapsed if elapsed else 0
+    eta = f"⏱ ETA {format_duration(int((file_size - sent) / speed))}" if speed else ""
+    return text + (
+        f"{progress_bar(sent / file_size)} {sent * 100 // file_size}%\n"
+        f"📤 {format_size(sent)} / {format_size(file_size)}\n"
+        f"⚡ {format_size(speed)}/s  {eta}".rstrip()
+    )
+
+async def enqueue_download(query, context, session: dict, download_type: str):
+    """Masukkan request download ke antrian job"""
+    url = session['url']
+    platform = session['platform']
+    user_id = query.from_user.id
+    chat_id = query.message.chat_id
+    quality = 'hd' if download_type == 'hd' else 'best'
+    batch = platform == 'batch'
+    
+    # Media (atau album) yang sudah pernah diupload tidak perlu antri;
+    # dihitung sekali sebagai hit/miss untuk kedua lookup
+    if not batch:
+        sent = (
+            await send_cached_media(context.bot, chat_id, session['media_key'], download_type, quality, platform,
+                                    count=False)
+            or await send_cached_album(context.bot, chat_id, album_key(session['media_key'], platform, download_type),
+                                       platform, count=False)
+        )
+        file_id_cache.record(sent)
+        if sent:
+            await query.delete_message()
+            stats_manager.add_download(platform, download_type)
             return
-        
-        # Update status
+    
+    job = {
+        'job_id': f"{chat_id}_{query.message.message_id}",
+        'user_id': user_id,
+        'chat_id': chat_id,
+        'message_id': query.message.message_id,
+        'url': url,
+        'platform': platform,
+        'download_type': download_type,
+    }
+    
+    # Batch mengalah pada request satu link agar user lain tidak menunggu di belakangnya
+    priority = (0 if user_id in ADMIN_IDS else 1) + (1 if batch else 0)
+    try:
+        download_queue.submit(job, priority=priority)
+    except JobExists:
+        # Tombol yang ditekan dua kali: job pertama sudah antri atau berjalan
+        return
+    except QueueFull as e:
         await query.edit_message_text(
-            f"📤 <b>Mengupload file...</b>\n\n"
-            f"📁 {truncate_text(metadata['title'], 30)}\n"
-            f"📦 {format_size(file_size)}",
-            parse_mode=ParseMode.HTML
+            f"⛔ <b>Antrian penuh!</b>\n\n{e}. Tunggu download sebelumnya selesai.",
+            parse_mode=ParseMode.HTML,
+            reply_markup=get_main_keyboard()
         )
-        
-        # Kirim file
-        chat_id = query.message.chat_id
-        
-        caption = f"""
-<b>✅ Download Berhasil!</b>
+        return
+    
+    text = f"🕒 <b>Masuk antrian...</b>\n\n📱 Platform: {platform.title()}\n📦 Tipe: {download_type.upper()}\n"
+    context.application.create_task(show_queue_position(query, job['job_id'], text))
 
-📝 {truncate_text(metadata['title'], 100)}
-👤 {metadata['uploader']}
-📱 {platform.title()}
-📦 {format_size(file_size)}
 
-<b>🤖 @{(await context.bot.get_me()).username}</b>
-        """
-        
-        if download_type == 'audio' or file_path.endswith('.mp3'):
-            with open(file_path, 'rb') as audio:
-                await context.bot.send_audio(
-                    chat_id=chat_id,
-                    audio=audio,
-                    caption=caption,
-                    parse_mode=ParseMode.HTML,
-                    title=metadata['title'],
-                    performer=metadata['uploader']
-                )
-        else:
-            with open(file_path, 'rb') as video:
-                await context.bot.send_video(
+async def show_queue_position(query, job_id: str, text: str):
+    """
+    Tampilkan posisi antrian dan perbarui selama job masih antri; berhenti
+    begitu worker mengambilnya agar tidak menimpa status download
+    """
+    # Posisi dibaca ulang tepat sebelum edit: job bisa langsung diambil worker setelah submit
+    position = download_queue.position(job_id)
+    while position is not None:
+        with contextlib.suppress(BadRequest):
+            await query.edit_message_text(
+                text + f"📋 Posisi: {position}",
+                parse_mode=ParseMode.HTML,
+                reply_markup=get_job_keyboard(job_id)
+            )
+        shown = position
+        while position == shown:
+            await asyncio.sleep(PROGRESS_EDIT_INTERVAL)
+            position = download_queue.position(job_id)
+
+
+async def process_download(bot, job: dict):
+    """Proses download dan kirim file"""
+    if job['platform'] == 'batch':
+        await process_batch(bot, job)
+        return
+    
+    url = job['url']
+    download_type = job['download_type']
+    platform = job['platform']
+    chat_id = job['chat_id']
+    message_id = job['message_id']
+    job_id = job['job_id']
+    media_key = media_id(url)
+    quality = 'hd' if download_type == 'hd' else 'best'
+    
+    # Kirim ulang file_id jika media (atau album) ini sudah pernah diupload
+    # (misalnya oleh job lain selama antri); sudah dihitung saat masuk antrian
+    if (await send_cached_media(bot, chat_id, media_key, download_type, quality, platform, count=False)
+            or await send_cached_album(bot, chat_id, album_key(media_key, platform, download_type), platform,
+                                       count=False)):
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+        stats_manager.add_download(platform, download_type)
+        return
+    
+    # Status download diperbarui dari progress hook worker (dengan batas frekuensi edit)
+    download_status = StatusUpdater(
+        bot, chat_id, message_id,
+        lambda snapshot: render_download_status(platform, download_type, snapshot),
+        reply_markup=get_job_keyboard(job_id)
+    )
+    download_status.update(None)
+    
+    try:
+        # Request identik yang sedang berjalan berbagi satu download,
+        # file baru dihapus setelah konsumen terakhir selesai
+        async with download_status, download_flights.acquire(
+            (media_key, download_type, quality),
+            lambda report: run_download(url, platform, download_type, progress=report),
+            consumer_id=job_id,
+            on_progress=download_status.update
+        ) as (file_path, metadata):
+            await download_status.stop()
+            
+            # Konsumen lain mungkin sudah mengupload file yang sama
+            if await send_cached_media(bot, chat_id, media_key, download_type, quality, platform, count=False):
+                await bot.delete_message(chat_id=chat_id, message_id=message_id)
+                stats_manager.add_download(platform, download_type)
+                return
+            
+            # Carousel Instagram dan audio yang dipecah dikirim sebagai album
+            if len(metadata.get('items') or []) > 1:
+                key = album_key(media_key, platform, download_type)
+                if not await send_cached_album(bot, chat_id, key, platform, count=False):
+                    # Tombol batal tetap berlaku selama upload hasil bersama
+                    await download_flights.guard(job_id, upload_album(
+                        bot, chat_id, message_id, key, platform, metadata, reply_markup=get_job_keyboard(job_id)
+                    ))
+                await bot.delete_message(chat_id=chat_id, message_id=message_id)
+                stats_manager.add_download(platform, download_type)
+                return
+            
+            # Cek ukuran file
+            file_size = os.path.getsize(file_path)
+            
+            if file_size > MAX_FILE_SIZE:
+                await bot.edit_message_text(
+                    f"❌ <b>File terlalu besar!</b>\n\n"
+                    f"Ukuran: {format_size(file_size)}\n"
+                    f"Maksimal: {format_size(MAX_FILE_SIZE)}\n\n"
+                    f"Coba download versi dengan kualitas lebih rendah.",
                     chat_id=chat_id,
-                    video=video,
-                    caption=caption,
-                    parse_mode=ParseMode.HTML,
-                    supports_streaming=True
+                    message_id=message_id,
+                    parse_mode=ParseMode.HTML
                 )
+                return
+            
+            # Kirim file (status upload menampilkan byte terkirim)
+            caption = await build_caption(bot, metadata, platform, file_size)
+            file_type = media_file_type(file_path, download_type)
+            
+            upload_status = StatusUpdater(
+                bot, chat_id, message_id,
+                lambda sent: render_upload_status(metadata, file_size, sent, upload_status.elapsed()),
+                reply_markup=get_job_keyboard(job_id),
+                refresh=True
+            )
+            upload_status.update(0)
+            
+            # File di-stream dari disk per chunk (atau dikirim sebagai path di mode
+            # server lokal); total byte upload paralel dibatasi. Tombol batal tetap berlaku
+            async with upload_budget.reserve(0 if LOCAL_MODE else file_size), upload_status:
+                message = await download_flights.guard(job_id, upload_file(
+                    lambda media: send_media(bot, chat_id, file_type, media, caption, metadata),
+                    file_path,
+                    on_progress=upload_status.update
+                ))
+            
+            # Simpan file_id agar request berikutnya tidak perlu download ulang
+            sent_type, file_id = get_sent_file_id(message)
+            if file_id:
+                file_id_cache.set(media_key, download_type, quality, file_id, sent_type,
+                                  {**metadata, 'file_size': file_size})
         
         # Hapus pesan processing
-        await query.delete_message()
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
         
         # Update statistik
-        stats_manager.add_download()
-        
-        # Cleanup
-        downloader.cleanup(file_path)
+        stats_manager.add_download(platform, download_type)
         
+    except MediaRejected as e:
+        await bot.edit_message_text(
+            f"⛔ <b>Media tidak bisa didownload!</b>\n\n"
+            f"{e}\n\n"
+            f"Batas: durasi {format_duration(MAX_VIDEO_DURATION)}, ukuran {format_size(MAX_FILE_SIZE)}.",
+            chat_id=chat_id,
+            message_id=message_id,
+            parse_mode=ParseMode.HTML,
+            reply_markup=get_main_keyboard()
+        )
+    
+    except JobCancelled:
+        await bot.edit_message_text(
+            "❌ <b>Download dibatalkan</b>\n\n"
+            "Kirimkan URL baru untuk memulai download.",
+            chat_id=chat_id,
+            message_id=message_id,
+            parse_mode=ParseMode.HTML,
+            reply_markup=get_main_keyboard()
+        )
+    
     except Exception as e:
         logger.error(f"Download error: {e}")
-        await query.edit_message_text(
+        await bot.edit_message_text(
             f"❌ <b>Gagal mendownload!</b>\n\n"
             f"<code>{str(e)}</code>\n\n"
             f"Coba lagi atau hubungi support.",
+            chat_id=chat_id,
+            message_id=message_id,
             parse_mode=ParseMode.HTML,
             reply_markup=get_main_keyboard()
         )
 
-async def show_media_info(query, url: str):
-    """Tampilkan informasi detail media"""
+def render_batch_status(items: list, download_type: str) -> str:
+    """Teks status gabungan untuk semua item batch"""
+    icons = {'queued': '🕒', 'download': '📥', 'ready': '📦', 'sent': '✅', 'failed': '❌'}
+    sent = sum(1 for item in items if item['state'] == 'sent')
+    failed = sum(1 for item in items if item['state'] == 'failed')
+    
+    lines = [
+        f"📚 <b>Batch {download_type.upper()}</b>",
+        f"{progress_bar((sent + failed) / len(items))} {sent}/{len(items)} terkirim"
+        + (f", {failed} gagal" if failed else ""),
+        "",
+    ]
+    for number, item in enumerate(items, 1):
+        line = f"{icons[item['state']]} {number}. {html.escape(truncate_text(item['title'] or item['url'], 40))}"
+        snapshot = item['progress']
+        if item['state'] == 'download' and snapshot and snapshot['phase'] == 'download' and snapshot['total']:
+            line += f" {snapshot['downloaded'] * 100 // snapshot['total']}%"
+        lines.append(line)
+    return '\n'.join(lines)
+
+async def fetch_batch_item(stack: contextlib.AsyncExitStack, semaphore: asyncio.Semaphore,
+                           batch: dict, consumer_id: str, item: dict, download_type: str, on_change):
+    """
+    Siapkan satu item batch: file_id dari cache jika pernah diupload, atau
+    download (file tetap di-pin lewat ``stack`` sampai kelompoknya terkirim).
+    """
+    cached = file_id_cache.get(item['media_key'], download_type, 'best', count=False)
+    cached = [cached] if cached else file_id_cache.get_album(
+        album_key(item['media_key'], item['platform'], download_type), count=False
+    )
+    file_id_cache.record(bool(cached))
+    if cached:
+        item.update(state='ready', title=cached[0]['title'], cached=True, media=[
+            {'type': entry['file_type'], 'file_id': entry['file_id'], 'file_size': entry['file_size'] or 0}
+            for entry in cached
+        ])
+        return
+    
+    def report(snapshot: dict):
+        item['progress'] = snapshot
+        on_change(None)
+    
+    async with semaphore:
+        if batch['cancelled'].is_set():
+            return
+        item['state'] = 'download'
+        on_change(None)
+        try:
+            file_path, metadata = await stack.enter_async_context(download_flights.acquire(
+                (item['media_key'], download_type, 'best'),
+                lambda progress: run_download(item['url'], item['platform'], download_type, progress=progress),
+                consumer_id=consumer_id,
+                on_progress=report
+            ))
+        except JobCancelled:
+            item['state'] = 'queued'
+            return
+        except Exception as e:
+            logger.warning(f"Item batch {item['url']} gagal: {e}")
+            item.update(state='failed', error=str(e))
+            on_change(None)
+            return
+    
+    if len(metadata.get('items') or []) > 1:
+        media = [dict(entry) for entry in metadata['items']]
+    else:
+        media = [{
+            'type': media_file_type(file_path, download_type),
+            'path': file_path,
+            'file_size': os.path.getsize(file_path),
+        }]
+    media = [entry for entry in media if entry['file_size'] <= MAX_FILE_SIZE]
+    if not media:
+        item.update(state='failed', error=f"file melebihi {format_size(MAX_FILE_SIZE)}")
+    else:
+        item.update(state='ready', title=metadata['title'], metadata=metadata, cached=False, media=media)
+    on_change(None)
+
+async def send_batch_group(bot, chat_id: int, entries: list, download_type: str):
+    """Kirim (item, media) batch sebagai media group; file_id cache dan file baru boleh bercampur"""
+    async def send_group(batch, _caption):
+        uploads = [media['path'] for _, media in batch if 'file_id' not in media]
+        
+        def build(files):
+            files = iter(files)
+            return [
+                input_media(
+                    media['type'],
+                    media['file_id'] if 'file_id' in media else next(files),
+                    # Judul dipasang di media pertama tiap item
+                    f"<b>{html.escape(truncate_text(item['title'], 100))}</b>" if media is item['media'][0] else None
+                )
+                for item, media in batch
+            ]
+        
+        size = sum(media['file_size'] for _, media in batch if 'file_id' not in media)
+        try:
+            async with upload_budget.reserve(0 if LOCAL_MODE else size):
+                messages = await upload_media_group(
+                    lambda files: bot.send_media_group(
+                        chat_id=chat_id,
+                        media=build(files),
+                        write_timeout=UPLOAD_WRITE_TIMEOUT,
+                        read_timeout=UPLOAD_READ_TIMEOUT
+                    ),
+                    uploads
+                )
+        except BadRequest as e:
+            # Biasanya file_id cache yang sudah tidak valid; item di kelompok ini gagal
+            logger.warning(f"Media group batch gagal: {e}")
+            for item, _ in batch:
+                item.update(state='failed', error=str(e))
+                if item['cached']:
+                    file_id_cache.invalidate(item['media_key'], download_type, 'best')
+                    file_id_cache.invalidate_album(album_key(item['media_key'], item['platform'], download_type))
+            return []
+        
+        for (_, media), message in zip(batch, messages):
+            media['sent'] = get_sent_file_id(message)
+        return messages
+    
+    await send_album(bot, chat_id, entries, None, send_group)
+
+async def deliver_batch(bot, chat_id: int, items: list, download_type: str):
+    """Kirim item batch yang sudah siap; audio dikirim terpisah dari foto/video"""
+    entries = [(item, media) for item in items for media in item['media']]
+    for group in ([entry for entry in entries if entry[1]['type'] == 'audio'],
+                  [entry for entry in entries if entry[1]['type'] != 'audio']):
+        if group:
+            await send_batch_group(bot, chat_id, group, download_type)
+    
+    for item in items:
+        if item['state'] != 'ready':
+            continue
+        sent = [media.get('sent') or (None, None) for media in item['media']]
+        if not all(file_id for _, file_id in sent):
+            item.update(state='failed', error="upload tidak lengkap")
+            continue
+        item['state'] = 'sent'
+        stats_manager.add_download(item['platform'], download_type)
+        
+        # Simpan file_id agar request (atau batch) berikutnya cukup mengirim ulang
+        if item['cached']:
+            continue
+        if len(sent) > 1:
+            file_id_cache.set_album(album_key(item['media_key'], item['platform'], download_type), [
+                {'file_id': file_id, 'file_type': file_type, 'file_size': media['file_size']}
+                for (file_type, file_id), media in zip(sent, item['media'])
+            ], item['metadata'])
+        else:
+            file_type, file_id = sent[0]
+            file_id_cache.set(item['media_key'], download_type, 'best', file_id, file_type,
+                              {**item['metadata'], 'file_size': item['media'][0]['file_size']})
+
+async def process_batch(bot, job: dict):
+    """
+    Download semua media batch dan kirim per media group (maks. 10).
+    Satu batch hanya memakai ``BATCH_PARALLEL`` download sekaligus sehingga
+    job user lain tetap mendapat worker.
+    """
+    download_type = 'audio' if job['download_type'] == 'audio' else 'video'
+    chat_id = job['chat_id']
+    message_id = job['message_id']
+    job_id = job['job_id']
+    
+    items = [
+        {'url': url, 'platform': detect_platform(url) or 'unknown', 'media_key': media_id(url),
+         'title': None, 'state': 'queued', 'progress': None}
+        for url in job['url'].splitlines()
+    ]
+    batch = {'items': items, 'cancelled': asyncio.Event()}
+    running_batches[job_id] = batch
+    
+    status = StatusUpdater(
+        bot, chat_id, message_id,
+        lambda _: render_batch_status(items, download_type),
+        reply_markup=get_job_keyboard(job_id)
+    )
+    status.update(None)
+    semaphore = asyncio.Semaphore(BATCH_PARALLEL)
+    
     try:
+        async with status:
+            for start in range(0, len(items), MEDIA_GROUP_SIZE):
+                chunk = items[start:start + MEDIA_GROUP_SIZE]
+                # File satu kelompok di-pin sampai media group-nya terkirim
+                async with contextlib.AsyncExitStack() as stack:
+                    await asyncio.gather(*(
+                        fetch_batch_item(stack, semaphore, batch, f"{job_id}:{start + index}",
+                                         item, download_type, status.update)
+                        for index, item in enumerate(chunk)
+                    ))
+                    if batch['cancelled'].is_set():
+                        break
+                    await deliver_batch(bot, chat_id, [item for item in chunk if item['state'] == 'ready'],
+                                        download_type)
+                status.update(None)
+    finally:
+        running_batches.pop(job_id, None)
+    
+    sent = sum(1 for item in items if item['state'] == 'sent')
+    failed = [item for item in items if item['state'] == 'failed']
+    if batch['cancelled'].is_set():
+        text = f"❌ <b>Batch dibatalkan</b>\n\n{sent}/{len(items)} media sudah terkirim."
+    elif failed:
+        text = f"📚 <b>Batch selesai:</b> {sent}/{len(items)} terkirim\n\n❌ <b>Gagal:</b>\n" + '\n'.join(
+            f"• {html.escape(truncate_text(item['title'] or item['url'], 40))} — "
+            f"{html.escape(truncate_text(item['error'], 80))}"
+            for item in failed[:10]
+        )
+    else:
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+        return
+    await bot.edit_message_text(
+        text,
+        chat_id=chat_id,
+        message_id=message_id,
+        parse_mode=ParseMode.HTML,
+        reply_markup=get_main_keyboard()
+    )
+
+def inline_download_type(platform: str) -> str:
+    """Tipe download yang disiapkan untuk inline mode"""
+    return 'audio' if platform == 'soundcloud' else 'video'
+
+def inline_caption(bot, item: dict) -> str:
+    """Caption hasil inline (tanpa get_me: username sudah tersimpan setelah initialize)"""
+    return (
+        f"📝 {html.escape(truncate_text(item.get('title') or 'Unknown', 100))}\n"
+        f"<b>🤖 @{bot.username}</b>"
+    )
+
+def cached_inline_result(result_id: str, item: dict, caption: str):
+    """InlineQueryResultCached* sesuai tipe file_id"""
+    title = truncate_text(item.get('title') or 'Unknown', 60)
+    options = {'caption': caption, 'parse_mode': ParseMode.HTML}
+    if item['file_type'] == 'audio':
+        return InlineQueryResultCachedAudio(result_id, item['file_id'], **options)
+    if item['file_type'] == 'photo':
+        return InlineQueryResultCachedPhoto(result_id, item['file_id'], title=title, **options)
+    if item['file_type'] == 'document':
+        return InlineQueryResultCachedDocument(result_id, title, item['file_id'], **options)
+    return InlineQueryResultCachedVideo(result_id, item['file_id'], title, **options)
+
+def inline_article(result_id: str, title: str, description: str, text: str, thumbnail: str = None):
+    return InlineQueryResultArticle(
+        result_id, title,
+        InputTextMessageContent(text, parse_mode=ParseMode.HTML, disable_web_page_preview=True),
+        description=description,
+        thumbnail_url=thumbnail or None
+    )
+
+def inline_results(bot, url: str) -> list:
+    """
+    Hasil inline hanya dari cache (file_id lalu metadata), tanpa akses jaringan.
+    List kosong berarti link belum pernah diproses.
+    """
+    platform = detect_platform(url)
+    media_key = media_id(url)
+    results = []
+    
+    for download_type, quality in (('video', 'best'), ('hd', 'hd'), ('audio', 'best')):
+        # Hanya probe: hit/miss dihitung saat media benar-benar diminta
+        cached = file_id_cache.get(media_key, download_type, quality, count=False)
+        if cached:
+            results.append(cached_inline_result(download_type, cached, inline_caption(bot, cached)))
+        else:
+            # Carousel Instagram / audio yang dipecah: tiap item jadi satu hasil
+            for index, item in enumerate(file_id_cache.get_album(album_key(media_key, platform, download_type),
+                                                                 count=False)):
+                results.append(cached_inline_result(f"{download_type}:{index}", item, inline_caption(bot, item)))
+        if platform == 'instagram' and results:
+            break
+    if results:
+        return results
+    
+    info = downloader.info_cache.get(media_key)
+    if info:
+        link = html.escape(url)
+        results.append(inline_article(
+            'info',
+            truncate_text(info.get('title') or 'Unknown', 60),
+            f"👤 {info.get('uploader') or 'Unknown'} • ⏱ {format_duration(int(info.get('duration') or 0))}",
+            f"<b>{html.escape(info.get('title') or 'Unknown')}</b>\n"
+            f"👤 {html.escape(info.get('uploader') or 'Unknown')}\n\n{link}",
+            info.get('thumbnail')
+        ))
+    return results
+
+async def warm_up_link(bot, url: str):
+    """
+    Siapkan link untuk inline query berikutnya: resolve link pendek, isi cache
+    metadata, dan (jika INLINE_WARMUP_CHAT_ID diatur) download lalu upload ke
+    chat penyimpanan agar file_id-nya bisa dipakai sebagai hasil cached.
+    """
+    async with inline_warmup_slots:
+        # Konsumen SingleFlight per link yang diketik, bukan per media
+        consumer_id = f"inline:{url}"
+        url = await link_resolver.resolve(url)
+        platform = detect_platform(url)
+        if not platform:
+            inline_errors[url] = "Platform tidak didukung"
+            return
         info = await downloader.get_info(url)
-        platform = downloader.detect_platform(url)
+        if 'error' in info:
+            inline_errors[url] = info['error']
+            return
+        if not INLINE_WARMUP_CHAT_ID or BOT_ROLE != 'all':
+            return
+        
+        media_key = media_id(url)
+        download_type = inline_download_type(platform)
+        async with download_flights.acquire(
+            (media_key, download_type, 'best'),
+            lambda report: run_download(url, platform, download_type, progress=report),
+            consumer_id=consumer_id
+        ) as (file_path, metadata):
+            items = metadata.get('items') or []
+            if len(items) > 1:
+                items = [item for item in items if item['file_size'] <= MAX_FILE_SIZE]
+                messages = await send_album(
+                    bot, INLINE_WARMUP_CHAT_ID, items, None,
+                    lambda batch, text: upload_media_group(
+                        lambda media: bot.send_media_group(
+                            chat_id=INLINE_WARMUP_CHAT_ID,
+                            media=[input_media(item['type'], file) for item, file in zip(batch, media)],
+                            write_timeout=UPLOAD_WRITE_TIMEOUT,
+                            read_timeout=UPLOAD_READ_TIMEOUT
+                        ),
+                        [item['path'] for item in batch]
+                    )
+                )
+                cache_album_file_ids(album_key(media_key, platform, download_type), items, messages, metadata)
+                return
+            
+            file_size = os.path.getsize(file_path)
+            if file_size > MAX_FILE_SIZE:
+                return
+            async with upload_budget.reserve(0 if LOCAL_MODE else file_size):
+                message = await upload_file(
+                    lambda media: send_media(bot, INLINE_WARMUP_CHAT_ID,
+                                             media_file_type(file_path, download_type), media, None, metadata),
+                    file_path
+                )
+            sent_type, file_id = get_sent_file_id(message)
+            if file_id:
+                file_id_cache.set(media_key, download_type, 'best', file_id, sent_type,
+                                  {**metadata, 'file_size': file_size})
+
+def schedule_warm_up(bot, url: str):
+    """Jalankan warm-up di background, satu task per link"""
+    if url in inline_warmups:
+        return
+    
+    async def run():
+        try:
+            await warm_up_link(bot, url)
+        except MediaRejected as e:
+            inline_errors[url] = str(e)
+        except Exception as e:
+            logger.warning(f"Warm-up inline gagal untuk {url}: {e}")
+        finally:
+            inline_warmups.pop(url, None)
+            # Error yang tidak pernah dibaca tidak boleh menumpuk
+            while len(inline_errors) > 256:
+                inline_errors.pop(next(iter(inline_errors)))
+    
+    inline_warmups[url] = asyncio.create_task(run())
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler inline query ``@bot <url>``: dijawab dari cache, link baru disiapkan di background"""
+    query = update.inline_query
+    user_id = query.from_user.id
+    
+    # Debounce: Telegram mengirim query tiap ketikan, hanya query terakhir yang dijawab
+    inline_latest[user_id] = query.id
+    await asyncio.sleep(INLINE_DEBOUNCE)
+    if inline_latest.get(user_id) != query.id:
+        return
+    del inline_latest[user_id]
+    
+    urls = extract_urls(query.query)
+    button = InlineQueryResultsButton("📥 Buka bot untuk download", start_parameter='inline')
+    if not urls:
+        await query.answer([], cache_time=INLINE_CACHE_TIME, button=button)
+        return
+    
+    # Link pendek yang belum pernah di-resolve tidak diikuti di sini (batas waktu jawaban)
+    url = link_resolver.peek(urls[0])
+    results = inline_results(context.bot, url) if url and detect_platform(url) else []
+    if results:
+        await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False, button=button)
+        return
+    
+    error = inline_errors.pop(url or urls[0], None)
+    # Warm-up memicu ekstraksi ke platform sumber, jadi ikut rate limit user
+    retry_after = 0.0 if error or (url or urls[0]) in inline_warmups else rate_limiter.check(
+        user_id, platform=detect_platform(url) if url else None
+    )
+    if error:
+        results = [inline_article(
+            'error', "❌ Link tidak bisa diproses", truncate_text(error, 100),
+            f"❌ {html.escape(truncate_text(error, 200))}"
+        )]
+    elif retry_after:
+        results = [inline_article(
+            'limited', "⏳ Terlalu banyak permintaan", f"Coba lagi dalam {math.ceil(retry_after)} detik",
+            html.escape(urls[0])
+        )]
+    else:
+        schedule_warm_up(context.bot, url or urls[0])
+        results = [inline_article(
+            'pending', "⏳ Menyiapkan media...", "Ketik ulang link sebentar lagi",
+            html.escape(urls[0])
+        )]
+    # Jawaban sementara tidak boleh di-cache server Telegram
+    await query.answer(results, cache_time=0, is_personal=True, button=button)
+
+async def show_media_info(query, token: str, session: dict):
+    """Tampilkan informasi detail media"""
+    try:
+        info = session['info'] or await downloader.get_info(session['url'])
+        platform = session['platform']
         
         info_text = f"""
 <b>{get_platform_icon(platform)} Informasi Media</b>
@@ -381,7 +1448,7 @@ async def show_media_info(query, url: str):
         await query.edit_message_text(
             info_text,
             parse_mode=ParseMode.HTML,
-            reply_markup=get_download_options_keyboard(url, platform)
+            reply_markup=get_download_options_keyboard(token, platform)
         )
         
     except Exception as e:
@@ -401,13 +1468,72 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode=ParseMode.HTML
         )
 
+async def post_init(application: Application):
+    """Mulai antrian download (termasuk job yang tersisa sebelum restart)"""
+    await download_queue.start(lambda job: process_download(application.bot, job))
+
+async def post_shutdown(application: Application):
+    """Hentikan antrian dan worker pool saat bot berhenti"""
+    await download_queue.stop()
+    downloader.executor.shutdown()
+    downloader.processor.shutdown()
+    await downloader.fetcher.close()
+
+def local_api_kwargs() -> dict:
+    """Parameter Bot untuk server Bot API lokal (kosong di mode cloud)"""
+    if not LOCAL_MODE:
+        return {}
+    return {
+        'base_url': f"{LOCAL_BOT_API_URL}/bot",
+        'base_file_url': f"{LOCAL_BOT_API_URL}/file/bot",
+        'local_mode': True,
+    }
+
+async def run_worker():
+    """Proses worker: hanya mengambil job dari journal dan memproses download"""
+    bot = Bot(BOT_TOKEN, request=build_request(), **local_api_kwargs())
+    async with bot:
+        await download_queue.start(lambda job: process_download(bot, job))
+        try:
+            await wait_for_shutdown()
+        finally:
+            await download_queue.stop()
+            downloader.executor.shutdown()
+            downloader.processor.shutdown()
+            await downloader.fetcher.close()
+
 def main():
     """Fungsi utama untuk menjalankan bot"""
     # Setup direktori
     ensure_directories()
     
-    # Buat application
-    application = Application.builder().token(BOT_TOKEN).build()
+    if BOT_ROLE == 'worker':
+        print(f"⚙️ Worker download berjalan (ID: {download_queue.worker_id})")
+        asyncio.run(run_worker())
+        return
+    
+    # Buat application (update diproses paralel agar download tidak memblok chat lain)
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(build_request())
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if LOCAL_MODE:
+        # Server Bot API lokal: batas upload 2GB dan file dikirim lewat path lokal
+        api = local_api_kwargs()
+        builder = (
+            builder
+            .base_url(api['base_url'])
+            .base_file_url(api['base_file_url'])
+            .local_mode(True)
+        )
+    if BOT_MODE == 'webhook':
+        # Update diterima server aiohttp sendiri, bukan lewat long polling
+        builder = builder.updater(None)
+    application = builder.build()
     
     # Tambah handlers
     application.add_handler(CommandHandler("start", start))
@@ -421,6 +1547,9 @@ def main():
     # Handler untuk buttons
     application.add_handler(CallbackQueryHandler(button_handler))
     
+    # Handler untuk inline mode (@bot <url>)
+    application.add_handler(InlineQueryHandler(inline_query, block=False))
+    
     # Error handler
     application.add_error_handler(error_handler)
     
@@ -428,7 +1557,10 @@ def main():
     print("🤖 Bot sedang berjalan...")
     print("Tekan Ctrl+C untuk menghentikan")
     
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == 'webhook':
+        asyncio.run(serve_webhook(application))
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Cache metadata media agar link yang sama tidak diekstrak berulang kali
+"""
+
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from config import FILE_ID_CACHE_DB, INFO_CACHE_DB, INFO_CACHE_SIZE, INFO_CACHE_TTL
+from utils import connect_sqlite, logger
+
+
+class InfoCache:
+    """
+    Cache info dict yt-dlp per media ID (LRU di memori dengan TTL),
+    opsional disimpan juga ke SQLite agar tetap ada setelah restart.
+    """
+
+    def __init__(self, max_entries: int = INFO_CACHE_SIZE, ttl: int = INFO_CACHE_TTL,
+                 db_path: str = INFO_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            self._db = connect_sqlite(db_path)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS info_cache ('
+                'key TEXT PRIMARY KEY, info TEXT NOT NULL, expires REAL NOT NULL)'
+            )
+            self._db.execute('DELETE FROM info_cache WHERE expires < ?', (time.time(),))
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Ambil info dari cache, None jika tidak ada atau sudah kedaluwarsa"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+
+        info = self._load(key, now)
+        with self._lock:
+            if info is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return info
+
+    def set(self, key: str, info: Dict):
+        """Simpan info ke cache"""
+        expires = time.time() + self.ttl
+        self._remember(key, info, expires)
+
+        if self._db is not None:
+            try:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO info_cache (key, info, expires) VALUES (?, ?, ?)',
+                    (key, json.dumps(info), expires)
+                )
+                self._db.commit()
+            except Exception as e:
+                logger.warning(f"Gagal menyimpan info cache: {e}")
+
+    def invalidate(self, key: str):
+        """Hapus entry dari cache (mis. URL format sudah tidak valid)"""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute('DELETE FROM info_cache WHERE key = ?', (key,))
+            self._db.commit()
+
+    def _remember(self, key: str, info: Dict, expires: float):
+        with self._lock:
+            self._entries[key] = (info, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, key: str, now: float) -> Optional[Dict]:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            'SELECT info, expires FROM info_cache WHERE key = ? AND expires > ?', (key, now)
+        ).fetchone()
+        if not row:
+            return None
+        info = json.loads(row[0])
+        self._remember(key, info, row[1])
+        return info
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileIdCache:
+    """
+    Cache persisten (media ID, tipe download, kualitas) -> file_id Telegram,
+    sehingga media populer cukup dikirim ulang tanpa download/upload.
+    """
+
+    def __init__(self, db_path: str = FILE_ID_CACHE_DB):
+        self._db = connect_sqlite(db_path)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS file_ids ('
+            'media_key TEXT NOT NULL, download_type TEXT NOT NULL, quality TEXT NOT NULL, '
+            'file_id TEXT NOT NULL, file_type TEXT NOT NULL, '
+            'title TEXT, uploader TEXT, file_size INTEGER, created REAL NOT NULL, '
+            'PRIMARY KEY (media_key, download_type, quality))'
+        )
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, media_key: str, download_type: str, quality: str, count: bool = True) -> Optional[Dict]:
+        """
+        Ambil file_id yang tersimpan, None jika belum pernah diupload.
+        ``count=False`` untuk pengecekan ulang yang tidak dihitung sebagai hit/miss.
+        """
+        row = self._db.execute(
+            'SELECT file_id, file_type, title, uploader, file_size FROM file_ids '
+            'WHERE media_key = ? AND download_type = ? AND quality = ?',
+            (media_key, download_type, quality)
+        ).fetchone()
+        if not row:
+            self.misses += count
+            return None
+        self.hits += count
+        return {
+            'file_id': row[0],
+            'file_type': row[1],
+            'title': row[2],
+            'uploader': row[3],
+            'file_size': row[4],
+        }
+
+    def record(self, hit: bool):
+        """Hitung satu request yang memakai beberapa lookup ``count=False`` (media tunggal lalu album)"""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def set(self, media_key: str, download_type: str, quality: str,
+            file_id: str, file_type: str, metadata: Dict):
+        """Simpan file_id hasil upload"""
+        self._db.execute(
+            'INSERT OR REPLACE INTO file_ids '
+            '(media_key, download_type, quality, file_id, file_type, title, uploader, file_size, created) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (media_key, download_type, quality, file_id, file_type,
+             metadata.get('title'), metadata.get('uploader'), metadata.get('file_size'), time.time())
+        )
+        self._db.commit()
+
+    def get_album(self, media_key: str, count: bool = True) -> List[Dict]:
+        """file_id semua item album (urut), list kosong jika album belum pernah diupload"""
+        rows = self._db.execute(
+            'SELECT file_id, file_type, title, uploader, file_size FROM file_ids '
+            "WHERE media_key = ? AND download_type = 'album' ORDER BY quality",
+            (media_key,)
+        ).fetchall()
+        if not rows:
+            self.misses += count
+            return []
+        self.hits += count
+        return [
+            {'file_id': row[0], 'file_type': row[1], 'title': row[2], 'uploader': row[3], 'file_size': row[4]}
+            for row in rows
+        ]
+
+    def set_album(self, media_key: str, items: List[Dict], metadata: Dict):
+        """Simpan file_id tiap item album; ``items`` berisi file_id, file_type, file_size"""
+        with self._db:
+            self._db.execute("DELETE FROM file_ids WHERE media_key = ? AND download_type = 'album'", (media_key,))
+            self._db.executemany(
+                'INSERT INTO file_ids '
+                '(media_key, download_type, quality, file_id, file_type, title, uploader, file_size, created) '
+                "VALUES (?, 'album', ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (media_key, f"{index:03d}", item['file_id'], item['file_type'],
+                     metadata.get('title'), metadata.get('uploader'), item.get('file_size'), time.time())
+                    for index, item in enumerate(items)
+                ]
+            )
+
+    def invalidate_album(self, media_key: str):
+        """Hapus semua file_id item album"""
+        self._db.execute("DELETE FROM file_ids WHERE media_key = ? AND download_type = 'album'", (media_key,))
+        self._db.commit()
+
+    def invalidate(self, media_key: str, download_type: str, quality: str):
+        """Hapus file_id yang sudah tidak bisa dipakai"""
+        self._db.execute(
+            'DELETE FROM file_ids WHERE media_key = ? AND download_type = ? AND quality = ?',
+            (media_key, download_type, quality)
+        )
+        self._db.commit()
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM file_ids').fetchone()[0]
@@ -14,16 +14,136 @@ BOT_USERNAME = os.getenv('BOT_USERNAME', 'your_bot_username')
 # Admin Configuration
 ADMIN_IDS = list(map(int, os.getenv('ADMIN_IDS', '123456789').split(',')))
 
+# Deployment Configuration
+BOT_MODE = os.getenv('BOT_MODE', 'polling')  # 'polling' atau 'webhook'
+# 'all' = satu proses, 'front' = hanya menerima update, 'worker' = hanya memproses download
+BOT_ROLE = os.getenv('BOT_ROLE', 'all')
+WORKER_ID = os.getenv('WORKER_ID', '')  # kosong = hostname-pid
+
+# Webhook Configuration
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')  # URL publik, mis. https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+
+# Local Bot API Server (kosong = Bot API cloud api.telegram.org)
+LOCAL_BOT_API_URL = os.getenv('LOCAL_BOT_API_URL', '').rstrip('/')  # mis. http://localhost:8081
+LOCAL_MODE = bool(LOCAL_BOT_API_URL)
+
 # Download Configuration
 DOWNLOAD_PATH = "downloads/"
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB (Telegram limit)
+# Batas disk untuk cache file hasil download (0 = hapus segera setelah dikirim)
+DOWNLOAD_CACHE_BYTES = int(os.getenv('DOWNLOAD_CACHE_MB', 2048)) * 1024 * 1024
+STORAGE_SHARD_DEPTH = int(os.getenv('STORAGE_SHARD_DEPTH', 2))  # level subdirektori (2 hex per level)
+# Batas upload Bot API: 50MB di cloud, 2000MB di server lokal
+MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE_MB', 2000 if LOCAL_MODE else 50)) * 1024 * 1024
 MAX_VIDEO_DURATION = 600  # 10 menit
+# Fit-to-limit: file di atas MAX_FILE_SIZE di-encode ulang (video) atau dipecah (audio) agar tetap terkirim
+FIT_TO_LIMIT = os.getenv('FIT_TO_LIMIT', 'true').lower() in ('1', 'true', 'yes')
+# File sumber terbesar yang masih boleh didownload untuk di-fit (default 4x batas upload)
+FIT_SOURCE_MAX_SIZE = (
+    int(os.getenv('FIT_SOURCE_MAX_MB', 4 * MAX_FILE_SIZE // (1024 * 1024))) * 1024 * 1024
+    if FIT_TO_LIMIT else MAX_FILE_SIZE
+)
+FIT_MIN_VIDEO_BITRATE = int(os.getenv('FIT_MIN_VIDEO_BITRATE', 200))  # kbps, di bawah ini video tidak layak tonton
+FIT_AUDIO_BITRATE = int(os.getenv('FIT_AUDIO_BITRATE', 96))  # kbps track audio pada video hasil fit
+
+# Executor Configuration
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', os.cpu_count() or 4))
+DOWNLOAD_EXECUTOR = os.getenv('DOWNLOAD_EXECUTOR', 'thread')  # 'thread' atau 'process'
+# Media Processing Configuration (ffmpeg berjalan di pool proses sendiri, terpisah dari download)
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+FFPROBE_PATH = os.getenv('FFPROBE_PATH', 'ffprobe')
+FFMPEG_WORKERS = int(os.getenv('FFMPEG_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+FFMPEG_THREADS = int(os.getenv('FFMPEG_THREADS', 2))  # thread per proses ffmpeg
+FFMPEG_EXECUTOR = os.getenv('FFMPEG_EXECUTOR', 'process')  # 'thread' atau 'process'
+# Fetch langsung format progresif HTTP (range paralel + resume), yt-dlp sebagai fallback
+DIRECT_FETCH = os.getenv('DIRECT_FETCH', 'true').lower() in ('1', 'true', 'yes')
+FETCH_CONNECTIONS = int(os.getenv('FETCH_CONNECTIONS', 4))  # range paralel per file
+FETCH_CHUNK_SIZE = int(os.getenv('FETCH_CHUNK_MB', 4)) * 1024 * 1024
+FETCH_MIN_SPLIT = int(os.getenv('FETCH_MIN_SPLIT_MB', 8)) * 1024 * 1024  # file lebih kecil diambil satu range
+FETCH_POOL_SIZE = int(os.getenv('FETCH_POOL_SIZE', 32))  # koneksi total di session bersama
+FETCH_TIMEOUT = float(os.getenv('FETCH_TIMEOUT', 30))  # detik connect/baca per koneksi
+# Pipeline job: worker per tahap (download = jaringan, ffmpeg = CPU, upload = jaringan) diatur terpisah
+PIPELINE_DOWNLOAD_WORKERS = int(os.getenv('PIPELINE_DOWNLOAD_WORKERS', DOWNLOAD_WORKERS))
+PIPELINE_UPLOAD_WORKERS = int(os.getenv('PIPELINE_UPLOAD_WORKERS', 4))
+# Instance yt-dlp siap pakai yang disimpan per profil (info, video, audio, tiktok)
+YDL_POOL_IDLE = int(os.getenv('YDL_POOL_IDLE', 4))
+
+# Upload Configuration
+UPLOAD_CONNECTION_POOL = int(os.getenv('UPLOAD_CONNECTION_POOL', 16))
+UPLOAD_WRITE_TIMEOUT = float(os.getenv('UPLOAD_WRITE_TIMEOUT', 300))
+UPLOAD_READ_TIMEOUT = float(os.getenv('UPLOAD_READ_TIMEOUT', 120))
+UPLOAD_MAX_INFLIGHT_BYTES = int(os.getenv('UPLOAD_MAX_INFLIGHT_BYTES', 200 * 1024 * 1024))
+UPLOAD_RETRIES = int(os.getenv('UPLOAD_RETRIES', 3))
+
+# Progress Configuration
+PROGRESS_EDIT_INTERVAL = float(os.getenv('PROGRESS_EDIT_INTERVAL', 4))  # detik antar edit pesan status
+
+# Stats Configuration
+STATS_DB = os.getenv('STATS_DB', 'logs/stats.db')
+
+# Cache Configuration
+INFO_CACHE_SIZE = int(os.getenv('INFO_CACHE_SIZE', 1000))
+INFO_CACHE_TTL = int(os.getenv('INFO_CACHE_TTL', 1800))  # 30 menit, URL format yt-dlp bisa kedaluwarsa
+INFO_CACHE_DB = os.getenv('INFO_CACHE_DB', '')  # mis. cache/info.db, kosong = memori saja
+FILE_ID_CACHE_DB = os.getenv('FILE_ID_CACHE_DB', 'cache/file_ids.db')
+
+# Callback Session Configuration
+CALLBACK_SESSION_SIZE = int(os.getenv('CALLBACK_SESSION_SIZE', 10000))
+CALLBACK_SESSION_TTL = int(os.getenv('CALLBACK_SESSION_TTL', 6 * 3600))  # 6 jam
+
+# Queue Configuration
+JOB_QUEUE_DB = os.getenv('JOB_QUEUE_DB', 'cache/jobs.db')
+# Default: cukup job untuk mengisi semua tahap pipeline sekaligus
+MAX_CONCURRENT_JOBS = int(os.getenv(
+    'MAX_CONCURRENT_JOBS', PIPELINE_DOWNLOAD_WORKERS + FFMPEG_WORKERS + PIPELINE_UPLOAD_WORKERS
+))
+MAX_JOBS_PER_USER = int(os.getenv('MAX_JOBS_PER_USER', 1))
+MAX_QUEUED_PER_USER = int(os.getenv('MAX_QUEUED_PER_USER', 5))
+JOB_LEASE = float(os.getenv('JOB_LEASE', 60))  # detik tanpa heartbeat sebelum job diambil worker lain
+QUEUE_POLL_INTERVAL = float(os.getenv('QUEUE_POLL_INTERVAL', 1))
+# Format: platform:jumlah,platform:jumlah (mis. instagram:2,youtube:4)
+MAX_JOBS_PER_PLATFORM = {
+    platform: int(limit)
+    for platform, limit in (
+        item.split(':') for item in os.getenv('MAX_JOBS_PER_PLATFORM', 'instagram:2').split(',') if item
+    )
+}
+
+# Rate Limit Configuration (token bucket, format jumlah/detik, 0 = tanpa batas; admin tidak dibatasi)
+RATE_LIMIT_USER = os.getenv('RATE_LIMIT_USER', '10/60')  # per user
+RATE_LIMIT_CHAT = os.getenv('RATE_LIMIT_CHAT', '30/60')  # per grup/chat
+RATE_LIMIT_PLATFORM = os.getenv('RATE_LIMIT_PLATFORM', '120/60')  # semua user, per platform sumber
+RATE_LIMIT_DB = os.getenv('RATE_LIMIT_DB', '')  # mis. cache/ratelimit.db, kosong = memori saja
+
+# Batch Configuration (banyak link dalam satu pesan atau playlist)
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 20))  # maksimal media per batch
+BATCH_PARALLEL = int(os.getenv('BATCH_PARALLEL', 2))  # download paralel di dalam satu batch
+BATCH_INFO_CONCURRENCY = int(os.getenv('BATCH_INFO_CONCURRENCY', 4))  # ekstraksi info paralel saat batch dibuat
+
+# Inline Mode Configuration (@bot <url>, dijawab dari cache)
+INLINE_DEBOUNCE = float(os.getenv('INLINE_DEBOUNCE', 0.7))  # detik menunggu user selesai mengetik
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', 300))  # lama hasil disimpan server Telegram
+# Chat/channel penyimpanan untuk warm-up media (file diupload ke sini untuk mendapat file_id), 0 = hanya info
+INLINE_WARMUP_CHAT_ID = int(os.getenv('INLINE_WARMUP_CHAT_ID', 0))
+INLINE_WARMUP_WORKERS = int(os.getenv('INLINE_WARMUP_WORKERS', 2))
+
+# Instagram Configuration
+# Format: user atau user:password, dipisah koma (session disimpan di INSTAGRAM_SESSION_DIR)
+INSTAGRAM_ACCOUNTS = [item for item in os.getenv('INSTAGRAM_ACCOUNTS', '').split(',') if item]
+INSTAGRAM_SESSION_DIR = os.getenv('INSTAGRAM_SESSION_DIR', 'cache/instagram')
+INSTAGRAM_HOURLY_BUDGET = int(os.getenv('INSTAGRAM_HOURLY_BUDGET', 100))  # request API per akun per jam
+INSTAGRAM_ANONYMOUS_CONTEXTS = int(os.getenv('INSTAGRAM_ANONYMOUS_CONTEXTS', 2))
+INSTAGRAM_ALBUM_WORKERS = int(os.getenv('INSTAGRAM_ALBUM_WORKERS', 4))  # item carousel yang didownload paralel
+INSTAGRAM_COOLDOWN = float(os.getenv('INSTAGRAM_COOLDOWN', 900))  # detik istirahat setelah kena 429
 
 # Supported Platforms
 SUPPORTED_PLATFORMS = {
     'youtube': ['youtube.com', 'youtu.be'],
     'instagram': ['instagram.com', 'instagr.am'],
-    'tiktok': ['tiktok.com', 'vt.tiktok.com'],
+    'tiktok': ['tiktok.com', 'vt.tiktok.com', 'vm.tiktok.com'],
     'twitter': ['twitter.com', 'x.com', 't.co'],
     'facebook': ['facebook.com', 'fb.watch', 'fb.com'],
     'reddit': ['reddit.com', 'redd.it'],
@@ -32,6 +152,24 @@ SUPPORTED_PLATFORMS = {
     'spotify': ['spotify.com', 'open.spotify.com'],
 }
 
+# Link pendek yang harus diikuti redirect-nya untuk mendapat URL asli
+SHORT_LINK_HOSTS = {'vt.tiktok.com', 'vm.tiktok.com', 'pin.it', 't.co', 'fb.watch'}
+# Host alternatif yang ditulis ulang ke host utama (mis. x.com belum dikenal semua versi yt-dlp)
+HOST_ALIASES = {
+    'x.com': 'twitter.com',
+    'www.x.com': 'twitter.com',
+    'mobile.x.com': 'mobile.twitter.com',
+    'instagr.am': 'www.instagram.com',
+}
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 5000))
+
+# Parameter query yang dibuang saat kanonikalisasi URL (selain utm_*)
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'igshid', 'igsh', 'si', 'feature', 'pp', 'ref', 'ref_src', 'ref_url',
+    's', 't_src', '_r', '_t', 'is_from_webapp', 'sender_device', 'share_app_id',
+    'share_link_id', 'mibextid', 'rdt', 'context',
+}
+
 # Messages
 WELCOME_MESSAGE = """
 🎉 <b>Selamat Datang di MediaDown Bot!</b>
@@ -86,11 +224,12 @@ HELP_MESSAGE = """
 • Pastikan link URL valid dan publik
 • Untuk Instagram, gunakan link post/reel publik
 • Video private tidak dapat didownload
-• Maksimal ukuran file: 50MB
+• Kirim beberapa link dalam satu pesan atau link playlist YouTube untuk download sekaligus (maks. {batch_max_items} media)
+• Maksimal ukuran file: {max_file_size}
 
 <b>⚠️ Batasan:</b>
 • Durasi video maksimal: 10 menit
-• Ukuran file maksimal: 50MB
+• Ukuran file maksimal: {max_file_size}
 • Beberapa konten premium mungkin tidak tersedia
 
 Jika ada masalah, hubungi admin.
@@ -3,72 +3,239 @@ Modul Downloader untuk berbagai platform sosial media
 """
 
 import os
-import re
+import copy
+import asyncio
+import time
 import yt_dlp
 import aiohttp
-import aiofiles
-from typing import Dict, Optional, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 import instaloader
-import requests
-from urllib.parse import urlparse
+
+from cache import InfoCache
+from config import (
+    DIRECT_FETCH, DOWNLOAD_PATH, FIT_SOURCE_MAX_SIZE, FIT_TO_LIMIT, INSTAGRAM_ALBUM_WORKERS, MAX_FILE_SIZE
+)
+from executor import DownloadExecutor, JobCancelled
+from fetcher import FetchError, RangeFetcher
+from formats import MediaRejected, fallback_format, plan_format
+from instagram import get_pool, new_loader
+from pipeline import get_pipeline
+from platforms import detect_platform, media_id
+from storage import MediaStorage
+from transcode import MediaProcessor
+from utils import logger
+from ydlpool import get_pool as get_ydl_pool
+
+def _format_url_expired(error: yt_dlp.utils.DownloadError) -> bool:
+    """DownloadError karena URL format dari info lama sudah kedaluwarsa (HTTP 403/410)"""
+    cause = error.exc_info[1] if error.exc_info else None
+    if getattr(cause, 'status', None) in (403, 410) or getattr(cause, 'code', None) in (403, 410):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in ('http error 403', 'http error 410', 'expired'))
+
+def _process_with_info(ydl, url: str, info: Optional[Dict]) -> Tuple[Dict, bool]:
+    """
+    Download memakai info dict dari cache, ekstrak ulang hanya jika URL
+    format-nya kedaluwarsa. Error lain diteruskan apa adanya.
+
+    Returns:
+        (info hasil download, True jika info cache basi dan harus dibuang)
+    """
+    if info is not None:
+        try:
+            return ydl.process_ie_result(copy.deepcopy(info), download=True), False
+        except yt_dlp.utils.DownloadError as e:
+            if not _format_url_expired(e):
+                raise
+            logger.info(f"URL format {url} kedaluwarsa, ekstrak ulang: {e}")
+            return ydl.extract_info(url, download=True), True
+    return ydl.extract_info(url, download=True), False
+
+def _progress_hooks(cancel_event, progress_hook=None, interval: float = 0.5) -> Dict:
+    """
+    Hook yt-dlp untuk pembatalan job dan pelaporan progress.
+    Progress di-throttle agar tidak membanjiri event loop.
+    """
+    last_report = [0.0]
+    
+    def report(payload: Dict, force: bool = False):
+        now = time.monotonic()
+        if progress_hook is not None and (force or now - last_report[0] >= interval):
+            last_report[0] = now
+            progress_hook(payload)
+    
+    def progress(d):
+        if cancel_event is not None and cancel_event.is_set():
+            raise yt_dlp.utils.DownloadCancelled()
+        if d.get('status') == 'downloading':
+            report({
+                'phase': 'download',
+                'downloaded': d.get('downloaded_bytes') or 0,
+                'total': d.get('total_bytes') or d.get('total_bytes_estimate') or 0,
+                'speed': d.get('speed') or 0,
+                'eta': d.get('eta'),
+            })
+    
+    def postprocess(d):
+        if cancel_event is not None and cancel_event.is_set():
+            raise yt_dlp.utils.DownloadCancelled()
+        if d.get('status') == 'started':
+            report({'phase': 'processing', 'step': d.get('postprocessor')}, force=True)
+    
+    return {'progress_hooks': [progress], 'postprocessor_hooks': [postprocess]}
+
+def _require_file(file_path: str):
+    """yt-dlp melewati file yang melanggar batas tanpa error, jadi cek hasilnya"""
+    if not os.path.exists(file_path):
+        raise MediaRejected(
+            "File melebihi batas ukuran/durasi dan tidak didownload"
+        )
+
+def _plan_with_fit(info: Dict, quality: str = 'best', audio_only: bool = False) -> str:
+    """
+    Format yang muat di batas upload; jika tidak ada dan fit-to-limit aktif,
+    format sampai FIT_SOURCE_MAX_SIZE yang nanti diperkecil setelah download.
+    """
+    try:
+        return plan_format(info, quality=quality, audio_only=audio_only)
+    except MediaRejected:
+        if not FIT_TO_LIMIT:
+            raise
+        return plan_format(info, quality=quality, audio_only=audio_only, max_size=FIT_SOURCE_MAX_SIZE)
+
+def _direct_format(info: Dict, format_spec: str, exts: Optional[Tuple[str, ...]] = None) -> Optional[Dict]:
+    """
+    Format progresif tunggal (satu URL HTTP, tanpa fragmen/cookie) yang bisa
+    di-fetch langsung tanpa yt-dlp; None jika harus lewat yt-dlp.
+    """
+    if not DIRECT_FETCH:
+        return None
+    fmt = next((f for f in info.get('formats') or [] if f.get('format_id') == format_spec), None)
+    if fmt is None or fmt.get('protocol') not in ('http', 'https') or not fmt.get('url'):
+        return None
+    if fmt.get('fragments') or fmt.get('cookies') or not fmt.get('ext'):
+        return None
+    if exts is not None and fmt['ext'] not in exts:
+        return None
+    return fmt
+
+def _video_metadata(info: Dict, platform: Optional[str], file_path: str) -> Dict:
+    return {
+        'title': info.get('title', 'Unknown'),
+        'duration': info.get('duration', 0),
+        'uploader': info.get('uploader', 'Unknown'),
+        'platform': platform,
+        'file_size': os.path.getsize(file_path),
+        'local_path': file_path,
+    }
+
+def _split_metadata(metadata: Dict, paths: List[str]) -> Dict:
+    """Metadata audio yang dipecah: tiap bagian menjadi item album"""
+    items = [{'path': path, 'type': 'audio', 'file_size': os.path.getsize(path)} for path in paths]
+    metadata.update(items=items, file_size=sum(item['file_size'] for item in items),
+                    local_path=items[0]['path'], fit='split')
+    return metadata
+
+def _tiktok_metadata(info: Dict, file_path: str) -> Dict:
+    return {
+        'title': (info.get('description') or 'TikTok Video')[:100],
+        'uploader': info.get('uploader', 'Unknown'),
+        'platform': 'tiktok',
+        'views': info.get('view_count', 0),
+        'likes': info.get('like_count', 0),
+        'file_size': os.path.getsize(file_path),
+        'local_path': file_path,
+    }
 
 class MediaDownloader:
-    def __init__(self):
-        self.download_path = "downloads/"
+    def __init__(self, executor: Optional[DownloadExecutor] = None,
+                 info_cache: Optional[InfoCache] = None,
+                 storage: Optional[MediaStorage] = None,
+                 processor: Optional[MediaProcessor] = None,
+                 fetcher: Optional[RangeFetcher] = None):
+        self.download_path = DOWNLOAD_PATH
         self.ensure_download_path()
+        self.executor = executor or DownloadExecutor()
+        self.info_cache = info_cache if info_cache is not None else InfoCache()
+        self.storage = storage or MediaStorage(self.download_path)
+        self.processor = processor or MediaProcessor()
+        self.fetcher = fetcher or RangeFetcher()
+    
+    def __getstate__(self):
+        # Executor dan cache tidak ikut dikirim ke worker process
+        state = self.__dict__.copy()
+        state['executor'] = None
+        state['info_cache'] = None
+        state['processor'] = None
+        state['fetcher'] = None
+        return state
         
     def ensure_download_path(self):
         """Memastikan folder download ada"""
         if not os.path.exists(self.download_path):
             os.makedirs(self.download_path)
     
-    def detect_platform(self, url: str) -> Optional[str]:
-        """Deteksi platform dari URL"""
-        platforms = {
-            'youtube': ['youtube.com', 'youtu.be'],
-            'instagram': ['instagram.com', 'instagr.am'],
-            'tiktok': ['tiktok.com', 'vt.tiktok.com'],
-            'twitter': ['twitter.com', 'x.com', 't.co'],
-            'facebook': ['facebook.com', 'fb.watch', 'fb.com'],
-            'reddit': ['reddit.com', 'redd.it'],
-            'pinterest': ['pinterest.com', 'pin.it'],
-            'soundcloud': ['soundcloud.com'],
-        }
-        
-        url_lower = url.lower()
-        for platform, domains in platforms.items():
-            if any(domain in url_lower for domain in domains):
-                return platform
-        return None
-    
-    async def get_info(self, url: str) -> Dict:
+    async def get_info(self, url: str, job_id: Optional[str] = None) -> Dict:
         """Mendapatkan informasi media"""
-        platform = self.detect_platform(url)
-        
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-        }
+        platform = detect_platform(url)
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                return {
-                    'title': info.get('title', 'Unknown'),
-                    'duration': info.get('duration', 0),
-                    'uploader': info.get('uploader', 'Unknown'),
-                    'platform': platform or 'unknown',
-                    'thumbnail': info.get('thumbnail', ''),
-                    'formats': len(info.get('formats', [])),
-                    'filesize': info.get('filesize_approx', 0),
-                    'description': info.get('description', '')[:200] + '...' if info.get('description') else '',
-                }
+            info = await self.extract_info(url, job_id=job_id)
+        except JobCancelled:
+            raise
         except Exception as e:
             return {'error': str(e), 'platform': platform}
+        
+        return {
+            'title': info.get('title', 'Unknown'),
+            'duration': info.get('duration', 0),
+            'uploader': info.get('uploader', 'Unknown'),
+            'platform': platform or 'unknown',
+            'thumbnail': info.get('thumbnail', ''),
+            'formats': len(info.get('formats', [])),
+            'filesize': info.get('filesize_approx', 0),
+            'description': info.get('description', '')[:200] + '...' if info.get('description') else '',
+        }
+    
+    async def extract_info(self, url: str, job_id: Optional[str] = None) -> Dict:
+        """Info dict lengkap yt-dlp, diambil dari cache jika masih berlaku"""
+        key = media_id(url)
+        info = self.info_cache.get(key)
+        if info is None:
+            info = await self.executor.run(self._extract_info_sync, url, job_id=job_id)
+            self.info_cache.set(key, info)
+        return info
+    
+    def _extract_info_sync(self, url: str, cancel_event=None) -> Dict:
+        with get_ydl_pool().checkout('info') as ydl:
+            info = ydl.extract_info(url, download=False)
+            return ydl.sanitize_info(info, remove_private_keys=True)
     
-    async def download_video(self, url: str, quality: str = 'best', audio_only: bool = False) -> Tuple[str, Dict]:
+    async def expand_playlist(self, url: str, job_id: Optional[str] = None) -> List[Dict]:
+        """Entry playlist (url, title, duration) tanpa mengekstrak tiap video"""
+        return await self.executor.run(self._expand_playlist_sync, url, job_id=job_id)
+    
+    def _expand_playlist_sync(self, url: str, cancel_event=None) -> List[Dict]:
+        with get_ydl_pool().checkout('playlist') as ydl:
+            info = ydl.extract_info(url, download=False)
+        
+        entries = []
+        for entry in info.get('entries') or [info]:
+            entry_url = entry.get('webpage_url') or entry.get('url')
+            if entry_url:
+                entries.append({
+                    'url': entry_url,
+                    'title': entry.get('title') or 'Unknown',
+                    'duration': entry.get('duration') or 0,
+                })
+        return entries
+    
+    async def download_video(self, url: str, quality: str = 'best', audio_only: bool = False,
+                             job_id: Optional[str] = None,
+                             progress: Optional[Callable[[Dict], None]] = None) -> Tuple[str, Dict]:
         """
         Download video/audio dari URL
         
@@ -76,153 +243,318 @@ class MediaDownloader:
             url: URL media
             quality: 'best', 'worst', atau resolusi spesifik
             audio_only: True untuk download audio saja
+            job_id: ID job untuk pembatalan lewat executor
+            progress: callback progress (dipanggil di event loop)
         
         Returns:
             Tuple (file_path, metadata)
         """
-        platform = self.detect_platform(url)
-        filename = f"{platform}_{hash(url) % 10000000}"
+        info = await self.extract_info(url)
         
-        if audio_only:
-            filename += ".mp3"
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': f'{self.download_path}{filename}',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'quiet': True,
-                'no_warnings': True,
-            }
-        else:
-            if quality == 'hd':
-                format_spec = 'bestvideo[height<=1080]+bestaudio/best[height<=1080]'
-            elif quality == '720':
-                format_spec = 'bestvideo[height<=720]+bestaudio/best[height<=720]'
-            elif quality == '480':
-                format_spec = 'bestvideo[height<=480]+bestaudio/best[height<=480]'
+        # File yang masih ada di cache disk tidak perlu didownload ulang
+        cached = self.storage.lookup(media_id(url), 'audio' if audio_only else quality)
+        if cached:
+            return cached, _video_metadata(info, detect_platform(url), cached)
+        parts = self.storage.lookup_parts(media_id(url), 'audio') if audio_only else []
+        if parts:
+            metadata = _video_metadata(info, detect_platform(url), parts[0])
+            return parts[0], _split_metadata(metadata, parts)
+        
+        # Pilih format dari metadata sebelum ada byte yang didownload
+        format_spec = _plan_with_fit(info, quality=quality, audio_only=audio_only)
+        # Format progresif langsung di-fetch paralel per range; selain itu lewat yt-dlp.
+        # Video disimpan sebagai .mp4 seperti outtmpl yt-dlp, jadi hanya format mp4 yang diambil langsung
+        variant = 'audio-source' if audio_only else quality
+        fmt = _direct_format(info, format_spec, None if audio_only else ('mp4',))
+        async with get_pipeline().stage('download'):
+            file_path = fmt and await self._fetch_direct(fmt, media_id(url), variant, progress)
+            if file_path:
+                metadata = _video_metadata(info, detect_platform(url), file_path)
             else:
-                format_spec = 'best'
-            
-            filename += ".mp4"
-            ydl_opts = {
-                'format': format_spec,
-                'outtmpl': f'{self.download_path}{filename}',
-                'quiet': True,
-                'no_warnings': True,
-                'merge_output_format': 'mp4',
-            }
+                file_path, metadata = await self.executor.run(
+                    self._download_video_sync, url, quality, audio_only, info, format_spec,
+                    job_id=job_id, progress=progress
+                )
+                if metadata.pop('info_expired', False):
+                    self.info_cache.invalidate(media_id(url))
+        
+        if audio_only:
+            # Remux/encode di pool ffmpeg sendiri agar worker download tidak tertahan CPU
+            result = await self.processor.extract_audio(self.storage, file_path, media_id(url), progress=progress)
+            file_path = result['path']
+            metadata.update(
+                file_size=os.path.getsize(file_path),
+                local_path=file_path,
+                encode={key: result[key] for key in ('mode', 'codec', 'seconds')}
+            )
+        
+        file_path, metadata = await self._fit_to_limit(
+            file_path, metadata, media_id(url), 'audio' if audio_only else quality, audio_only, progress
+        )
+        return self._store(file_path, metadata), metadata
+    
+    async def _fit_to_limit(self, file_path: str, metadata: Dict, key: str, variant: str,
+                            audio_only: bool, progress=None) -> Tuple[str, Dict]:
+        """Perkecil video atau pecah audio yang melebihi MAX_FILE_SIZE agar tetap bisa dikirim"""
+        if not FIT_TO_LIMIT or metadata['file_size'] <= MAX_FILE_SIZE:
+            return file_path, metadata
         
+        if audio_only:
+            result = await self.processor.split_audio(self.storage, file_path, key, variant, progress=progress)
+            # Manifest ikut cache disk (tanpa pin) agar request berikutnya menemukan semua bagian
+            self.storage.release(self.storage.store(result['manifest']))
+            metadata = _split_metadata(metadata, result['paths'])
+            return result['paths'][0], metadata
+        
+        result = await self.processor.fit_video(self.storage, file_path, key, variant, progress=progress)
+        metadata.update(file_size=os.path.getsize(result['path']), local_path=result['path'],
+                        fit=f"{result['height']}p")
+        return result['path'], metadata
+    
+    async def _fetch_direct(self, fmt: Dict, key: str, variant: str, progress=None) -> Optional[str]:
+        """Download format lewat RangeFetcher, None jika harus kembali ke yt-dlp"""
+        partial = self.storage.partial_path(key, variant, fmt['ext'])
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                file_path = f"{self.download_path}{filename}"
-                
-                # Cek ukuran file
-                file_size = os.path.getsize(file_path)
-                
-                metadata = {
-                    'title': info.get('title', 'Unknown'),
-                    'duration': info.get('duration', 0),
-                    'uploader': info.get('uploader', 'Unknown'),
-                    'platform': platform,
-                    'file_size': file_size,
-                    'local_path': file_path,
-                }
-                
-                return file_path, metadata
+            await self.fetcher.fetch(
+                fmt['url'], partial, headers=fmt.get('http_headers'),
+                max_size=FIT_SOURCE_MAX_SIZE, progress=progress
+            )
+        except (FetchError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Sisa download tetap disimpan untuk dilanjutkan (mis. setelah URL diekstrak ulang)
+            logger.warning(f"Fetch langsung gagal, memakai yt-dlp: {e}")
+            self.fetcher.fallbacks += 1
+            return None
+        return self.storage.commit(partial, key, variant)
+    
+    def _store(self, file_path: str, metadata: Dict) -> str:
+        """Daftarkan file (atau semua bagian/item album) ke cache disk"""
+        for item in metadata.get('items') or []:
+            self.storage.store(item['path'])
+        if not metadata.get('items'):
+            self.storage.store(file_path)
+        return file_path
+    
+    def _download_video_sync(self, url: str, quality: str = 'best', audio_only: bool = False,
+                             info: Optional[Dict] = None, format_spec: Optional[str] = None,
+                             cancel_event=None, progress_hook=None) -> Tuple[str, Dict]:
+        platform = detect_platform(url)
+        key = media_id(url)
+        # Varian (audio/kualitas) ikut menentukan nama file agar job berbeda tidak saling menimpa.
+        # Audio disimpan sebagai track sumber dulu, lalu diproses MediaProcessor
+        variant = 'audio-source' if audio_only else quality
+        format_spec = format_spec or fallback_format(quality, audio_only)
+        
+        try:
+            with self.storage.job_dir(key, variant) as job_dir:
+                with get_ydl_pool().checkout(
+                    'audio' if audio_only else 'video',
+                    format=format_spec,
+                    outtmpl=os.path.join(job_dir, 'media.%(ext)s' if audio_only else 'media.mp4'),
+                    **_progress_hooks(cancel_event, progress_hook),
+                ) as ydl:
+                    info, expired = _process_with_info(ydl, url, info)
+                    temp_path = ydl.prepare_filename(info)
+                _require_file(temp_path)
+                file_path = self.storage.commit(temp_path, key, variant)
+            
+            metadata = _video_metadata(info, platform, file_path)
+            # Cache info dibuang di proses utama (worker process tidak memegang InfoCache)
+            metadata['info_expired'] = expired
+            
+            return file_path, metadata
                 
+        except MediaRejected:
+            raise
         except Exception as e:
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled("Download dibatalkan")
             raise Exception(f"Download error: {str(e)}")
     
-    async def download_instagram(self, url: str) -> Tuple[str, Dict]:
-        """Download khusus Instagram menggunakan instaloader"""
-        try:
-            L = instaloader.Instaloader(
-                dirname_pattern=self.download_path,
-                filename_pattern=f'ig_{hash(url) % 10000000}',
-                download_videos=True,
-                download_video_thumbnails=False,
-                download_geotags=False,
-                download_comments=False,
-                save_metadata=False,
-                post_metadata_txt_pattern='',
+    async def download_instagram(self, url: str, job_id: Optional[str] = None,
+                                 progress: Optional[Callable[[Dict], None]] = None) -> Tuple[str, Dict]:
+        """
+        Download khusus Instagram menggunakan instaloader.
+        Post carousel menghasilkan ``metadata['items']`` berisi semua item album.
+        """
+        async with get_pipeline().stage('download'):
+            file_path, metadata = await self.executor.run(
+                self._download_instagram_sync, url, job_id=job_id, progress=progress
             )
+        metadata.pop('info_expired', None)  # fallback yt-dlp tanpa info cache
+        for item in metadata.get('items') or []:
+            self.storage.store(item['path'], hit=item.pop('from_cache'))
+        if not metadata.get('items'):
+            self.storage.store(file_path)
+        return file_path, metadata
+    
+    def _download_instagram_sync(self, url: str, cancel_event=None, progress_hook=None) -> Tuple[str, Dict]:
+        key = media_id(url)
+        try:
+            with self.storage.job_dir(key, 'instagram') as job_dir, get_pool().checkout() as L:
+                # Context (session, cookie) dipinjam dari pool, hanya folder tujuan yang per job
+                L.dirname_pattern = job_dir
+                L.filename_pattern = 'media'
+                
+                # Extract shortcode dari URL
+                shortcode = url.split('/p/')[-1].split('/')[0]
+                if 'reel' in url:
+                    shortcode = url.split('/reel/')[-1].split('/')[0]
+                
+                post = instaloader.Post.from_shortcode(L.context, shortcode)
+                
+                if post.typename == 'GraphSidecar':
+                    items = self._download_sidecar(post, key, job_dir, cancel_event, progress_hook)
+                else:
+                    items = [self._download_single_post(L, post, key, job_dir)]
+                
+                # Metadata dibaca selagi context masih dipinjam (bisa memicu request)
+                metadata = {
+                    'title': post.caption[:100] if post.caption else 'Instagram Post',
+                    'uploader': post.owner_username,
+                    'platform': 'instagram',
+                    'likes': post.likes,
+                    'file_size': sum(item['file_size'] for item in items),
+                    'local_path': items[0]['path'],
+                    'items': items,
+                }
             
-            # Extract shortcode dari URL
-            shortcode = url.split('/p/')[-1].split('/')[0]
-            if 'reel' in url:
-                shortcode = url.split('/reel/')[-1].split('/')[0]
-            
-            post = instaloader.Post.from_shortcode(L.context, shortcode)
-            
-            # Download
-            L.download_post(post, target=self.download_path)
-            
-            # Cari file yang didownload
-            files = os.listdir(self.download_path)
-            target_file = None
+            return items[0]['path'], metadata
             
-            for file in files:
-                if file.startswith(f'ig_{hash(url) % 10000000}') and (file.endswith('.mp4') or file.endswith('.jpg')):
-                    target_file = os.path.join(self.download_path, file)
-                    break
+        except Exception as e:
+            # Fallback ke yt-dlp jika instaloader gagal
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled("Download dibatalkan")
+            return self._download_video_sync(url, cancel_event=cancel_event, progress_hook=progress_hook)
+    
+    def _download_single_post(self, L, post, key: str, job_dir: str) -> Dict:
+        """Post satu media; cek cache disk sebelum download"""
+        target_file = self.storage.find(key, 'instagram')
+        from_cache = target_file is not None
+        if not target_file:
+            L.download_post(post, target=job_dir)
             
-            if not target_file:
+            # File hasil ada di direktori job sendiri, tidak perlu scan downloads/
+            files = sorted(os.listdir(job_dir), key=lambda name: (not name.endswith('.mp4'), name))
+            temp_path = next(
+                (os.path.join(job_dir, name) for name in files if name.endswith(('.mp4', '.jpg'))),
+                None
+            )
+            if not temp_path:
                 raise Exception("File tidak ditemukan setelah download")
+            target_file = self.storage.commit(temp_path, key, 'instagram')
+        
+        return {
+            'path': target_file,
+            'type': 'video' if target_file.endswith('.mp4') else 'photo',
+            'file_size': os.path.getsize(target_file),
+            'from_cache': from_cache,
+        }
+    
+    def _download_sidecar(self, post, key: str, job_dir: str,
+                          cancel_event=None, progress_hook=None) -> List[Dict]:
+        """
+        Download semua item carousel secara paralel, item yang sudah di cache
+        dilewati. Context akun tidak thread-safe, jadi setiap thread memakai
+        context sendiri (file media diambil dari CDN tanpa session akun).
+        """
+        nodes = list(post.get_sidecar_nodes())
+        done = [0]
+        lock = threading.Lock()
+        local = threading.local()
+        
+        def fetch(entry) -> Dict:
+            index, node = entry
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled("Download dibatalkan")
             
-            metadata = {
-                'title': post.caption[:100] if post.caption else 'Instagram Post',
-                'uploader': post.owner_username,
-                'platform': 'instagram',
-                'likes': post.likes,
-                'file_size': os.path.getsize(target_file),
-                'local_path': target_file,
-            }
-            
-            return target_file, metadata
+            variant = f"instagram-{index}"
+            path = self.storage.find(key, variant)
+            from_cache = path is not None
+            if not path:
+                prefix = f"media_{index}"
+                if not hasattr(local, 'loader'):
+                    local.loader = new_loader()
+                local.loader.download_pic(
+                    os.path.join(job_dir, prefix),
+                    node.video_url if node.is_video else node.display_url,
+                    post.date_utc
+                )
+                name = next(name for name in os.listdir(job_dir) if name.startswith(f"{prefix}."))
+                path = self.storage.commit(os.path.join(job_dir, name), key, variant)
             
-        except Exception as e:
-            # Fallback ke yt-dlp jika instaloader gagal
-            return await self.download_video(url)
+            with lock:
+                done[0] += 1
+                if progress_hook:
+                    progress_hook({'phase': 'processing', 'step': f"album {done[0]}/{len(nodes)}"})
+            return {
+                'path': path,
+                'type': 'video' if node.is_video else 'photo',
+                'file_size': os.path.getsize(path),
+                'from_cache': from_cache,
+            }
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(INSTAGRAM_ALBUM_WORKERS, len(nodes)))) as pool:
+            return list(pool.map(fetch, enumerate(nodes, 1)))
     
-    async def download_tiktok(self, url: str, watermark: bool = False) -> Tuple[str, Dict]:
+    async def download_tiktok(self, url: str, watermark: bool = False,
+                              job_id: Optional[str] = None,
+                              progress: Optional[Callable[[Dict], None]] = None) -> Tuple[str, Dict]:
         """Download TikTok (tanpa watermark jika memungkinkan)"""
-        # Gunakan yt-dlp dengan opsi khusus TikTok
-        ydl_opts = {
-            'format': 'best',
-            'outtmpl': f'{self.download_path}tiktok_{hash(url) % 10000000}.%(ext)s',
-            'quiet': True,
-            'no_warnings': True,
-            'cookiesfrombrowser': None,  # Bisa ditambahkan cookies jika perlu
-        }
+        info = await self.extract_info(url)
+        
+        cached = self.storage.lookup(media_id(url), 'tiktok')
+        if cached:
+            return cached, _tiktok_metadata(info, cached)
+        
+        format_spec = _plan_with_fit(info)
+        fmt = _direct_format(info, format_spec)
+        async with get_pipeline().stage('download'):
+            file_path = fmt and await self._fetch_direct(fmt, media_id(url), 'tiktok', progress)
+            if file_path:
+                metadata = _tiktok_metadata(info, file_path)
+            else:
+                file_path, metadata = await self.executor.run(
+                    self._download_tiktok_sync, url, watermark, info, format_spec,
+                    job_id=job_id, progress=progress
+                )
+                if metadata.pop('info_expired', False):
+                    self.info_cache.invalidate(media_id(url))
+        file_path, metadata = await self._fit_to_limit(file_path, metadata, media_id(url), 'tiktok', False, progress)
+        return self._store(file_path, metadata), metadata
+    
+    def _download_tiktok_sync(self, url: str, watermark: bool = False, info: Optional[Dict] = None,
+                              format_spec: Optional[str] = None,
+                              cancel_event=None, progress_hook=None) -> Tuple[str, Dict]:
+        key = media_id(url)
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                file_path = ydl.prepare_filename(info)
-                
-                metadata = {
-                    'title': info.get('description', 'TikTok Video')[:100],
-                    'uploader': info.get('uploader', 'Unknown'),
-                    'platform': 'tiktok',
-                    'views': info.get('view_count', 0),
-                    'likes': info.get('like_count', 0),
-                    'file_size': os.path.getsize(file_path),
-                    'local_path': file_path,
-                }
-                
-                return file_path, metadata
+            with self.storage.job_dir(key, 'tiktok') as job_dir:
+                # Gunakan yt-dlp dengan opsi khusus TikTok
+                with get_ydl_pool().checkout(
+                    'tiktok',
+                    format=format_spec or fallback_format(),
+                    outtmpl=os.path.join(job_dir, 'media.%(ext)s'),
+                    **_progress_hooks(cancel_event, progress_hook),
+                ) as ydl:
+                    info, expired = _process_with_info(ydl, url, info)
+                    temp_path = ydl.prepare_filename(info)
+                _require_file(temp_path)
+                file_path = self.storage.commit(temp_path, key, 'tiktok')
+            
+            metadata = _tiktok_metadata(info, file_path)
+            metadata['info_expired'] = expired
+            
+            return file_path, metadata
                 
+        except MediaRejected:
+            raise
         except Exception as e:
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled("Download dibatalkan")
             raise Exception(f"TikTok download error: {str(e)}")
     
-    def cleanup(self, file_path: str):
-        """Membersihkan file setelah dikirim"""
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            print(f"Error cleanup: {e}")
\ No newline at end of file
+    def release(self, file_path: str, metadata: Optional[Dict] = None):
+        """Lepas file (dan semua item album) setelah dikirim; file tetap di cache disk sampai tergusur"""
+        items = (metadata or {}).get('items')
+        for path in [item['path'] for item in items] if items else [file_path]:
+            self.storage.release(path)
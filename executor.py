@@ -0,0 +1,298 @@
+"""
+Executor untuk menjalankan job download di luar event loop
+"""
+
+import asyncio
+import contextlib
+import functools
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from config import DOWNLOAD_EXECUTOR, DOWNLOAD_WORKERS
+
+
+class JobCancelled(Exception):
+    """Job download dibatalkan oleh user"""
+
+
+class DownloadJob:
+    """Satu job yang sedang berjalan di worker pool"""
+
+    def __init__(self, job_id: str, future: Future, cancel_event):
+        self.id = job_id
+        self.future = future
+        self.cancel_event = cancel_event
+        self.cancelled = False
+
+    def cancel(self):
+        """Batalkan job (pending langsung batal, running berhenti di hook berikutnya)"""
+        self.cancelled = True
+        self.cancel_event.set()
+        self.future.cancel()
+
+
+class _QueueReporter:
+    """Callback progress yang bisa di-pickle untuk worker process"""
+
+    def __init__(self, queue, job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+
+    def __call__(self, payload: Dict):
+        self.queue.put((self.job_id, payload))
+
+
+class DownloadExecutor:
+    """
+    Worker pool (thread atau process) untuk pekerjaan blocking seperti
+    yt-dlp dan instaloader, sehingga event loop bot tetap responsif.
+
+    Fungsi yang di-submit menerima keyword ``cancel_event`` yang harus
+    dicek secara berkala (mis. lewat progress hook yt-dlp). Jika ``run``
+    dipanggil dengan ``progress``, fungsi juga menerima ``progress_hook``
+    yang meneruskan dict progress ke callback di event loop.
+    """
+
+    def __init__(self, max_workers: int = DOWNLOAD_WORKERS, mode: str = DOWNLOAD_EXECUTOR):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Mode executor tidak dikenal: {mode}")
+        self.max_workers = max_workers
+        self.mode = mode
+        self._pool = None
+        self._manager = None
+        self._progress_queue = None
+        self._progress_listeners: Dict[str, tuple] = {}
+        self._jobs: Dict[str, DownloadJob] = {}
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _ensure_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if self.mode == 'process':
+                    self._manager = multiprocessing.Manager()
+                    self._progress_queue = self._manager.Queue()
+                    threading.Thread(
+                        target=self._forward_progress, args=(self._progress_queue,),
+                        name='download-progress', daemon=True
+                    ).start()
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix='download'
+                    )
+            return self._pool
+
+    def _new_event(self):
+        if self.mode == 'process':
+            return self._manager.Event()
+        return threading.Event()
+
+    def _forward_progress(self, queue):
+        # Thread pembaca progress dari worker process
+        while True:
+            try:
+                item = queue.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            job_id, payload = item
+            listener = self._progress_listeners.get(job_id)
+            if listener:
+                loop, callback = listener
+                loop.call_soon_threadsafe(callback, payload)
+
+    def _progress_reporter(self, job_id: str, callback: Callable[[Dict], None]) -> Callable[[Dict], None]:
+        loop = asyncio.get_running_loop()
+        if self.mode == 'process':
+            self._progress_listeners[job_id] = (loop, callback)
+            return _QueueReporter(self._progress_queue, job_id)
+        return functools.partial(loop.call_soon_threadsafe, callback)
+
+    def submit(self, fn: Callable, *args, job_id: Optional[str] = None, **kwargs) -> DownloadJob:
+        """Kirim fungsi ke worker pool dan kembalikan DownloadJob"""
+        pool = self._ensure_pool()
+        job_id = job_id or f"job{next(self._counter)}"
+        cancel_event = self._new_event()
+        future = pool.submit(fn, *args, cancel_event=cancel_event, **kwargs)
+
+        job = DownloadJob(job_id, future, cancel_event)
+        self._jobs[job_id] = job
+        future.add_done_callback(lambda _: self._jobs.pop(job_id, None))
+        return job
+
+    async def run(self, fn: Callable, *args, job_id: Optional[str] = None,
+                  progress: Optional[Callable[[Dict], None]] = None, **kwargs) -> Any:
+        """Jalankan fungsi di worker pool dan tunggu hasilnya tanpa memblok event loop"""
+        job_id = job_id or f"job{next(self._counter)}"
+        if progress is not None:
+            self._ensure_pool()
+            kwargs['progress_hook'] = self._progress_reporter(job_id, progress)
+
+        job = self.submit(fn, *args, job_id=job_id, **kwargs)
+        try:
+            return await asyncio.wrap_future(job.future)
+        except asyncio.CancelledError:
+            if job.cancelled:
+                raise JobCancelled(f"Job {job.id} dibatalkan")
+            job.cancel()
+            raise
+        finally:
+            self._progress_listeners.pop(job_id, None)
+
+    def cancel(self, job_id: str) -> bool:
+        """Batalkan job berdasarkan ID, return False jika job tidak ditemukan"""
+        job = self._jobs.get(job_id)
+        if not job:
+            return False
+        job.cancel()
+        return True
+
+    def active_jobs(self) -> int:
+        """Jumlah job yang sedang antri atau berjalan"""
+        return len(self._jobs)
+
+    def shutdown(self, wait: bool = False):
+        """Hentikan worker pool"""
+        for job in list(self._jobs.values()):
+            job.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+        if self._progress_queue is not None:
+            self._progress_queue.put(None)
+            self._progress_queue = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+class _Flight:
+    """Satu job bersama beserta para konsumennya"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.consumers: Dict[str, asyncio.Event] = {}
+        self.listeners: Dict[str, Callable[[Dict], None]] = {}
+        self.last_progress: Optional[Dict] = None
+
+    def report(self, payload: Dict):
+        """Teruskan progress job ke semua konsumen"""
+        self.last_progress = payload
+        for listener in list(self.listeners.values()):
+            listener(payload)
+
+
+class SingleFlight:
+    """
+    Menggabungkan request identik yang sedang berjalan menjadi satu job.
+
+    Semua konsumen dengan key yang sama menunggu task yang sama; hasilnya
+    baru dilepas (``on_release``, mis. menghapus file) setelah konsumen
+    terakhir selesai. Job bersama hanya dibatalkan jika semua konsumen
+    membatalkan. ``factory`` menerima callback ``report`` untuk progress
+    yang diteruskan ke ``on_progress`` setiap konsumen.
+    """
+
+    def __init__(self, on_release: Optional[Callable[[Any], None]] = None):
+        self.on_release = on_release
+        self.coalesced = 0
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._consumers: Dict[str, asyncio.Event] = {}
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, key: Hashable, factory: Callable[[Callable[[Dict], None]], Awaitable],
+                      consumer_id: str, on_progress: Optional[Callable[[Dict], None]] = None):
+        """Ikut (atau mulai) job untuk key, yield hasilnya selama konteks aktif"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.ensure_future(factory(flight.report))
+            flight.task.add_done_callback(lambda task: self._forget_failed(key, flight))
+            self._flights[key] = flight
+        else:
+            self.coalesced += 1
+            if on_progress and flight.last_progress:
+                on_progress(flight.last_progress)
+
+        if on_progress:
+            flight.listeners[consumer_id] = on_progress
+        cancelled = asyncio.Event()
+        flight.consumers[consumer_id] = cancelled
+        self._consumers[consumer_id] = cancelled
+        try:
+            waiter = asyncio.ensure_future(cancelled.wait())
+            try:
+                await asyncio.wait({flight.task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+
+            if cancelled.is_set():
+                raise JobCancelled(f"Job {consumer_id} dibatalkan")
+            yield flight.task.result()
+        finally:
+            self._release(key, flight, consumer_id)
+
+    def cancel(self, consumer_id: str) -> bool:
+        """Lepaskan satu konsumen, return False jika konsumen tidak ditemukan"""
+        cancelled = self._consumers.get(consumer_id)
+        if cancelled is None:
+            return False
+        cancelled.set()
+        return True
+
+    async def guard(self, consumer_id: str, awaitable: Awaitable):
+        """
+        Jalankan langkah setelah hasil bersama diterima (mis. upload) dan
+        hentikan jika konsumen membatalkan di tengah jalan.
+
+        Raises:
+            JobCancelled: konsumen membatalkan sebelum atau selama langkah ini
+        """
+        task = asyncio.ensure_future(awaitable)
+        cancelled = self._consumers.get(consumer_id)
+        if cancelled is None:
+            return await task
+        waiter = asyncio.ensure_future(cancelled.wait())
+        try:
+            await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            waiter.cancel()
+        if cancelled.is_set() and not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            raise JobCancelled(f"Job {consumer_id} dibatalkan")
+        return task.result()
+
+    def in_flight(self) -> int:
+        """Jumlah job unik yang sedang berjalan"""
+        return len(self._flights)
+
+    def _forget_failed(self, key: Hashable, flight: _Flight):
+        # Job gagal tidak dipakai ulang oleh request berikutnya
+        if flight.task.cancelled() or flight.task.exception() is not None:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _release(self, key: Hashable, flight: _Flight, consumer_id: str):
+        flight.consumers.pop(consumer_id, None)
+        flight.listeners.pop(consumer_id, None)
+        self._consumers.pop(consumer_id, None)
+        if flight.consumers:
+            return
+
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.done():
+            flight.task.cancel()
+        elif not flight.task.cancelled() and flight.task.exception() is None and self.on_release:
+            self.on_release(flight.task.result())
@@ -0,0 +1,353 @@
+"""
+Fetcher HTTP async untuk URL media langsung: range paralel dengan resume
+
+Jalankan ``python fetcher.py`` untuk benchmark throughput terhadap server
+HTTP lokal (dengan batas kecepatan per koneksi seperti CDN).
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import aiofiles
+import aiohttp
+
+try:
+    import fcntl
+except ImportError:  # Windows: tanpa kunci file antar proses
+    fcntl = None
+
+from config import FETCH_CHUNK_SIZE, FETCH_CONNECTIONS, FETCH_MIN_SPLIT, FETCH_POOL_SIZE, FETCH_TIMEOUT
+from formats import MediaRejected
+from utils import format_size
+
+# Ukuran baca/tulis di dalam satu range
+READ_SIZE = 256 * 1024
+# Percobaan ulang per range sebelum seluruh fetch dianggap gagal
+RANGE_RETRIES = 3
+# Sufiks file state resume (daftar range yang sudah selesai)
+STATE_SUFFIX = '.fetch'
+
+
+class FetchError(Exception):
+    """URL tidak bisa di-fetch langsung (status HTTP, range terpotong, file dipakai proses lain)"""
+
+
+class RangeFetcher:
+    """
+    Download satu URL media lewat beberapa request ``Range`` paralel di atas
+    satu ``aiohttp.ClientSession`` bersama (koneksi keep-alive dipakai ulang
+    antar job).
+
+    File tujuan dialokasikan dulu sesuai ukuran akhirnya, lalu tiap range
+    ditulis langsung ke offset-nya. Range yang sudah selesai dicatat di file
+    ``<tujuan>.fetch``, sehingga download yang terputus (dibatalkan, error,
+    restart) dilanjutkan dari range yang belum ada selama ukuran dan
+    ETag/Last-Modified server tidak berubah. Server tanpa dukungan range
+    di-download dengan satu koneksi dari awal.
+    """
+
+    def __init__(self, connections: int = FETCH_CONNECTIONS, chunk_size: int = FETCH_CHUNK_SIZE,
+                 min_split: int = FETCH_MIN_SPLIT, pool_size: int = FETCH_POOL_SIZE,
+                 timeout: float = FETCH_TIMEOUT):
+        self.connections = connections
+        self.chunk_size = chunk_size
+        self.min_split = min_split
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.files = 0
+        self.bytes = 0
+        self.resumed_bytes = 0
+        self.seconds = 0.0
+        self.fallbacks = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Dibuat lazy di event loop yang memakainya
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout),
+                auto_decompress=False
+            )
+        return self._session
+
+    async def close(self):
+        """Tutup session bersama"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def probe(self, url: str, headers: Dict) -> Tuple[Optional[int], bool, str]:
+        """(ukuran, dukung range, validator ETag/Last-Modified) lewat request ``bytes=0-0``"""
+        async with self._get_session().get(url, headers={**headers, 'Range': 'bytes=0-0'}) as response:
+            validator = response.headers.get('ETag') or response.headers.get('Last-Modified') or ''
+            if response.status == 206:
+                total = response.headers.get('Content-Range', '').rpartition('/')[2]
+                if total.isdigit():
+                    return int(total), True, validator
+            if response.status in (200, 206):
+                return response.content_length, False, validator
+            raise FetchError(f"HTTP {response.status}")
+
+    async def fetch(self, url: str, dest: str, headers: Optional[Dict] = None,
+                    max_size: Optional[int] = None,
+                    progress: Optional[Callable[[Dict], None]] = None) -> int:
+        """
+        Download ``url`` ke ``dest`` (dilanjutkan jika ada sisa download sebelumnya).
+
+        Returns:
+            Ukuran file dalam byte
+
+        Raises:
+            MediaRejected: ukuran melebihi ``max_size``
+            FetchError / aiohttp.ClientError: server menolak atau koneksi gagal
+        """
+        headers = dict(headers or {})
+        started = time.monotonic()
+        size, ranged, validator = await self.probe(url, headers)
+        if max_size and size and size > max_size:
+            raise MediaRejected(f"File {format_size(size)} melebihi batas {format_size(max_size)}")
+
+        fd = os.open(dest, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise FetchError("File sedang didownload proses lain")
+
+            reporter = _Reporter(progress, size or 0)
+            if ranged and size:
+                resumed = await self._fetch_ranges(url, headers, dest, fd, size, validator, reporter)
+            else:
+                os.ftruncate(fd, 0)
+                resumed = 0
+                size = await self._fetch_stream(url, headers, dest, max_size, reporter)
+        finally:
+            os.close(fd)
+
+        self.files += 1
+        self.bytes += size - resumed
+        self.resumed_bytes += resumed
+        self.seconds += time.monotonic() - started
+        return size
+
+    async def _fetch_ranges(self, url: str, headers: Dict, dest: str, fd: int, size: int,
+                            validator: str, reporter: "_Reporter") -> int:
+        chunk_size = self.chunk_size if size >= self.min_split else size
+        chunks = [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+        state_path = dest + STATE_SUFFIX
+        state = {'size': size, 'validator': validator, 'chunk_size': chunk_size, 'done': []}
+
+        saved = _load_state(state_path)
+        if (saved and os.fstat(fd).st_size == size
+                and all(saved.get(key) == state[key] for key in ('size', 'validator', 'chunk_size'))):
+            state['done'] = saved['done']
+        else:
+            # Alokasi penuh di awal agar range bisa ditulis ke offset mana pun
+            os.ftruncate(fd, size)
+            if hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(fd, 0, size)
+                except OSError:
+                    pass  # Filesystem tanpa fallocate: file tetap sparse
+            _save_state(state_path, state)
+
+        done = set(state['done'])
+        pending = [(index, chunk) for index, chunk in enumerate(chunks) if index not in done]
+        resumed = sum(end - start + 1 for index, (start, end) in enumerate(chunks) if index in done)
+        reporter.resume(resumed)
+
+        async def worker():
+            async with aiofiles.open(dest, 'r+b') as file:
+                while pending:
+                    index, (start, end) = pending.pop(0)
+                    await self._fetch_range(url, headers, file, start, end, reporter)
+                    done.add(index)
+                    state['done'] = sorted(done)
+                    _save_state(state_path, state)
+
+        tasks = [asyncio.ensure_future(worker()) for _ in range(min(self.connections, len(pending)))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        os.remove(state_path)
+        return resumed
+
+    async def _fetch_range(self, url: str, headers: Dict, file, start: int, end: int,
+                           reporter: "_Reporter"):
+        for attempt in range(1, RANGE_RETRIES + 1):
+            received = 0
+            try:
+                async with self._get_session().get(
+                    url, headers={**headers, 'Range': f"bytes={start}-{end}"}
+                ) as response:
+                    if response.status != 206:
+                        raise FetchError(f"HTTP {response.status} untuk range {start}-{end}")
+                    await file.seek(start)
+                    async for data in response.content.iter_chunked(READ_SIZE):
+                        await file.write(data)
+                        received += len(data)
+                        reporter.add(len(data))
+                if received != end - start + 1:
+                    raise FetchError(f"Range {start}-{end} terpotong ({received} byte)")
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError, FetchError):
+                reporter.add(-received)
+                if attempt == RANGE_RETRIES:
+                    raise
+
+    async def _fetch_stream(self, url: str, headers: Dict, dest: str, max_size: Optional[int],
+                            reporter: "_Reporter") -> int:
+        received = 0
+        async with self._get_session().get(url, headers=headers) as response:
+            if response.status != 200:
+                raise FetchError(f"HTTP {response.status}")
+            async with aiofiles.open(dest, 'wb') as file:
+                async for data in response.content.iter_chunked(READ_SIZE):
+                    received += len(data)
+                    if max_size and received > max_size:
+                        raise MediaRejected(f"File melebihi batas {format_size(max_size)}")
+                    await file.write(data)
+                    reporter.add(len(data))
+        return received
+
+    def summary(self) -> Dict:
+        """Jumlah file, byte, byte yang dilanjutkan, dan rata-rata throughput"""
+        return {
+            'files': self.files,
+            'bytes': self.bytes,
+            'resumed': self.resumed_bytes,
+            'fallbacks': self.fallbacks,
+            'speed': self.bytes / self.seconds if self.seconds else 0,
+        }
+
+
+class _Reporter:
+    """Progress fetch dalam format yang sama dengan hook yt-dlp (di-throttle)"""
+
+    def __init__(self, callback: Optional[Callable[[Dict], None]], total: int, interval: float = 0.5):
+        self.callback = callback
+        self.total = total
+        self.interval = interval
+        self.downloaded = 0
+        self.resumed = 0
+        self.started = time.monotonic()
+        self.last_report = 0.0
+
+    def resume(self, resumed: int):
+        self.resumed = resumed
+        self.downloaded = resumed
+
+    def add(self, count: int):
+        self.downloaded += count
+        now = time.monotonic()
+        if self.callback is None or now - self.last_report < self.interval:
+            return
+        self.last_report = now
+        speed = (self.downloaded - self.resumed) / max(now - self.started, 1e-6)
+        self.callback({
+            'phase': 'download',
+            'downloaded': self.downloaded,
+            'total': self.total,
+            'speed': speed,
+            'eta': int((self.total - self.downloaded) / speed) if self.total and speed else None,
+        })
+
+
+def _load_state(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_state(path: str, state: Dict):
+    # Tulis ke file sementara lalu replace agar state tidak pernah setengah jadi
+    with open(path + '.tmp', 'w') as file:
+        json.dump(state, file)
+    os.replace(path + '.tmp', path)
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    from aiohttp import web
+
+    SIZE = 48 * 1024 * 1024
+    RATE = 16 * 1024 * 1024  # byte/detik per koneksi, meniru throttling CDN
+
+    async def serve(request: web.Request) -> web.StreamResponse:
+        payload = request.app['payload']
+        start, end = 0, len(payload) - 1
+        status = 200
+        if request.http_range.start is not None or request.http_range.stop is not None:
+            start = request.http_range.start or 0
+            end = (request.http_range.stop or len(payload)) - 1
+            status = 206
+        response = web.StreamResponse(status=status, headers={
+            'Accept-Ranges': 'bytes',
+            'ETag': '"bench"',
+            'Content-Length': str(end - start + 1),
+            **({'Content-Range': f"bytes {start}-{end}/{len(payload)}"} if status == 206 else {}),
+        })
+        await response.prepare(request)
+        step = RATE // 20
+        try:
+            for offset in range(start, end + 1, step):
+                await response.write(payload[offset:min(offset + step, end + 1)])
+                await asyncio.sleep(0.05)
+        except ConnectionResetError:
+            pass  # Klien membatalkan range (uji resume)
+        return response
+
+    async def bench():
+        app = web.Application()
+        app['payload'] = os.urandom(SIZE)
+        app.router.add_get('/media.mp4', serve)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}/media.mp4"
+
+        print(f"Fetch {format_size(SIZE)}, server dibatasi {format_size(RATE)}/detik per koneksi:")
+        with tempfile.TemporaryDirectory() as directory:
+            for connections in (1, 2, 4, 8):
+                fetcher = RangeFetcher(connections=connections)
+                dest = os.path.join(directory, f"bench-{connections}.mp4")
+                started = time.perf_counter()
+                await fetcher.fetch(url, dest)
+                elapsed = time.perf_counter() - started
+                with open(dest, 'rb') as file:
+                    assert file.read() == app['payload'], "isi file tidak sama"
+                print(f"  {connections} koneksi: {elapsed:6.2f} detik, {format_size(SIZE / elapsed)}/detik")
+                await fetcher.close()
+
+            # Resume: batalkan di tengah jalan lalu lanjutkan
+            fetcher = RangeFetcher(connections=4)
+            dest = os.path.join(directory, 'resume.mp4')
+            task = asyncio.ensure_future(fetcher.fetch(url, dest))
+            await asyncio.sleep(0.4)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            started = time.perf_counter()
+            await fetcher.fetch(url, dest)
+            elapsed = time.perf_counter() - started
+            with open(dest, 'rb') as file:
+                assert file.read() == app['payload'], "isi file hasil resume tidak sama"
+            print(f"  resume: {format_size(fetcher.resumed_bytes)} dilanjutkan, sisa {elapsed:.2f} detik")
+            await fetcher.close()
+
+        await runner.cleanup()
+
+    asyncio.run(bench())
@@ -0,0 +1,153 @@
+"""
+Perencana pemilihan format berdasarkan metadata hasil ekstraksi
+"""
+
+from typing import Dict, List, Optional
+
+from config import MAX_FILE_SIZE, MAX_VIDEO_DURATION
+from utils import format_duration, format_size
+
+# Batas tinggi video per pilihan kualitas ('best' = file progresif terbaik)
+QUALITY_HEIGHTS = {
+    'hd': 1080,
+    '720': 720,
+    '480': 480,
+    '360': 360,
+}
+
+# Bitrate MP3 jika audio harus di-encode ulang (kbps)
+AUDIO_BITRATE = 192
+
+# Codec audio yang cukup di-remux (tanpa encode) untuk sendAudio
+COPYABLE_AUDIO_CODECS = ('mp4a', 'aac', 'mp3')
+
+
+class MediaRejected(Exception):
+    """Media ditolak sebelum download (terlalu panjang / terlalu besar)"""
+
+
+def estimate_size(fmt: Dict, duration: Optional[float]) -> Optional[int]:
+    """Perkiraan ukuran format: filesize, filesize_approx, atau tbr x durasi"""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return int(size)
+    if fmt.get('tbr') and duration:
+        return int(fmt['tbr'] * 1000 / 8 * duration)
+    return None
+
+
+def _fits(size: Optional[int], budget: int) -> bool:
+    # Ukuran tidak diketahui dianggap muat; batas keras tetap dijaga max_filesize yt-dlp
+    return size is None or size <= budget
+
+
+def _has_video(fmt: Dict) -> bool:
+    return fmt.get('vcodec') not in (None, 'none')
+
+
+def _has_audio(fmt: Dict) -> bool:
+    return fmt.get('acodec') not in (None, 'none')
+
+
+def _copyable_audio(fmt: Dict) -> bool:
+    return (fmt.get('acodec') or '').startswith(COPYABLE_AUDIO_CODECS)
+
+
+def fallback_format(quality: str = 'best', audio_only: bool = False,
+                    max_size: int = MAX_FILE_SIZE) -> str:
+    """Format string yt-dlp dengan batas ukuran, dipakai jika metadata format tidak ada"""
+    limit = f"[filesize<?{max_size}][filesize_approx<?{max_size}]"
+    if audio_only:
+        # Track AAC didahulukan agar cukup di-remux tanpa encode
+        return f"bestaudio[acodec^=mp4a]{limit}/bestaudio{limit}/best{limit}"
+    height = QUALITY_HEIGHTS.get(quality)
+    if height:
+        return (
+            f"bestvideo[height<={height}]{limit}+bestaudio/"
+            f"best[height<={height}]{limit}"
+        )
+    return f"best{limit}"
+
+
+def check_duration(info: Dict, max_duration: int = MAX_VIDEO_DURATION):
+    """Tolak media yang melebihi durasi maksimal"""
+    duration = info.get('duration')
+    if max_duration and duration and duration > max_duration:
+        raise MediaRejected(
+            f"Durasi {format_duration(int(duration))} melebihi batas "
+            f"{format_duration(max_duration)}"
+        )
+
+
+def plan_format(info: Dict, quality: str = 'best', audio_only: bool = False,
+                max_size: int = MAX_FILE_SIZE,
+                max_duration: int = MAX_VIDEO_DURATION) -> str:
+    """
+    Pilih format terbaik yang muat di bawah ``max_size`` dari daftar
+    ``formats`` hasil ekstraksi, sebelum ada byte yang didownload.
+
+    Returns:
+        Format string yt-dlp (ID format eksplisit, atau filter ukuran
+        jika metadata format tidak tersedia)
+
+    Raises:
+        MediaRejected: durasi terlalu panjang atau tidak ada format yang muat
+    """
+    check_duration(info, max_duration)
+
+    duration = info.get('duration')
+    formats: List[Dict] = [f for f in info.get('formats') or [] if f.get('format_id')]
+    if not formats:
+        return fallback_format(quality, audio_only, max_size)
+
+    # yt-dlp mengurutkan formats dari terburuk ke terbaik
+    ranked = list(reversed(formats))
+    audio = [f for f in ranked if _has_audio(f) and not _has_video(f)]
+
+    if audio_only:
+        pool = audio or [f for f in ranked if _has_audio(f)]
+        # Track yang bisa di-remux didahulukan: encode ulang memakan CPU,
+        # sedangkan selisih kualitas opus vs AAC tidak terasa di Telegram
+        copyable = [f for f in pool if _copyable_audio(f) and _fits(estimate_size(f, duration), max_size)]
+        if copyable:
+            return copyable[0]['format_id']
+        if duration and AUDIO_BITRATE * 1000 / 8 * duration > max_size:
+            raise MediaRejected(
+                f"Audio MP3 diperkirakan melebihi {format_size(max_size)}"
+            )
+        if pool:
+            return pool[0]['format_id']
+        return fallback_format(quality, audio_only, max_size)
+
+    height = QUALITY_HEIGHTS.get(quality)
+    candidates = []
+
+    for fmt in ranked:
+        if not _has_video(fmt):
+            continue
+        if height and (fmt.get('height') or 0) > height:
+            continue
+        video_size = estimate_size(fmt, duration)
+
+        if _has_audio(fmt):
+            if _fits(video_size, max_size):
+                candidates.append((fmt.get('height') or 0, fmt['format_id']))
+        elif height:
+            # Video-only: pasangkan dengan audio terbaik yang masih muat
+            budget = max_size - (video_size or 0)
+            for audio_fmt in audio:
+                if _fits(video_size, max_size) and _fits(estimate_size(audio_fmt, duration), budget):
+                    candidates.append(
+                        (fmt.get('height') or 0, f"{fmt['format_id']}+{audio_fmt['format_id']}")
+                    )
+                    break
+
+    if not candidates:
+        if not any(_has_video(f) for f in ranked):
+            # Media tanpa video (mis. SoundCloud): biarkan yt-dlp memilih
+            return fallback_format(quality, audio_only, max_size)
+        raise MediaRejected(f"Tidak ada format video di bawah {format_size(max_size)}")
+
+    # Urutan ranked sudah mengikuti preferensi yt-dlp; ambil tinggi tertinggi pertama
+    best_height = max(candidate[0] for candidate in candidates)
+    return next(spec for h, spec in candidates if h == best_height)
@@ -0,0 +1,216 @@
+"""
+Pool client Instagram: context Instaloader yang dipakai ulang dan bergiliran antar akun
+"""
+
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+from typing import Iterator, List, Optional
+
+import instaloader
+from instaloader.instaloadercontext import RateController
+
+from config import (
+    INSTAGRAM_ACCOUNTS, INSTAGRAM_ANONYMOUS_CONTEXTS, INSTAGRAM_COOLDOWN,
+    INSTAGRAM_HOURLY_BUDGET, INSTAGRAM_SESSION_DIR
+)
+from utils import logger
+
+
+class InstagramThrottled(Exception):
+    """Semua akun sedang kena limit atau kehabisan jatah request"""
+
+
+class _FailFastRateController(RateController):
+    """
+    Hitung setiap request API ke jatah per jam akun. Jangan tidur menunggu
+    saat jatah habis, jeda rate limit atau kena 429; biarkan pool memutar
+    ke akun lain.
+    """
+
+    def __init__(self, context, account: '_Account'):
+        super().__init__(context)
+        self._account = account
+
+    def wait_before_query(self, query_type: str) -> None:
+        now = time.time()
+        if self._account.remaining(now) <= 0:
+            raise InstagramThrottled(f"Jatah request per jam akun {self._account.name} habis")
+        self._account.requests.append(now)
+        super().wait_before_query(query_type)
+
+    def sleep(self, secs: float):
+        raise InstagramThrottled(f"Instagram meminta jeda {secs:.0f} detik")
+
+    def handle_429(self, query_type: str) -> None:
+        raise InstagramThrottled(f"Instagram membalas 429 untuk {query_type}")
+
+
+class _Account:
+    """Satu context Instaloader (login atau anonim) beserta jatah request-nya"""
+
+    def __init__(self, name: str, budget: int):
+        self.name = name
+        self.loader: Optional[instaloader.Instaloader] = None
+        self.budget = budget
+        self.busy = False
+        self.cooldown_until = 0.0
+        self.last_used = 0.0
+        self.requests = deque()  # waktu request dalam satu jam terakhir
+
+    def remaining(self, now: float) -> int:
+        while self.requests and now - self.requests[0] > 3600:
+            self.requests.popleft()
+        return self.budget - len(self.requests)
+
+    def available(self, now: float) -> bool:
+        return not self.busy and now >= self.cooldown_until and self.remaining(now) > 0
+
+
+class InstagramPool:
+    """
+    Menyimpan context Instaloader yang berumur panjang (cookie, session dan
+    state rate limit tetap terjaga) untuk beberapa akun sekaligus.
+
+    Setiap download meminjam satu akun secara eksklusif: akun yang paling
+    lama tidak dipakai dan masih punya jatah request per jam (dihitung per
+    request API oleh rate controller). Akun yang kena 429 didinginkan
+    selama ``cooldown`` detik. Session akun login
+    dimuat dari dan disimpan ke ``session_dir``.
+    """
+
+    def __init__(self, accounts: Optional[List[str]] = None,
+                 session_dir: str = INSTAGRAM_SESSION_DIR,
+                 hourly_budget: int = INSTAGRAM_HOURLY_BUDGET,
+                 anonymous_contexts: int = INSTAGRAM_ANONYMOUS_CONTEXTS,
+                 cooldown: float = INSTAGRAM_COOLDOWN):
+        self.session_dir = session_dir
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._accounts: List[_Account] = []
+
+        for entry in INSTAGRAM_ACCOUNTS if accounts is None else accounts:
+            username, _, password = entry.partition(':')
+            account = _Account(username, hourly_budget)
+            if self._login(account, password):
+                self._accounts.append(account)
+
+        if not self._accounts:
+            # Tanpa akun: beberapa context anonim agar download paralel tidak antri
+            for index in range(max(1, anonymous_contexts)):
+                account = _Account(f"anonim-{index + 1}", hourly_budget)
+                account.loader = new_loader(account)
+                self._accounts.append(account)
+
+    def _session_file(self, username: str) -> str:
+        return os.path.join(self.session_dir, f"session-{username}")
+
+    def _login(self, account: _Account, password: str) -> bool:
+        """Muat session dari disk, login dengan password jika belum ada"""
+        username = account.name
+        loader = account.loader = new_loader(account)
+        session_file = self._session_file(username)
+        try:
+            if os.path.exists(session_file):
+                loader.load_session_from_file(username, session_file)
+            elif password:
+                loader.login(username, password)
+                os.makedirs(self.session_dir, exist_ok=True)
+                loader.save_session_to_file(session_file)
+            else:
+                logger.warning(f"Akun Instagram {username} tidak punya session maupun password")
+                return False
+        except instaloader.exceptions.InstaloaderException as e:
+            logger.error(f"Login Instagram {username} gagal: {e}")
+            return False
+        logger.info(f"Session Instagram {username} dimuat")
+        return True
+
+    @contextlib.contextmanager
+    def checkout(self) -> Iterator[instaloader.Instaloader]:
+        """
+        Pinjam satu context Instaloader.
+
+        Raises:
+            InstagramThrottled: tidak ada akun yang bebas dan punya jatah;
+                tidak menunggu agar worker bisa langsung fallback
+        """
+        account = self._acquire()
+        try:
+            yield account.loader
+        except InstagramThrottled:
+            account.cooldown_until = time.time() + self.cooldown
+            logger.warning(f"Akun Instagram {account.name} kena limit, istirahat {self.cooldown:.0f} detik")
+            raise
+        finally:
+            if account.loader.context.is_logged_in:
+                with contextlib.suppress(OSError):
+                    account.loader.save_session_to_file(self._session_file(account.name))
+            with self._lock:
+                account.busy = False
+                account.last_used = time.time()
+
+    def _acquire(self) -> _Account:
+        with self._lock:
+            now = time.time()
+            candidates = [account for account in self._accounts if account.available(now)]
+            if not candidates:
+                # Menunggu akun bebas akan menahan worker; fallback yt-dlp lebih cepat
+                busy = any(now >= a.cooldown_until and a.remaining(now) > 0 for a in self._accounts)
+                raise InstagramThrottled(
+                    "Semua akun Instagram sedang sibuk" if busy else "Semua akun Instagram sedang kena limit"
+                )
+            account = min(candidates, key=lambda a: a.last_used)
+            account.busy = True
+            return account
+
+    def status(self) -> List[dict]:
+        """Ringkasan jatah tiap akun untuk /stats"""
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    'name': account.name,
+                    'remaining': account.remaining(now),
+                    'busy': account.busy,
+                    'cooling': now < account.cooldown_until,
+                }
+                for account in self._accounts
+            ]
+
+
+def new_loader(account: Optional[_Account] = None) -> instaloader.Instaloader:
+    """
+    Context Instaloader baru. Dengan ``account`` setiap request API dihitung
+    ke jatah akun tersebut; tanpa akun hanya untuk download file media (CDN).
+    """
+    return instaloader.Instaloader(
+        quiet=True,
+        download_videos=True,
+        download_video_thumbnails=False,
+        download_geotags=False,
+        download_comments=False,
+        save_metadata=False,
+        post_metadata_txt_pattern='',
+        rate_controller=(lambda context: _FailFastRateController(context, account)) if account else None,
+    )
+
+
+_pool: Optional[InstagramPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> InstagramPool:
+    """Pool per proses (worker process membuat pool sendiri dari session di disk)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = InstagramPool()
+        return _pool
+
+
+def peek_pool() -> Optional[InstagramPool]:
+    """Pool yang sudah dibuat, tanpa memicu login (untuk /stats)"""
+    return _pool
@@ -0,0 +1,451 @@
+"""
+Antrian job download dengan journal SQLite dan batas konkurensi
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import socket
+import sqlite3
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config import (
+    BATCH_PARALLEL, JOB_LEASE, JOB_QUEUE_DB, MAX_CONCURRENT_JOBS, MAX_JOBS_PER_PLATFORM, MAX_JOBS_PER_USER,
+    MAX_QUEUED_PER_USER, QUEUE_POLL_INTERVAL, WORKER_ID
+)
+from platforms import detect_platform
+from utils import connect_sqlite, logger
+
+JOB_FIELDS = ('job_id', 'user_id', 'chat_id', 'message_id', 'url', 'platform', 'download_type')
+
+
+class QueueFull(Exception):
+    """User sudah mencapai batas job dalam antrian"""
+
+
+class JobExists(Exception):
+    """Job dengan ID yang sama masih antri atau berjalan (mis. tombol ditekan dua kali)"""
+
+
+def job_platforms(job: Dict) -> Counter:
+    """
+    Slot per platform yang dipakai job. Batch dihitung per platform item
+    di dalamnya, paling banyak ``BATCH_PARALLEL`` (download paralel batch).
+    """
+    if job['platform'] != 'batch':
+        return Counter({job['platform']: 1})
+    platforms = Counter(detect_platform(url) or 'unknown' for url in job['url'].splitlines())
+    return Counter({platform: min(count, BATCH_PARALLEL) for platform, count in platforms.items()})
+
+
+def platform_allowed(limits: Dict[str, int], running: Counter, platforms: Counter) -> bool:
+    """Job boleh jalan jika slot platformnya muat; batch yang lebih besar dari batas cukup menunggu platform kosong"""
+    for platform, slots in platforms.items():
+        limit = limits.get(platform)
+        if limit is not None and running[platform] + max(min(slots, limit), 1) > limit:
+            return False
+    return True
+
+
+def _open_journal(db_path: str):
+    """Buka journal job dan tambahkan kolom worker jika journal masih versi lama"""
+    db = connect_sqlite(db_path)
+    db.execute(
+        'CREATE TABLE IF NOT EXISTS jobs ('
+        'job_id TEXT PRIMARY KEY, user_id INTEGER NOT NULL, chat_id INTEGER NOT NULL, '
+        'message_id INTEGER NOT NULL, url TEXT NOT NULL, platform TEXT NOT NULL, '
+        'download_type TEXT NOT NULL, priority INTEGER NOT NULL, created REAL NOT NULL, '
+        'status TEXT NOT NULL)'
+    )
+    columns = {row[1] for row in db.execute('PRAGMA table_info(jobs)')}
+    for column, definition in (('worker', 'TEXT'), ('heartbeat', 'REAL'),
+                               ('cancel', 'INTEGER NOT NULL DEFAULT 0')):
+        if column not in columns:
+            db.execute(f'ALTER TABLE jobs ADD COLUMN {column} {definition}')
+    db.commit()
+    return db
+
+
+class DownloadQueue:
+    """
+    Priority queue untuk job download.
+
+    Setiap job dicatat di journal SQLite sehingga job yang masih antri atau
+    sedang berjalan akan dilanjutkan setelah bot restart. Dispatcher hanya
+    menjalankan job yang tidak melanggar batas global, per-user dan
+    per-platform; job lain tetap menunggu tanpa menghalangi antrian.
+    """
+
+    def __init__(self, db_path: str = JOB_QUEUE_DB,
+                 max_concurrent: int = MAX_CONCURRENT_JOBS,
+                 max_per_user: int = MAX_JOBS_PER_USER,
+                 max_per_platform: Optional[Dict[str, int]] = None,
+                 max_queued_per_user: int = MAX_QUEUED_PER_USER,
+                 on_cancel: Optional[Callable[[str], object]] = None):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_per_platform = MAX_JOBS_PER_PLATFORM if max_per_platform is None else max_per_platform
+        self.max_queued_per_user = max_queued_per_user
+        self.on_cancel = on_cancel
+
+        self._db = _open_journal(db_path)
+
+        self._pending: List[tuple] = []  # heap (priority, created, seq, job)
+        self._running: Dict[str, asyncio.Task] = {}
+        self._user_running = Counter()
+        self._platform_running = Counter()
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._handler: Optional[Callable[[Dict], Awaitable]] = None
+
+    async def start(self, handler: Callable[[Dict], Awaitable]):
+        """Mulai dispatcher dan muat ulang job dari journal"""
+        self._handler = handler
+        rows = self._db.execute(
+            f"SELECT {', '.join(JOB_FIELDS)}, priority, created FROM jobs "
+            "WHERE status IN ('queued', 'running') ORDER BY created"
+        ).fetchall()
+        for row in rows:
+            job = dict(zip(JOB_FIELDS, row[:len(JOB_FIELDS)]))
+            self._push(job, row[-2], row[-1])
+        if rows:
+            self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            self._db.commit()
+            logger.info(f"Melanjutkan {len(rows)} job dari journal")
+
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+
+    async def stop(self):
+        """Hentikan dispatcher; job yang berjalan tetap di journal untuk restart berikutnya"""
+        if self._dispatcher:
+            self._dispatcher.cancel()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def submit(self, job: Dict, priority: int = 1) -> int:
+        """Masukkan job ke antrian dan kembalikan posisinya"""
+        if job['job_id'] in self._running or any(entry[3]['job_id'] == job['job_id'] for entry in self._pending):
+            raise JobExists(job['job_id'])
+        user_id = job['user_id']
+        queued = sum(1 for entry in self._pending if entry[3]['user_id'] == user_id)
+        if queued >= self.max_queued_per_user:
+            raise QueueFull(f"Maksimal {self.max_queued_per_user} job dalam antrian")
+
+        created = time.time()
+        self._db.execute(
+            f"INSERT OR REPLACE INTO jobs ({', '.join(JOB_FIELDS)}, priority, created, status) "
+            f"VALUES ({', '.join('?' * (len(JOB_FIELDS) + 3))})",
+            (*(job[field] for field in JOB_FIELDS), priority, created, 'queued')
+        )
+        self._db.commit()
+        self._push(job, priority, created)
+        self._wakeup.set()
+        return self.position(job['job_id'])
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Posisi job dalam antrian (mulai dari 1), None jika tidak sedang antri"""
+        for index, entry in enumerate(sorted(self._pending)):
+            if entry[3]['job_id'] == job_id:
+                return index + 1
+        return None
+
+    def cancel(self, job_id: str) -> bool:
+        """Keluarkan job yang masih antri, return False jika tidak ditemukan"""
+        for entry in self._pending:
+            if entry[3]['job_id'] == job_id:
+                self._pending.remove(entry)
+                heapq.heapify(self._pending)
+                self._forget(job_id)
+                return True
+        return False
+
+    def cancel_running(self, job_id: str):
+        """Minta job yang sedang berjalan untuk berhenti"""
+        if job_id in self._running and self.on_cancel:
+            self.on_cancel(job_id)
+
+    def queued(self) -> int:
+        """Jumlah job yang menunggu"""
+        return len(self._pending)
+
+    def running(self) -> int:
+        """Jumlah job yang sedang berjalan"""
+        return len(self._running)
+
+    def _push(self, job: Dict, priority: int, created: float):
+        heapq.heappush(self._pending, (priority, created, next(self._seq), job))
+
+    def _eligible(self, job: Dict) -> bool:
+        if self._user_running[job['user_id']] >= self.max_per_user:
+            return False
+        return platform_allowed(self.max_per_platform, self._platform_running, job_platforms(job))
+
+    async def _dispatch(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            for entry in sorted(self._pending):
+                if len(self._running) >= self.max_concurrent:
+                    break
+                if self._eligible(entry[3]):
+                    self._start(entry)
+
+    def _start(self, entry: tuple):
+        job = entry[3]
+        self._pending.remove(entry)
+        heapq.heapify(self._pending)
+        self._db.execute("UPDATE jobs SET status = 'running' WHERE job_id = ?", (job['job_id'],))
+        self._db.commit()
+
+        self._user_running[job['user_id']] += 1
+        self._platform_running.update(job_platforms(job))
+        self._running[job['job_id']] = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: Dict):
+        try:
+            try:
+                await self._handler(job)
+            except Exception as e:
+                logger.error(f"Job {job['job_id']} gagal: {e}")
+            self._forget(job['job_id'])
+        finally:
+            self._running.pop(job['job_id'], None)
+            self._user_running[job['user_id']] -= 1
+            self._platform_running.subtract(job_platforms(job))
+            self._wakeup.set()
+
+    def _forget(self, job_id: str):
+        self._db.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+        self._db.commit()
+
+
+class SharedJobQueue:
+    """
+    Antrian job di journal SQLite yang dipakai bersama beberapa proses.
+
+    Proses front (``consume=False``) hanya memasukkan job; proses worker
+    (``consume=True``) mengklaim job dalam transaksi ``BEGIN IMMEDIATE``
+    sehingga satu job hanya diambil satu worker. Batas per-user dan
+    per-platform dihitung dari journal (berlaku untuk semua worker), batas
+    ``max_concurrent`` berlaku per worker. Worker memperbarui heartbeat job
+    miliknya; job dengan heartbeat lebih lama dari ``lease`` detik dianggap
+    ditinggal worker yang mati dan dikembalikan ke antrian.
+    """
+
+    def __init__(self, db_path: str = JOB_QUEUE_DB, consume: bool = False,
+                 worker_id: str = WORKER_ID,
+                 max_concurrent: int = MAX_CONCURRENT_JOBS,
+                 max_per_user: int = MAX_JOBS_PER_USER,
+                 max_per_platform: Optional[Dict[str, int]] = None,
+                 max_queued_per_user: int = MAX_QUEUED_PER_USER,
+                 lease: float = JOB_LEASE, poll_interval: float = QUEUE_POLL_INTERVAL,
+                 on_cancel: Optional[Callable[[str], object]] = None):
+        self.consume = consume
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_per_platform = MAX_JOBS_PER_PLATFORM if max_per_platform is None else max_per_platform
+        self.max_queued_per_user = max_queued_per_user
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.on_cancel = on_cancel
+
+        self._db = _open_journal(db_path)
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._poller: Optional[asyncio.Task] = None
+        self._handler: Optional[Callable[[Dict], Awaitable]] = None
+
+    async def start(self, handler: Callable[[Dict], Awaitable]):
+        """Mulai mengklaim job (hanya untuk proses worker)"""
+        self._handler = handler
+        if self.consume:
+            logger.info(f"Worker {self.worker_id} mulai mengambil job")
+            self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        """Hentikan worker dan kembalikan job yang belum selesai ke antrian"""
+        if self._poller:
+            self._poller.cancel()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.consume:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL WHERE worker = ? AND status = 'running'",
+                (self.worker_id,)
+            )
+            self._db.commit()
+
+    def submit(self, job: Dict, priority: int = 1) -> int:
+        """Masukkan job ke journal dan kembalikan posisinya"""
+        queued = self._db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status = 'queued'", (job['user_id'],)
+        ).fetchone()[0]
+        if queued >= self.max_queued_per_user:
+            raise QueueFull(f"Maksimal {self.max_queued_per_user} job dalam antrian")
+
+        # Baris job yang masih antri/berjalan (di proses mana pun) menolak duplikat
+        try:
+            self._db.execute(
+                f"INSERT INTO jobs ({', '.join(JOB_FIELDS)}, priority, created, status) "
+                f"VALUES ({', '.join('?' * (len(JOB_FIELDS) + 3))})",
+                (*(job[field] for field in JOB_FIELDS), priority, time.time(), 'queued')
+            )
+        except sqlite3.IntegrityError:
+            self._db.rollback()
+            raise JobExists(job['job_id'])
+        self._db.commit()
+        return self.position(job['job_id'])
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Posisi job dalam antrian (mulai dari 1), None jika tidak sedang antri"""
+        row = self._db.execute(
+            "SELECT priority, created FROM jobs WHERE job_id = ? AND status = 'queued'", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        ahead = self._db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' "
+            "AND (priority < ? OR (priority = ? AND created < ?))",
+            (row[0], row[0], row[1])
+        ).fetchone()[0]
+        return ahead + 1
+
+    def cancel(self, job_id: str) -> bool:
+        """Keluarkan job yang masih antri, return False jika tidak ditemukan"""
+        cursor = self._db.execute(
+            "DELETE FROM jobs WHERE job_id = ? AND status = 'queued'", (job_id,)
+        )
+        self._db.commit()
+        return cursor.rowcount > 0
+
+    def cancel_running(self, job_id: str):
+        """Tandai job yang sedang berjalan; worker pemiliknya yang membatalkan"""
+        self._db.execute(
+            "UPDATE jobs SET cancel = 1 WHERE job_id = ? AND status = 'running'", (job_id,)
+        )
+        self._db.commit()
+
+    def queued(self) -> int:
+        """Jumlah job yang menunggu (semua proses)"""
+        return self._count('queued')
+
+    def running(self) -> int:
+        """Jumlah job yang sedang berjalan (semua worker)"""
+        return self._count('running')
+
+    def _count(self, status: str) -> int:
+        return self._db.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (status,)).fetchone()[0]
+
+    async def _poll(self):
+        while True:
+            try:
+                self._heartbeat()
+                while len(self._running) < self.max_concurrent:
+                    job = self._claim()
+                    if job is None:
+                        break
+                    self._running[job['job_id']] = asyncio.create_task(self._run(job))
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} gagal membaca journal: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _heartbeat(self):
+        """Perpanjang lease job milik worker ini dan teruskan permintaan batal"""
+        now = time.time()
+        self._db.execute(
+            "UPDATE jobs SET heartbeat = ? WHERE worker = ? AND status = 'running'",
+            (now, self.worker_id)
+        )
+        # Job dari worker yang mati kembali ke antrian
+        self._db.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL "
+            "WHERE status = 'running' AND heartbeat < ?",
+            (now - self.lease,)
+        )
+        owned = {row[0] for row in self._db.execute(
+            "SELECT job_id FROM jobs WHERE worker = ? AND status = 'running'", (self.worker_id,)
+        )}
+        cancelled = [row[0] for row in self._db.execute(
+            "SELECT job_id FROM jobs WHERE worker = ? AND status = 'running' AND cancel = 1",
+            (self.worker_id,)
+        )]
+        if cancelled:
+            self._db.execute(
+                f"UPDATE jobs SET cancel = 0 WHERE job_id IN ({', '.join('?' * len(cancelled))})",
+                cancelled
+            )
+        self._db.commit()
+
+        for job_id in cancelled:
+            if job_id in self._running and self.on_cancel:
+                self.on_cancel(job_id)
+
+        # Lease habis (mis. event loop tertahan) dan job sudah diambil worker lain:
+        # hentikan tanpa mengirim hasil, job tetap milik worker baru
+        for job_id, task in list(self._running.items()):
+            if job_id not in owned:
+                logger.warning(f"Worker {self.worker_id} kehilangan lease job {job_id}")
+                task.cancel()
+
+    def _claim(self) -> Optional[Dict]:
+        """Ambil satu job yang boleh jalan secara atomik antar proses"""
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            user_running, platform_running = Counter(), Counter()
+            for user_id, platform, url in self._db.execute(
+                "SELECT user_id, platform, url FROM jobs WHERE status = 'running'"
+            ):
+                user_running[user_id] += 1
+                platform_running.update(job_platforms({'platform': platform, 'url': url}))
+
+            rows = self._db.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE status = 'queued' "
+                "ORDER BY priority, created"
+            ).fetchall()
+            for row in rows:
+                job = dict(zip(JOB_FIELDS, row))
+                if user_running[job['user_id']] >= self.max_per_user:
+                    continue
+                if not platform_allowed(self.max_per_platform, platform_running, job_platforms(job)):
+                    continue
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?, cancel = 0 "
+                    "WHERE job_id = ?",
+                    (self.worker_id, time.time(), job['job_id'])
+                )
+                self._db.commit()
+                return job
+            self._db.commit()
+            return None
+        except Exception:
+            self._db.rollback()
+            raise
+
+    async def _run(self, job: Dict):
+        try:
+            try:
+                await self._handler(job)
+            except Exception as e:
+                logger.error(f"Job {job['job_id']} gagal: {e}")
+            # Hanya hapus job yang masih milik worker ini
+            self._db.execute(
+                'DELETE FROM jobs WHERE job_id = ? AND worker = ?', (job['job_id'], self.worker_id)
+            )
+            self._db.commit()
+        finally:
+            self._running.pop(job['job_id'], None)
+            self._wakeup.set()
@@ -43,16 +43,16 @@ def get_platform_keyboard():
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def get_download_options_keyboard(url, platform):
-    """Keyboard opsi download"""
+def get_download_options_keyboard(token, platform):
+    """Keyboard opsi download (token = ID sesi callback, bukan URL)"""
     keyboard = [
         [
-            InlineKeyboardButton("📹 Video", callback_data=f'dl_video|{url}'),
-            InlineKeyboardButton("🎵 Audio", callback_data=f'dl_audio|{url}')
+            InlineKeyboardButton("📹 Video", callback_data=f'dl_video|{token}'),
+            InlineKeyboardButton("🎵 Audio", callback_data=f'dl_audio|{token}')
         ],
         [
-            InlineKeyboardButton("🎬 HD Quality", callback_data=f'dl_hd|{url}'),
-            InlineKeyboardButton("ℹ️ Info", callback_data=f'info|{url}')
+            InlineKeyboardButton("🎬 HD Quality", callback_data=f'dl_hd|{token}'),
+            InlineKeyboardButton("ℹ️ Info", callback_data=f'info|{token}')
         ],
         [
             InlineKeyboardButton("❌ Batal", callback_data='cancel')
@@ -60,16 +60,29 @@ def get_download_options_keyboard(url, platform):
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def get_quality_keyboard(url):
-    """Keyboard pilihan kualitas"""
+def get_batch_keyboard(token):
+    """Keyboard format untuk semua media dalam batch"""
     keyboard = [
         [
-            InlineKeyboardButton("🥇 1080p", callback_data=f'quality_1080|{url}'),
-            InlineKeyboardButton("🥈 720p", callback_data=f'quality_720|{url}')
+            InlineKeyboardButton("📹 Video Semua", callback_data=f'dl_video|{token}'),
+            InlineKeyboardButton("🎵 Audio Semua", callback_data=f'dl_audio|{token}')
         ],
         [
-            InlineKeyboardButton("🥉 480p", callback_data=f'quality_480|{url}'),
-            InlineKeyboardButton("📱 360p", callback_data=f'quality_360|{url}')
+            InlineKeyboardButton("❌ Batal", callback_data='cancel')
+        ]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def get_quality_keyboard(token):
+    """Keyboard pilihan kualitas (token = ID sesi callback)"""
+    keyboard = [
+        [
+            InlineKeyboardButton("🥇 1080p", callback_data=f'quality_1080|{token}'),
+            InlineKeyboardButton("🥈 720p", callback_data=f'quality_720|{token}')
+        ],
+        [
+            InlineKeyboardButton("🥉 480p", callback_data=f'quality_480|{token}'),
+            InlineKeyboardButton("📱 360p", callback_data=f'quality_360|{token}')
         ],
         [
             InlineKeyboardButton("🔙 Kembali", callback_data='back_options')
@@ -82,6 +95,11 @@ def get_cancel_keyboard():
     keyboard = [[InlineKeyboardButton("❌ Batal", callback_data='cancel')]]
     return InlineKeyboardMarkup(keyboard)
 
+def get_job_keyboard(job_id):
+    """Keyboard untuk membatalkan job download yang sedang berjalan"""
+    keyboard = [[InlineKeyboardButton("❌ Batalkan Download", callback_data=f'cancel_job|{job_id}')]]
+    return InlineKeyboardMarkup(keyboard)
+
 def get_admin_keyboard():
     """Keyboard admin panel"""
     keyboard = [
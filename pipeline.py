@@ -0,0 +1,90 @@
+"""
+Tahap pipeline job (download, ffmpeg, upload) dengan jumlah worker masing-masing
+"""
+
+import asyncio
+import contextlib
+import time
+from typing import Dict, Optional
+
+from config import FFMPEG_WORKERS, PIPELINE_DOWNLOAD_WORKERS, PIPELINE_UPLOAD_WORKERS
+
+
+class Stage:
+    """
+    Satu tahap pipeline: paling banyak ``workers`` job berada di tahap ini
+    sekaligus, sisanya menunggu. Job hanya memegang slot selama berada di
+    tahap tersebut, sehingga job berikutnya bisa mulai download selagi job
+    sebelumnya masih upload.
+    """
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.seconds = 0.0
+        self._semaphore = asyncio.Semaphore(workers)
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Tunggu giliran lalu tahan satu slot selama konteks aktif"""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self.seconds += time.monotonic() - started
+            self._semaphore.release()
+
+
+class Pipeline:
+    """
+    Kumpulan tahap job. Throughput total dibatasi tahap paling lambat,
+    bukan jumlah waktu semua tahap, selama antrian job mengizinkan job
+    sebanyak total worker semua tahap berjalan bersamaan.
+    """
+
+    def __init__(self, workers: Optional[Dict[str, int]] = None):
+        workers = workers or {
+            'download': PIPELINE_DOWNLOAD_WORKERS,
+            'process': FFMPEG_WORKERS,
+            'upload': PIPELINE_UPLOAD_WORKERS,
+        }
+        self.stages = {name: Stage(name, count) for name, count in workers.items()}
+
+    def stage(self, name: str):
+        """Context manager slot untuk tahap ``name``"""
+        return self.stages[name].slot()
+
+    def depths(self) -> Dict[str, Dict]:
+        """Kedalaman antrian per tahap untuk /stats"""
+        return {
+            name: {
+                'workers': stage.workers,
+                'active': stage.active,
+                'waiting': stage.waiting,
+                'completed': stage.completed,
+                'average': stage.seconds / stage.completed if stage.completed else 0.0,
+            }
+            for name, stage in self.stages.items()
+        }
+
+
+_pipeline: Optional[Pipeline] = None
+
+
+def get_pipeline() -> Pipeline:
+    """Pipeline per proses (dipakai downloader, MediaProcessor dan upload)"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = Pipeline()
+    return _pipeline
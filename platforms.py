@@ -0,0 +1,195 @@
+"""
+Registry platform: deteksi host, kanonikalisasi URL, dan ID media stabil
+"""
+
+import asyncio
+import functools
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import aiohttp
+import yt_dlp
+
+from config import (
+    HOST_ALIASES, SHORT_LINK_CACHE_SIZE, SHORT_LINK_HOSTS, SUPPORTED_PLATFORMS, TRACKING_PARAMS
+)
+from utils import logger
+
+# Indeks host -> platform, dibangun sekali dari SUPPORTED_PLATFORMS
+_HOST_INDEX: Dict[str, str] = {
+    domain: platform
+    for platform, domains in SUPPORTED_PLATFORMS.items()
+    for domain in domains
+}
+
+
+def _host(url: str) -> str:
+    return (urlparse(url).hostname or '').lower()
+
+
+def detect_platform(url: str) -> Optional[str]:
+    """
+    Deteksi platform dari host URL. Host dicocokkan per label dari yang
+    paling panjang (www.m.youtube.com -> m.youtube.com -> youtube.com),
+    sehingga ``?ref=t.co`` atau ``notx.com`` tidak ikut terdeteksi.
+    """
+    labels = _host(url).split('.')
+    for index in range(len(labels) - 1):
+        platform = _HOST_INDEX.get('.'.join(labels[index:]))
+        if platform:
+            return platform
+    return None
+
+
+def _is_tracking(param: str) -> bool:
+    param = param.lower()
+    return param in TRACKING_PARAMS or param.startswith('utm_')
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Bentuk kanonik URL tanpa akses jaringan: host huruf kecil, parameter
+    tracking dan fragment dibuang, host alternatif diganti host utama, dan
+    link pendek yang bisa ditulis ulang (youtu.be, redd.it) diubah ke URL
+    lengkap.
+    """
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or '').lower()
+    host = HOST_ALIASES.get(host, host)
+    path = parsed.path
+    query = [(key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+             if not _is_tracking(key)]
+
+    if host == 'youtu.be' and path.strip('/'):
+        query.insert(0, ('v', path.strip('/').split('/')[0]))
+        host, path = 'www.youtube.com', '/watch'
+    elif host == 'redd.it' and path.strip('/'):
+        host, path = 'www.reddit.com', f"/comments/{path.strip('/')}"
+
+    netloc = host if not parsed.port else f"{host}:{parsed.port}"
+    return urlunparse((parsed.scheme.lower() or 'https', netloc, path, '', urlencode(query), ''))
+
+
+def is_playlist_url(url: str) -> bool:
+    """URL kumpulan media (playlist YouTube, set SoundCloud) yang perlu di-flatten"""
+    parsed = urlparse(canonicalize_url(url))
+    query = dict(parse_qsl(parsed.query))
+    platform = detect_platform(url)
+    if platform == 'youtube':
+        return parsed.path.rstrip('/') == '/playlist' or ('list' in query and 'v' not in query)
+    if platform == 'soundcloud':
+        return '/sets/' in parsed.path
+    return False
+
+
+@functools.lru_cache(maxsize=1)
+def _extractor_classes():
+    """Daftar extractor yt-dlp (tanpa Generic) untuk menebak ID media dari URL"""
+    return [ie for ie in yt_dlp.extractor.gen_extractor_classes() if ie.ie_key() != 'Generic']
+
+
+@functools.lru_cache(maxsize=None)
+def _platform_extractors(platform: str) -> tuple:
+    """
+    Extractor yang pola URL-nya menyebut nama domain platform (dari indeks
+    host yang sama dengan ``detect_platform``), urutan tetap seperti daftar
+    yt-dlp. Nama dicocokkan tanpa TLD karena pola sering menulis
+    ``reddit(?:media)?\\.com`` atau ``pinterest\\.(?:com|fr)``; nama pendek
+    (x.com, t.co) terlalu umum dan dilewati.
+    """
+    names = {
+        domain.split('.')[-2] for domain, name in _HOST_INDEX.items()
+        if name == platform and len(domain.split('.')[-2]) >= 4
+    }
+    candidates = []
+    for ie in _extractor_classes():
+        patterns = getattr(ie, '_VALID_URL', None)
+        patterns = patterns if isinstance(patterns, (list, tuple)) else [patterns]
+        if any(isinstance(pattern, str) and name in pattern.lower() for pattern in patterns for name in names):
+            candidates.append(ie)
+    return tuple(candidates)
+
+
+def _match_extractor(url: str, extractors) -> Optional[str]:
+    for ie in extractors:
+        if ie.suitable(url):
+            temp_id = ie.get_temp_id(url)
+            return f"{ie.ie_key().lower()}:{temp_id}" if temp_id else None
+    return None
+
+
+@functools.lru_cache(maxsize=4096)
+def media_id(url: str) -> str:
+    """
+    ID media stabil untuk kunci cache: platform + ID media dari extractor
+    yt-dlp, atau URL kanonik jika extractor tidak mengenali URL-nya.
+    Host yang dikenal hanya mencoba extractor platformnya; daftar lengkap
+    dipindai hanya untuk host lain.
+    """
+    url = canonicalize_url(url)
+    platform = detect_platform(url)
+    found = _match_extractor(url, _platform_extractors(platform)) if platform else None
+    if found is None and not platform:
+        found = _match_extractor(url, _extractor_classes())
+    if found:
+        return f"{platform or 'unknown'}:{found}"
+    return f"{platform or 'unknown'}:url:{url}"
+
+
+class LinkResolver:
+    """
+    Mengikuti redirect link pendek (vt.tiktok.com, pin.it, t.co, ...) ke
+    URL aslinya. Hasil disimpan di LRU karena link pendek tidak berubah
+    tujuan; link yang gagal di-resolve dikembalikan apa adanya.
+    """
+
+    def __init__(self, max_entries: int = SHORT_LINK_CACHE_SIZE, timeout: float = 10.0):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._resolved: "OrderedDict[str, str]" = OrderedDict()
+
+    async def resolve(self, url: str) -> str:
+        """URL kanonik, dengan link pendek sudah diikuti sampai tujuan akhir"""
+        url = canonicalize_url(url)
+        if _host(url) not in SHORT_LINK_HOSTS:
+            return url
+
+        resolved = self._resolved.get(url)
+        if resolved is not None:
+            self.hits += 1
+            self._resolved.move_to_end(url)
+            return resolved
+
+        self.misses += 1
+        target = await self._follow(url)
+        if target is None:
+            return url
+        resolved = canonicalize_url(target)
+        self._resolved[url] = resolved
+        while len(self._resolved) > self.max_entries:
+            self._resolved.popitem(last=False)
+        return resolved
+
+    def peek(self, url: str) -> Optional[str]:
+        """Seperti ``resolve`` tanpa akses jaringan: None jika link pendek belum pernah di-resolve"""
+        url = canonicalize_url(url)
+        if _host(url) not in SHORT_LINK_HOSTS:
+            return url
+        return self._resolved.get(url)
+
+    async def _follow(self, url: str) -> Optional[str]:
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                # Cukup header redirect, body tidak dibaca
+                async with session.get(url, allow_redirects=True) as response:
+                    return str(response.url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Gagal resolve link pendek {url}: {e}")
+            return None
+
+    def __len__(self):
+        return len(self._resolved)
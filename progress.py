@@ -0,0 +1,97 @@
+"""
+Update pesan status download/upload dengan batas frekuensi edit
+"""
+
+import asyncio
+import time
+from typing import Callable, Dict, Optional
+
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter, TimedOut
+
+from config import PROGRESS_EDIT_INTERVAL
+from utils import logger
+
+
+class StatusUpdater:
+    """
+    Menggabungkan update progress dan mengedit pesan status paling banyak
+    sekali per ``interval`` detik, sehingga aman dari flood limit Telegram.
+    Update yang datang di antara dua edit hanya diambil yang terakhir.
+    Dengan ``refresh=True`` pesan dirender ulang tiap interval walau tidak
+    ada snapshot baru (mis. untuk menampilkan waktu berjalan).
+    """
+
+    def __init__(self, bot, chat_id: int, message_id: int,
+                 render: Callable[[Dict], str], reply_markup=None,
+                 interval: float = PROGRESS_EDIT_INTERVAL, refresh: bool = False):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.render = render
+        self.reply_markup = reply_markup
+        self.interval = interval
+        self.refresh = refresh
+        self.started = time.monotonic()
+        self._latest: Optional[Dict] = None
+        self._last_text: Optional[str] = None
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, snapshot: Dict):
+        """Terima snapshot progress terbaru (murah, boleh dipanggil sering)"""
+        self._latest = snapshot
+        self._changed.set()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def start(self):
+        """Mulai task pengedit pesan"""
+        if self._task is None:
+            self.started = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Hentikan task pengedit pesan (aman dipanggil berulang)"""
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _run(self):
+        while True:
+            if not self.refresh or self._latest is None:
+                await self._changed.wait()
+            self._changed.clear()
+            text = self.render(self._latest)
+            if text != self._last_text:
+                await self._edit(text)
+            await asyncio.sleep(self.interval)
+
+    async def _edit(self, text: str):
+        try:
+            await self.bot.edit_message_text(
+                text,
+                chat_id=self.chat_id,
+                message_id=self.message_id,
+                parse_mode=ParseMode.HTML,
+                reply_markup=self.reply_markup
+            )
+            self._last_text = text
+        except RetryAfter as e:
+            # Flood limit: tunda edit berikutnya, snapshot terbaru tetap disimpan
+            await asyncio.sleep(e.retry_after)
+            self._changed.set()
+        except (BadRequest, TimedOut) as e:
+            logger.debug(f"Edit status gagal: {e}")
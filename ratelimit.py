@@ -0,0 +1,165 @@
+"""
+Rate limit token bucket per user, per chat dan per platform
+"""
+
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from config import ADMIN_IDS, RATE_LIMIT_CHAT, RATE_LIMIT_DB, RATE_LIMIT_PLATFORM, RATE_LIMIT_USER
+from utils import connect_sqlite
+
+# Bucket penuh di memori dibuang jika jumlah bucket melebihi ini
+MAX_BUCKETS = 10000
+
+
+def parse_rate(value: str) -> Tuple[int, float]:
+    """'10/60' -> (kapasitas 10, isi ulang 10/60 token per detik); '0' = tanpa batas"""
+    count, _, seconds = value.partition('/')
+    count = int(count or 0)
+    seconds = float(seconds or 1)
+    return count, (count / seconds if count else 0.0)
+
+
+class RateLimiter:
+    """
+    Token bucket untuk setiap user, chat dan platform sumber.
+
+    Setiap bucket menampung paling banyak ``kapasitas`` token (burst) dan
+    terisi ulang secara kontinu. Request baru diizinkan jika semua bucket
+    yang terlibat masih punya token; token baru dipotong setelah semua
+    bucket lolos, sehingga request yang ditolak tidak menghabiskan kuota.
+    Admin (``ADMIN_IDS``) tidak dibatasi. Dengan ``db_path`` isi bucket
+    disimpan ke SQLite agar batas tetap berlaku setelah restart.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, str]] = None, db_path: str = RATE_LIMIT_DB,
+                 exempt=ADMIN_IDS):
+        limits = limits or {'user': RATE_LIMIT_USER, 'chat': RATE_LIMIT_CHAT, 'platform': RATE_LIMIT_PLATFORM}
+        self.limits = {scope: parse_rate(value) for scope, value in limits.items()}
+        self.exempt = set(exempt)
+        self.allowed = 0
+        self.exempted = 0
+        self.limited = Counter()
+        self._buckets: Dict[Tuple[str, str], List[float]] = {}  # (scope, key) -> [token, waktu isi]
+
+        self._db = None
+        if db_path:
+            self._db = connect_sqlite(db_path)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS rate_buckets ('
+                'scope TEXT NOT NULL, key TEXT NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL, '
+                'PRIMARY KEY (scope, key))'
+            )
+            # Bucket yang tidak disentuh sehari pasti sudah penuh lagi
+            self._db.execute('DELETE FROM rate_buckets WHERE updated < ?', (time.time() - 86400,))
+            self._db.commit()
+
+    def check(self, user_id: int, chat_id: Optional[int] = None, platform: Optional[str] = None,
+              cost: int = 1, platforms: Optional[Dict[str, int]] = None) -> float:
+        """
+        Potong ``cost`` token dari bucket user, chat dan platform.
+        ``platforms`` ({platform: jumlah item}, untuk batch) memotong bucket
+        tiap platform sesuai jumlah itemnya, menggantikan ``platform``.
+
+        Returns:
+            0 jika diizinkan, selain itu detik sampai request bisa dicoba lagi
+        """
+        # Chat pribadi sama dengan user, tidak dihitung dua kali
+        scopes = [('user', user_id, cost), ('chat', chat_id if chat_id != user_id else None, cost)]
+        return self._take(user_id, scopes + self._platform_scopes(platform, cost, platforms))
+
+    def peek(self, user_id: int, chat_id: Optional[int] = None, cost: int = 1) -> float:
+        """
+        Seperti ``check`` untuk bucket user dan chat tetapi tanpa memotong
+        token, untuk menolak lebih awal sebelum platform diketahui (mis.
+        sebelum link pendek di-resolve)
+        """
+        scopes = [('user', user_id, cost), ('chat', chat_id if chat_id != user_id else None, cost)]
+        return self._take(user_id, scopes, deduct=False)
+
+    @staticmethod
+    def _platform_scopes(platform: Optional[str], cost: int,
+                         platforms: Optional[Dict[str, int]]) -> List[Tuple[str, str, int]]:
+        if platforms is None:
+            platforms = {platform: cost} if platform is not None else {}
+        return [('platform', key, count) for key, count in platforms.items()]
+
+    def _take(self, user_id: int, scopes: List[Tuple[str, Optional[object], int]], deduct: bool = True) -> float:
+        if user_id in self.exempt:
+            self.exempted += deduct
+            return 0.0
+
+        now = time.time()
+        buckets = []
+        retry_after, limited_scope = 0.0, None
+        for scope, key, amount in scopes:
+            capacity, rate = self.limits.get(scope, (0, 0.0))
+            if key is None or not capacity:
+                continue
+            bucket = self._bucket(scope, str(key), now)
+            # Request lebih besar dari kapasitas (mis. batch) cukup menunggu bucket penuh
+            need = min(amount, capacity)
+            if bucket[0] < need:
+                wait = (need - bucket[0]) / rate
+                if wait > retry_after:
+                    retry_after, limited_scope = wait, scope
+            buckets.append((scope, str(key), bucket, need))
+
+        if limited_scope is not None:
+            self.limited[limited_scope] += 1
+            return retry_after
+        if not deduct:
+            return 0.0
+
+        for scope, key, bucket, need in buckets:
+            bucket[0] -= need
+            self._save(scope, key, bucket)
+        if self._db is not None:
+            self._db.commit()
+        self.allowed += 1
+        return 0.0
+
+    def _bucket(self, scope: str, key: str, now: float) -> List[float]:
+        """Bucket yang sudah diisi ulang sampai ``now``"""
+        capacity, rate = self.limits[scope]
+        bucket = self._buckets.get((scope, key))
+        if bucket is None:
+            bucket = self._load(scope, key) or [float(capacity), now]
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._prune(now)
+            self._buckets[(scope, key)] = bucket
+        bucket[0] = min(float(capacity), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        return bucket
+
+    def _prune(self, now: float):
+        # Bucket yang sudah penuh kembali sama dengan bucket baru
+        for (scope, key), (tokens, updated) in list(self._buckets.items()):
+            capacity, rate = self.limits[scope]
+            if tokens + (now - updated) * rate >= capacity:
+                del self._buckets[(scope, key)]
+
+    def _load(self, scope: str, key: str) -> Optional[List[float]]:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            'SELECT tokens, updated FROM rate_buckets WHERE scope = ? AND key = ?', (scope, key)
+        ).fetchone()
+        return [row[0], row[1]] if row else None
+
+    def _save(self, scope: str, key: str, bucket: List[float]):
+        if self._db is not None:
+            self._db.execute(
+                'INSERT OR REPLACE INTO rate_buckets (scope, key, tokens, updated) VALUES (?, ?, ?, ?)',
+                (scope, key, bucket[0], bucket[1])
+            )
+
+    def summary(self) -> Dict:
+        """Counter untuk /stats"""
+        return {
+            'allowed': self.allowed,
+            'exempted': self.exempted,
+            'limited': dict(self.limited),
+            'buckets': len(self._buckets),
+        }
@@ -0,0 +1,65 @@
+"""
+Penyimpanan sesi callback: token pendek pengganti URL di callback_data
+"""
+
+import secrets
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import CALLBACK_SESSION_SIZE, CALLBACK_SESSION_TTL
+
+
+class CallbackSessions:
+    """
+    Memetakan token pendek ke data link yang sudah di-resolve
+    (url, media ID, platform, info, chat), dengan batas jumlah entry
+    (LRU) dan masa berlaku, sehingga callback_data tetap di bawah
+    batas 64 byte Telegram untuk URL sepanjang apa pun.
+    """
+
+    TOKEN_BYTES = 6  # 8 karakter base64
+
+    def __init__(self, max_entries: int = CALLBACK_SESSION_SIZE, ttl: int = CALLBACK_SESSION_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, url: str, platform: str, media_key: str, chat_id: int,
+               info: Optional[Dict] = None) -> str:
+        """Buat sesi baru dan kembalikan tokennya"""
+        with self._lock:
+            token = secrets.token_urlsafe(self.TOKEN_BYTES)
+            while token in self._sessions:
+                token = secrets.token_urlsafe(self.TOKEN_BYTES)
+
+            self._sessions[token] = {
+                'url': url,
+                'platform': platform,
+                'media_key': media_key,
+                'chat_id': chat_id,
+                'info': info,
+                'expires': time.time() + self.ttl,
+            }
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+            return token
+
+    def get(self, token: str, chat_id: Optional[int] = None) -> Optional[Dict]:
+        """Ambil sesi, None jika tidak ada, kedaluwarsa, atau milik chat lain"""
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if session['expires'] < time.time():
+                del self._sessions[token]
+                return None
+            if chat_id is not None and session['chat_id'] != chat_id:
+                return None
+            self._sessions.move_to_end(token)
+            return session
+
+    def __len__(self):
+        return len(self._sessions)
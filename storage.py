@@ -0,0 +1,323 @@
+"""
+Layout penyimpanan file download: content-addressed dan di-shard per direktori
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: pin hanya berlaku di proses sendiri
+    fcntl = None
+
+from config import DOWNLOAD_CACHE_BYTES, DOWNLOAD_PATH, STORAGE_SHARD_DEPTH
+from utils import connect_sqlite, logger
+
+# Sisa file dari download yang terputus
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp', '.tmp')
+
+
+class MediaStorage:
+    """
+    Nama file diturunkan dari digest ``media_id`` + varian (mis. 'audio',
+    'hd'), lalu disebar ke subdirektori dari awalan digest::
+
+        downloads/3f/a9/3fa9...e1.mp4
+
+    Setiap job mendownload ke direktori sementara miliknya sendiri di
+    ``downloads/.tmp`` dan file baru dipindah ke lokasi akhir dengan
+    ``os.replace`` (atomik, satu filesystem), sehingga job paralel tidak
+    saling menimpa dan pembaca tidak pernah melihat file setengah jadi.
+
+    File yang sudah jadi disimpan sebagai cache dengan batas ``max_bytes``:
+    file paling lama tidak dipakai (LRU) dihapus lebih dulu, kecuali file
+    yang sedang di-pin oleh job aktif (dari ``lookup``/``store`` sampai
+    ``release``). Indeks dan pemakaian disk disimpan di SQLite di dalam
+    ``root`` dan pin berupa ``flock`` bersama pada file, sehingga semua
+    proses (front/worker) yang memakai direktori yang sama berbagi batas
+    dan tidak menghapus file yang sedang dipakai proses lain.
+    """
+
+    TMP_DIR = '.tmp'
+    INDEX_DB = '.index.db'
+    STALE_TMP_AGE = 3600  # detik tanpa perubahan sebelum direktori job dianggap yatim
+
+    def __init__(self, root: str = DOWNLOAD_PATH, shard_depth: int = STORAGE_SHARD_DEPTH,
+                 max_bytes: int = DOWNLOAD_CACHE_BYTES):
+        self.root = root
+        self.shard_depth = shard_depth
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self._pins = Counter()
+        self._pin_fds: Dict[str, int] = {}  # path -> fd yang memegang flock bersama
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.root, self.TMP_DIR), exist_ok=True)
+        self._db = connect_sqlite(os.path.join(self.root, self.INDEX_DB))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, size INTEGER NOT NULL, used REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS files_used ON files (used)')
+        self._db.commit()
+        self.sweep()
+
+    def __getstate__(self):
+        # Worker process hanya butuh layout path, indeks cache tetap di proses utama
+        state = self.__dict__.copy()
+        state.update(_lock=None, _db=None, _pins=Counter(), _pin_fds={})
+        return state
+
+    @property
+    def used(self) -> int:
+        """Total byte file cache semua proses"""
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+
+    @staticmethod
+    def digest(media_id: str, variant: str) -> str:
+        """Digest stabil (tidak bergantung PYTHONHASHSEED) untuk media + varian"""
+        return hashlib.sha256(f"{media_id}|{variant}".encode()).hexdigest()[:32]
+
+    def shard_dir(self, digest: str) -> str:
+        parts = [digest[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.root, *parts)
+
+    def path_for(self, media_id: str, variant: str, ext: str) -> str:
+        """Lokasi akhir file untuk media + varian"""
+        digest = self.digest(media_id, variant)
+        return os.path.join(self.shard_dir(digest), f"{digest}.{ext.lstrip('.')}")
+
+    def find(self, media_id: str, variant: str, exts=('mp4', 'mp3', 'jpg', 'webm', 'm4a')) -> Optional[str]:
+        """Cari file yang sudah tersimpan tanpa scan seluruh direktori"""
+        for ext in exts:
+            path = self.path_for(media_id, variant, ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @contextlib.contextmanager
+    def job_dir(self, media_id: str, variant: str) -> Iterator[str]:
+        """Direktori sementara per job, dihapus beserta sisa file (.part, dll.) saat selesai"""
+        path = tempfile.mkdtemp(
+            prefix=f"{self.digest(media_id, variant)[:12]}-",
+            dir=os.path.join(self.root, self.TMP_DIR)
+        )
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def partial_path(self, media_id: str, variant: str, ext: str) -> str:
+        """Lokasi tetap di ``.tmp`` untuk download yang bisa dilanjutkan setelah terputus"""
+        return os.path.join(self.root, self.TMP_DIR, f"{self.digest(media_id, variant)}.{ext.lstrip('.')}")
+
+    def commit(self, temp_path: str, media_id: str, variant: str) -> str:
+        """Pindahkan file hasil job ke lokasi akhirnya secara atomik"""
+        ext = os.path.splitext(temp_path)[1] or '.bin'
+        final_path = self.path_for(media_id, variant, ext)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(temp_path, final_path)
+        return final_path
+
+    def sweep(self):
+        """
+        Bersihkan sisa job yang terputus (direktori .tmp lama, file .part/.ytdl)
+        dan bangun indeks cache dari file yang ada, urut dari mtime terlama.
+        """
+        tmp_root = os.path.join(self.root, self.TMP_DIR)
+        now = time.time()
+        for name in os.listdir(tmp_root):
+            path = os.path.join(tmp_root, name)
+            # Direktori job proses lain yang masih aktif tidak ikut dihapus
+            if now - _latest_mtime(path) <= self.STALE_TMP_AGE:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                _remove(path)
+
+        found = []
+        for directory, dirnames, filenames in os.walk(self.root):
+            if directory == self.root:
+                dirnames[:] = [name for name in dirnames if name != self.TMP_DIR]
+                filenames = [name for name in filenames if not name.startswith(self.INDEX_DB)]
+            for name in filenames:
+                path = os.path.join(directory, name)
+                if name.endswith(PARTIAL_SUFFIXES):
+                    _remove(path)
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((path, stat.st_size, stat.st_mtime))
+
+        # Indeks dilengkapi, bukan dibangun ulang: proses lain mungkin sedang menulis
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR IGNORE INTO files (path, size, used) VALUES (?, ?, ?)', found)
+            existing = {path for path, _, _ in found}
+            self._db.executemany('DELETE FROM files WHERE path = ?', [
+                (path,) for path, in self._db.execute('SELECT path FROM files')
+                if path not in existing and not os.path.exists(path)
+            ])
+        self._evict()
+        logger.info(f"Cache media: {len(self)} file, {self.used} byte")
+
+    def lookup(self, media_id: str, variant: str) -> Optional[str]:
+        """File tersimpan untuk media + varian (sudah di-pin), None jika belum ada"""
+        path = self.find(media_id, variant)
+        if path is None:
+            return None
+        try:
+            os.utime(path)  # urutan LRU tetap benar setelah restart
+            return self.store(path, hit=True)
+        except OSError:
+            return None
+
+    def lookup_parts(self, media_id: str, variant: str) -> List[str]:
+        """
+        Semua bagian file hasil pecah (``<varian>-partN``, jumlahnya dari
+        manifest ``<varian>-parts``), sudah di-pin; list kosong jika manifest
+        atau salah satu bagian sudah tidak ada.
+        """
+        manifest = self.find(media_id, f"{variant}-parts", exts=('json',))
+        if manifest is None:
+            return []
+        try:
+            with open(manifest) as file:
+                count = int(json.load(file)['parts'])
+            os.utime(manifest)
+        except (OSError, ValueError, KeyError):
+            return []
+
+        paths = []
+        for index in range(count):
+            path = self.lookup(media_id, f"{variant}-part{index}")
+            if path is None:
+                for pinned in paths:
+                    self.release(pinned)
+                return []
+            paths.append(path)
+        return paths
+
+    def store(self, path: str, hit: bool = False) -> str:
+        """Daftarkan file ke cache dan pin sampai ``release``"""
+        size = os.path.getsize(path)
+        with self._lock:
+            self._pin(path)
+            self._db.execute(
+                'INSERT OR REPLACE INTO files (path, size, used) VALUES (?, ?, ?)', (path, size, time.time())
+            )
+            self._db.commit()
+            if hit:
+                self.hits += 1
+                self.bytes_saved += size
+            else:
+                self.misses += 1
+        self._evict()
+        return path
+
+    def release(self, path: str):
+        """Lepas pin dari job yang sudah selesai memakai file"""
+        with self._lock:
+            self._pins[path] -= 1
+            if self._pins[path] <= 0:
+                del self._pins[path]
+                fd = self._pin_fds.pop(path, None)
+                if fd is not None:
+                    os.close(fd)  # flock ikut lepas
+        self._evict()
+
+    def _pin(self, path: str):
+        # Pin pertama di proses ini memegang flock bersama sampai pin terakhir dilepas
+        if self._pins[path] == 0 and fcntl is not None:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                # Proses lain bisa saja menghapus file sebelum flock didapat
+                if not os.path.samestat(os.fstat(fd), os.stat(path)):
+                    raise FileNotFoundError(path)
+            except OSError:
+                os.close(fd)
+                raise
+            self._pin_fds[path] = fd
+        self._pins[path] += 1
+
+    def _evict(self):
+        """Hapus file LRU yang tidak di-pin proses mana pun sampai pemakaian di bawah batas"""
+        with self._lock:
+            used = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+            if used <= self.max_bytes:
+                return
+            for path, size in self._db.execute('SELECT path, size FROM files ORDER BY used').fetchall():
+                if used <= self.max_bytes:
+                    break
+                if self._pins[path] > 0 or not _remove_unpinned(path):
+                    continue
+                self._db.execute('DELETE FROM files WHERE path = ?', (path,))
+                used -= size
+                self.evictions += 1
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+
+def _remove_unpinned(path: str) -> bool:
+    """
+    Hapus file jika tidak ada proses lain yang memegang pin (flock), True
+    jika file sudah tidak ada
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return True
+    except OSError:
+        return False
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+        # Path bisa sudah ditimpa file baru (commit ulang) setelah dibuka
+        if not os.path.samestat(os.fstat(fd), os.stat(path)):
+            return False
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _latest_mtime(path: str) -> float:
+    """mtime terbaru dari path dan isinya (file .part terus berubah selama download)"""
+    latest = os.path.getmtime(path)
+    if os.path.isdir(path):
+        for directory, _, filenames in os.walk(path):
+            for name in filenames:
+                try:
+                    latest = max(latest, os.path.getmtime(os.path.join(directory, name)))
+                except OSError:
+                    pass
+    return latest
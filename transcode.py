@@ -0,0 +1,319 @@
+"""
+Pemrosesan media dengan ffmpeg di process pool terpisah dari worker download
+"""
+
+import json
+import math
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from config import (
+    FFMPEG_EXECUTOR, FFMPEG_PATH, FFMPEG_THREADS, FFMPEG_WORKERS, FFPROBE_PATH,
+    FIT_AUDIO_BITRATE, FIT_MIN_VIDEO_BITRATE, MAX_FILE_SIZE
+)
+from executor import DownloadExecutor, JobCancelled
+from formats import AUDIO_BITRATE, MediaRejected
+from pipeline import get_pipeline
+from utils import format_duration, format_size, logger
+
+# Codec audio yang bisa dikirim apa adanya lewat sendAudio, beserta container-nya
+AUDIO_COPY_CONTAINERS = {
+    'aac': 'm4a',
+    'alac': 'm4a',
+    'mp3': 'mp3',
+}
+
+# Tinggi maksimal video hasil fit per bitrate video (kbps minimal, tinggi)
+FIT_HEIGHTS = ((2500, 1080), (1200, 720), (700, 480), (400, 360), (0, 240))
+# Sisa ruang untuk overhead container dan ketidaktepatan rate control
+SIZE_SAFETY = 0.95
+
+
+class TranscodeError(Exception):
+    """ffmpeg/ffprobe gagal atau tidak tersedia"""
+
+
+def probe(path: str) -> Dict:
+    """Info ``streams`` (codec_type, codec_name, ...) dan ``format`` (duration, ...) dari ffprobe"""
+    if not shutil.which(FFPROBE_PATH):
+        raise TranscodeError("ffprobe tidak ditemukan, install ffmpeg terlebih dahulu")
+    result = subprocess.run(
+        [FFPROBE_PATH, '-v', 'error', '-show_entries',
+         'stream=codec_type,codec_name,height:format=duration',
+         '-of', 'json', path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise TranscodeError(f"ffprobe gagal: {result.stderr.strip()[-200:]}")
+    return json.loads(result.stdout or '{}')
+
+
+def run_ffmpeg(args: List[str], cancel_event=None, poll: float = 0.5):
+    """
+    Jalankan ffmpeg dengan batas thread; proses dihentikan jika job dibatalkan.
+    Argumen terakhir ``args`` adalah file output.
+
+    Raises:
+        JobCancelled: ``cancel_event`` di-set saat ffmpeg berjalan
+        TranscodeError: ffmpeg tidak ada atau keluar dengan error
+    """
+    if not shutil.which(FFMPEG_PATH):
+        raise TranscodeError("ffmpeg tidak ditemukan, install ffmpeg terlebih dahulu")
+    process = subprocess.Popen(
+        [FFMPEG_PATH, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y',
+         *args[:-1], '-threads', str(FFMPEG_THREADS), args[-1]],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    # stderr dibaca di thread terpisah agar pipe tidak penuh selama polling
+    errors: List[str] = []
+    reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+    reader.start()
+    while True:
+        try:
+            process.wait(timeout=poll)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel_event is not None and cancel_event.is_set():
+                process.kill()
+                process.wait()
+                raise JobCancelled("Proses ffmpeg dibatalkan")
+    reader.join()
+    if process.returncode != 0:
+        raise TranscodeError(f"ffmpeg gagal: {''.join(errors).strip()[-200:]}")
+
+
+def extract_audio(storage, source: str, media_key: str, variant: str = 'audio',
+                  bitrate: int = AUDIO_BITRATE, cancel_event=None, progress_hook=None) -> Dict:
+    """
+    Ubah file hasil download menjadi audio yang bisa dikirim lewat sendAudio.
+
+    Track AAC/MP3 cukup di-remux (stream copy, tanpa decode); codec lain
+    (opus, vorbis, ...) di-encode ke MP3. File sumber dihapus setelahnya.
+
+    Returns:
+        Dict ``path``, ``mode`` ('copy'/'encode'), ``codec`` dan ``seconds``
+    """
+    started = time.perf_counter()
+    try:
+        streams = probe(source).get('streams') or []
+        audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+        if audio is None:
+            raise TranscodeError("File tidak memiliki track audio")
+        codec = audio.get('codec_name') or 'unknown'
+        container = AUDIO_COPY_CONTAINERS.get(codec)
+
+        with storage.job_dir(media_key, variant) as job_dir:
+            if container:
+                mode = 'copy'
+                target = os.path.join(job_dir, f"media.{container}")
+                codec_args = ['-c:a', 'copy']
+                if container == 'm4a':
+                    codec_args += ['-movflags', '+faststart']
+            else:
+                mode = 'encode'
+                target = os.path.join(job_dir, 'media.mp3')
+                codec_args = ['-c:a', 'libmp3lame', '-b:a', f"{bitrate}k"]
+
+            if progress_hook is not None:
+                progress_hook({'phase': 'processing', 'step': 'remux audio' if mode == 'copy' else 'encode MP3'})
+            run_ffmpeg(['-i', source, '-map', '0:a:0', '-vn', *codec_args, target], cancel_event)
+            path = storage.commit(target, media_key, variant)
+    finally:
+        _remove(source)
+
+    return {'path': path, 'mode': mode, 'codec': codec, 'seconds': time.perf_counter() - started}
+
+
+def _duration(info: Dict) -> float:
+    try:
+        return float((info.get('format') or {}).get('duration') or 0)
+    except ValueError:
+        return 0.0
+
+
+def fit_video(storage, source: str, media_key: str, variant: str, max_size: int = MAX_FILE_SIZE,
+              cancel_event=None, progress_hook=None) -> Dict:
+    """
+    Encode ulang video agar muat di ``max_size``.
+
+    Bitrate target dihitung dari durasi dan budget ukuran, resolusi
+    diturunkan sesuai bitrate, lalu encode two-pass libx264 (ukuran hasil
+    jauh lebih tepat daripada CRF). File sumber dihapus setelahnya.
+
+    Raises:
+        MediaRejected: durasi terlalu panjang untuk budget ukuran
+    """
+    started = time.perf_counter()
+    path = None
+    try:
+        info = probe(source)
+        streams = info.get('streams') or []
+        duration = _duration(info)
+        if duration <= 0:
+            raise TranscodeError("Durasi video tidak diketahui")
+
+        has_audio = any(stream.get('codec_type') == 'audio' for stream in streams)
+        audio_kbps = FIT_AUDIO_BITRATE if has_audio else 0
+        video_kbps = int(max_size * 8 * SIZE_SAFETY / duration / 1000) - audio_kbps
+        if video_kbps < FIT_MIN_VIDEO_BITRATE:
+            raise MediaRejected(
+                f"Video {format_duration(int(duration))} tidak bisa diperkecil ke "
+                f"{format_size(max_size)} dengan kualitas layak"
+            )
+
+        height = next(limit for minimum, limit in FIT_HEIGHTS if video_kbps >= minimum)
+        source_height = max((stream.get('height') or 0 for stream in streams), default=0)
+        scale = ['-vf', f"scale=-2:{height}"] if source_height > height else []
+
+        with storage.job_dir(media_key, variant) as job_dir:
+            target = os.path.join(job_dir, 'media.mp4')
+            common = [
+                '-i', source, *scale,
+                '-c:v', 'libx264', '-preset', 'veryfast',
+                '-b:v', f"{video_kbps}k", '-maxrate', f"{int(video_kbps * 1.5)}k",
+                '-bufsize', f"{video_kbps * 2}k",
+                '-passlogfile', os.path.join(job_dir, 'pass'),
+            ]
+            audio_args = ['-c:a', 'aac', '-b:a', f"{audio_kbps}k"] if has_audio else ['-an']
+
+            if progress_hook is not None:
+                progress_hook({'phase': 'processing', 'step': f"perkecil ke {height}p (1/2)"})
+            run_ffmpeg([*common, '-pass', '1', '-an', '-f', 'null', os.devnull], cancel_event)
+            if progress_hook is not None:
+                progress_hook({'phase': 'processing', 'step': f"perkecil ke {height}p (2/2)"})
+            run_ffmpeg([*common, '-pass', '2', *audio_args, '-movflags', '+faststart', target], cancel_event)
+
+            if os.path.getsize(target) > max_size:
+                raise TranscodeError("Hasil encode masih melebihi batas ukuran")
+            path = storage.commit(target, media_key, variant)
+    finally:
+        # Hasil commit bisa menempati path yang sama dengan sumber (varian sama)
+        if path != source:
+            _remove(source)
+
+    return {'path': path, 'mode': 'fit', 'height': height, 'bitrate': video_kbps,
+            'seconds': time.perf_counter() - started}
+
+
+def split_audio(storage, source: str, media_key: str, variant: str, max_size: int = MAX_FILE_SIZE,
+                cancel_event=None, progress_hook=None) -> Dict:
+    """
+    Pecah audio menjadi beberapa bagian yang masing-masing muat di
+    ``max_size`` (segmen waktu dengan stream copy, tanpa encode).
+    File sumber dihapus setelahnya.
+    """
+    started = time.perf_counter()
+    try:
+        duration = _duration(probe(source))
+        if duration <= 0:
+            raise TranscodeError("Durasi audio tidak diketahui")
+        parts = math.ceil(os.path.getsize(source) / (max_size * SIZE_SAFETY))
+        ext = os.path.splitext(source)[1]
+
+        with storage.job_dir(media_key, variant) as job_dir:
+            if progress_hook is not None:
+                progress_hook({'phase': 'processing', 'step': f"pecah audio ({parts} bagian)"})
+            run_ffmpeg([
+                '-i', source, '-map', '0:a:0', '-c', 'copy',
+                '-f', 'segment', '-segment_time', str(math.ceil(duration / parts)),
+                '-reset_timestamps', '1', os.path.join(job_dir, f"part%03d{ext}")
+            ], cancel_event)
+
+            segments = sorted(name for name in os.listdir(job_dir) if name.startswith('part'))
+            if not segments or any(os.path.getsize(os.path.join(job_dir, name)) > max_size for name in segments):
+                raise TranscodeError("Bagian audio masih melebihi batas ukuran")
+            paths = [
+                storage.commit(os.path.join(job_dir, name), media_key, f"{variant}-part{index}")
+                for index, name in enumerate(segments)
+            ]
+            # Manifest ditulis terakhir: hanya ada jika semua bagian sudah tersimpan
+            manifest = os.path.join(job_dir, 'parts.json')
+            with open(manifest, 'w') as file:
+                json.dump({'parts': len(paths)}, file)
+            manifest = storage.commit(manifest, media_key, f"{variant}-parts")
+    finally:
+        _remove(source)
+
+    return {'paths': paths, 'manifest': manifest, 'mode': 'split', 'seconds': time.perf_counter() - started}
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class MediaProcessor:
+    """
+    Pool proses khusus pekerjaan ffmpeg yang berat di CPU.
+
+    Terpisah dari worker download sehingga download yang hanya menunggu
+    jaringan tidak antri di belakang encode. Total pemakaian CPU kira-kira
+    ``max_workers`` x ``FFMPEG_THREADS`` core. Setiap job dicatat mode
+    (copy/encode/fit/split) dan waktu prosesnya untuk /stats.
+    """
+
+    def __init__(self, max_workers: int = FFMPEG_WORKERS, mode: str = FFMPEG_EXECUTOR):
+        self.executor = DownloadExecutor(max_workers=max_workers, mode=mode)
+        self.jobs = Counter()
+        self.seconds = Counter()
+
+    async def extract_audio(self, storage, source: str, media_key: str,
+                            job_id: Optional[str] = None, progress=None) -> Dict:
+        """Remux/encode audio di pool ffmpeg dan catat waktu prosesnya"""
+        async with get_pipeline().stage('process'):
+            result = await self.executor.run(
+                extract_audio, storage, source, media_key,
+                job_id=job_id, progress=progress
+            )
+        self.record(result['mode'], result['seconds'])
+        logger.info(
+            f"Audio {media_key}: {result['mode']} ({result['codec']}) "
+            f"dalam {result['seconds']:.2f} detik"
+        )
+        return result
+
+    async def fit_video(self, storage, source: str, media_key: str, variant: str,
+                        progress=None) -> Dict:
+        """Perkecil video yang melebihi batas upload"""
+        async with get_pipeline().stage('process'):
+            result = await self.executor.run(
+                fit_video, storage, source, media_key, variant, progress=progress
+            )
+        self.record(result['mode'], result['seconds'])
+        logger.info(
+            f"Video {media_key} diperkecil ke {result['height']}p {result['bitrate']} kbps "
+            f"dalam {result['seconds']:.2f} detik"
+        )
+        return result
+
+    async def split_audio(self, storage, source: str, media_key: str, variant: str,
+                          progress=None) -> Dict:
+        """Pecah audio yang melebihi batas upload"""
+        async with get_pipeline().stage('process'):
+            result = await self.executor.run(
+                split_audio, storage, source, media_key, variant, progress=progress
+            )
+        self.record(result['mode'], result['seconds'])
+        logger.info(
+            f"Audio {media_key} dipecah menjadi {len(result['paths'])} bagian "
+            f"dalam {result['seconds']:.2f} detik"
+        )
+        return result
+
+    def record(self, mode: str, seconds: float):
+        self.jobs[mode] += 1
+        self.seconds[mode] += seconds
+
+    def summary(self) -> Dict[str, tuple]:
+        """Jumlah job dan rata-rata detik per mode"""
+        return {mode: (count, self.seconds[mode] / count) for mode, count in self.jobs.items()}
+
+    def shutdown(self):
+        self.executor.shutdown()
@@ -0,0 +1,191 @@
+"""
+Pipeline upload: streaming dari disk, batas byte in-flight, dan retry
+"""
+
+import asyncio
+import contextlib
+import mimetypes
+import os
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Union
+from uuid import uuid4
+
+from telegram import InputFile
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+from telegram.request import HTTPXRequest
+
+from config import (
+    LOCAL_MODE, UPLOAD_CONNECTION_POOL, UPLOAD_MAX_INFLIGHT_BYTES, UPLOAD_READ_TIMEOUT,
+    UPLOAD_RETRIES, UPLOAD_WRITE_TIMEOUT
+)
+from pipeline import get_pipeline
+from utils import logger
+
+
+class _ProgressReader:
+    """
+    File reader untuk multipart httpx: dibaca per chunk (64 KB) saat
+    request dikirim, bukan dimuat seluruhnya ke memori.
+    """
+
+    def __init__(self, path: str, on_progress: Optional[Callable[[int], None]] = None):
+        self._file = open(path, 'rb')
+        self._on_progress = on_progress
+        self.sent = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._file.read(size)
+        self.sent += len(chunk)
+        if self._on_progress and chunk:
+            self._on_progress(self.sent)
+        return chunk
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        position = self._file.seek(offset, whence)
+        if whence == os.SEEK_SET:
+            self.sent = position
+        return position
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+class StreamingInputFile(InputFile):
+    """InputFile yang men-stream isi file dari disk saat request dikirim"""
+
+    def __init__(self, path: str, filename: Optional[str] = None,
+                 on_progress: Optional[Callable[[int], None]] = None, attach: bool = False):
+        # InputFile.__init__ tidak dipanggil karena ia membaca seluruh file ke memori
+        self.input_file_content = _ProgressReader(path, on_progress)
+        self.attach_name = "attached" + uuid4().hex if attach else None
+        self.filename = filename or os.path.basename(path)
+        self.mimetype = mimetypes.guess_type(self.filename, strict=False)[0] or 'application/octet-stream'
+
+    def close(self):
+        self.input_file_content.close()
+
+
+class UploadBudget:
+    """
+    Membatasi total byte upload yang sedang berjalan. File yang lebih besar
+    dari batas tetap boleh jalan, tetapi sendirian.
+    """
+
+    def __init__(self, max_bytes: int = UPLOAD_MAX_INFLIGHT_BYTES):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def reserve(self, size: int):
+        """Tunggu sampai ada ruang untuk ``size`` byte"""
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: self.in_flight == 0 or self.in_flight + size <= self.max_bytes
+            )
+            self.in_flight += size
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.in_flight -= size
+                self._condition.notify_all()
+
+
+def build_request() -> HTTPXRequest:
+    """Request HTTPX untuk Bot API dengan pool koneksi dan timeout upload yang panjang"""
+    return HTTPXRequest(
+        connection_pool_size=UPLOAD_CONNECTION_POOL,
+        read_timeout=UPLOAD_READ_TIMEOUT,
+        write_timeout=UPLOAD_WRITE_TIMEOUT,
+        connect_timeout=10.0,
+        pool_timeout=30.0,
+    )
+
+
+def _open_media(path: str, on_progress: Optional[Callable[[int], None]],
+                local_mode: bool, attach: bool = False) -> Union[InputFile, Path]:
+    if local_mode:
+        # Server Bot API lokal membaca file langsung dari disk (file://),
+        # tidak ada byte yang lewat Python
+        return Path(path).resolve()
+    return StreamingInputFile(path, on_progress=on_progress, attach=attach)
+
+
+async def _send_with_retry(send: Callable[[List], Awaitable], open_media: Callable[[], List],
+                           retries: int):
+    """Jalankan ``send`` dengan retry; setiap percobaan membuka ulang file dari disk"""
+    attempt = 0
+    while True:
+        attempt += 1
+        media = open_media()
+        try:
+            return await send(media)
+        except RetryAfter as e:
+            logger.warning(f"Upload kena flood limit, tunggu {e.retry_after} detik")
+            await asyncio.sleep(e.retry_after)
+        except BadRequest:
+            raise
+        except (TimedOut, NetworkError) as e:
+            if attempt >= retries:
+                raise
+            logger.warning(f"Upload gagal (percobaan {attempt}/{retries}): {e}")
+            await asyncio.sleep(2 ** attempt)
+        finally:
+            for item in media:
+                if isinstance(item, InputFile):
+                    item.close()
+
+
+async def upload_file(send: Callable[[Union[InputFile, Path]], Awaitable], path: str,
+                      on_progress: Optional[Callable[[int], None]] = None,
+                      retries: int = UPLOAD_RETRIES, local_mode: bool = LOCAL_MODE):
+    """
+    Upload file dari disk lewat ``send(media)`` dengan retry.
+    Setiap percobaan membuka ulang file dari disk, tanpa download ulang.
+    Di mode server lokal ``media`` berupa path absolut, bukan isi file.
+    """
+    async with get_pipeline().stage('upload'):
+        message = await _send_with_retry(
+            lambda media: send(media[0]),
+            lambda: [_open_media(path, on_progress, local_mode)],
+            retries
+        )
+    if local_mode and on_progress:
+        on_progress(os.path.getsize(path))
+    return message
+
+
+async def upload_media_group(send: Callable[[List[Union[InputFile, Path]]], Awaitable],
+                             paths: List[str],
+                             on_progress: Optional[Callable[[int], None]] = None,
+                             retries: int = UPLOAD_RETRIES, local_mode: bool = LOCAL_MODE):
+    """
+    Upload beberapa file dalam satu request (``send_media_group``).
+    ``on_progress`` menerima total byte terkirim dari semua file.
+    """
+    sent = [0] * len(paths)
+
+    def tracker(index: int):
+        def report(count: int):
+            sent[index] = count
+            if on_progress:
+                on_progress(sum(sent))
+        return report
+
+    async with get_pipeline().stage('upload'):
+        messages = await _send_with_retry(
+            send,
+            lambda: [_open_media(path, tracker(index), local_mode, attach=True)
+                     for index, path in enumerate(paths)],
+            retries
+        )
+    if local_mode and on_progress:
+        on_progress(sum(os.path.getsize(path) for path in paths))
+    return messages
@@ -3,11 +3,16 @@ Utility functions
 """
 
 import os
+import asyncio
 import logging
+import signal
+import sqlite3
 from datetime import datetime
 from typing import Optional
 import humanize
 
+from config import STATS_DB
+
 # Setup logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -21,11 +26,29 @@ logger = logging.getLogger(__name__)
 
 def ensure_directories():
     """Memastikan semua direktori penting ada"""
-    dirs = ['downloads', 'logs', 'assets']
+    dirs = ['downloads', 'logs', 'assets', 'cache']
     for dir_name in dirs:
         if not os.path.exists(dir_name):
             os.makedirs(dir_name)
 
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """Membuka koneksi SQLite (mode WAL) dan membuat folder jika belum ada"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+async def wait_for_shutdown():
+    """Tunggu sampai proses menerima SIGINT/SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
 def format_size(size_bytes: int) -> str:
     """Format ukuran file menjadi human readable"""
     return humanize.naturalsize(size_bytes)
@@ -37,6 +60,11 @@ def format_duration(seconds: int) -> str:
     else:
         return f"{seconds // 3600}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
 
+def progress_bar(fraction: float, width: int = 10) -> str:
+    """Progress bar teks, mis. ▰▰▰▱▱▱▱▱▱▱"""
+    filled = int(round(max(0.0, min(1.0, fraction)) * width))
+    return '▰' * filled + '▱' * (width - filled)
+
 def is_valid_url(url: str) -> bool:
     """Validasi apakah string adalah URL"""
     import re
@@ -45,6 +73,18 @@ def is_valid_url(url: str) -> bool:
     )
     return bool(url_pattern.match(url))
 
+def extract_urls(text: str) -> list:
+    """Semua URL dalam teks (tanpa duplikat, urutan dipertahankan)"""
+    import re
+    urls = []
+    for url in re.findall(r'https?://[^\s<>"\']+', text):
+        # Tanda baca penutup kalimat (dan kurung yang tidak berpasangan) bukan bagian dari URL
+        url = url.rstrip('.,;:!?')
+        while url.endswith(')') and url.count(')') > url.count('('):
+            url = url[:-1].rstrip('.,;:!?')
+        urls.append(url)
+    return list(dict.fromkeys(urls))
+
 def truncate_text(text: str, max_length: int = 100) -> str:
     """Memotong teks jika terlalu panjang"""
     if len(text) <= max_length:
@@ -63,51 +103,99 @@ def get_platform_icon(platform: str) -> str:
         'pinterest': '📌',
         'soundcloud': '☁️',
         'spotify': '🎧',
+        'batch': '📚',
     }
     return icons.get(platform, '🔗')
 
 class StatsManager:
-    """Manajemen statistik bot"""
+    """Manajemen statistik bot (SQLite WAL, increment atomik)"""
     
-    def __init__(self):
-        self.stats_file = 'logs/stats.txt'
-        self.ensure_file()
+    LEGACY_STATS_FILE = 'logs/stats.txt'
+    LEGACY_USERS_FILE = 'logs/users.txt'
     
-    def ensure_file(self):
-        if not os.path.exists(self.stats_file):
-            with open(self.stats_file, 'w') as f:
-                f.write("0\n0")  # total_downloads, total_users
+    def __init__(self, db_path: str = STATS_DB):
+        self.db = connect_sqlite(db_path)
+        self.ensure_schema()
     
-    def add_download(self):
-        """Menambah counter download"""
-        downloads, users = self.get_stats()
-        with open(self.stats_file, 'w') as f:
-            f.write(f"{downloads + 1}\n{users}")
+    def ensure_schema(self):
+        with self.db:
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS users ('
+                'user_id INTEGER PRIMARY KEY, first_seen REAL NOT NULL)'
+            )
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS counters ('
+                'name TEXT PRIMARY KEY, value INTEGER NOT NULL)'
+            )
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS downloads ('
+                'platform TEXT NOT NULL, download_type TEXT NOT NULL, count INTEGER NOT NULL, '
+                'PRIMARY KEY (platform, download_type))'
+            )
+            created = self.db.execute(
+                "INSERT OR IGNORE INTO counters (name, value) VALUES ('downloads', 0)"
+            ).rowcount
+            self.db.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('users', 0)")
+        if created:
+            self.migrate_legacy_files()
     
-    def add_user(self, user_id: int):
-        """Menambah user unik"""
-        # Simpan user ID di file terpisah
-        users_file = 'logs/users.txt'
-        users = set()
+    def migrate_legacy_files(self):
+        """Impor statistik dari format file teks lama (sekali saja)"""
+        user_ids = set()
+        if os.path.exists(self.LEGACY_USERS_FILE):
+            with open(self.LEGACY_USERS_FILE, 'r') as f:
+                user_ids = {int(line) for line in f.read().splitlines() if line.strip().isdigit()}
+        
+        downloads = 0
+        if os.path.exists(self.LEGACY_STATS_FILE):
+            try:
+                with open(self.LEGACY_STATS_FILE, 'r') as f:
+                    downloads = int(f.read().splitlines()[0])
+            except (ValueError, IndexError):
+                pass
         
-        if os.path.exists(users_file):
-            with open(users_file, 'r') as f:
-                users = set(f.read().splitlines())
+        if not user_ids and not downloads:
+            return
         
-        if str(user_id) not in users:
-            users.add(str(user_id))
-            with open(users_file, 'w') as f:
-                f.write('\n'.join(users))
-            
-            downloads, _ = self.get_stats()
-            with open(self.stats_file, 'w') as f:
-                f.write(f"{downloads}\n{len(users)}")
+        now = datetime.now().timestamp()
+        with self.db:
+            self.db.executemany(
+                'INSERT OR IGNORE INTO users (user_id, first_seen) VALUES (?, ?)',
+                [(user_id, now) for user_id in user_ids]
+            )
+            self.db.execute("UPDATE counters SET value = ? WHERE name = 'users'", (len(user_ids),))
+            self.db.execute("UPDATE counters SET value = ? WHERE name = 'downloads'", (downloads,))
+        logger.info(f"Statistik lama diimpor: {downloads} download, {len(user_ids)} user")
+    
+    def add_download(self, platform: str = 'unknown', download_type: str = 'video'):
+        """Menambah counter download (total dan per platform/tipe)"""
+        with self.db:
+            self.db.execute("UPDATE counters SET value = value + 1 WHERE name = 'downloads'")
+            self.db.execute(
+                'INSERT INTO downloads (platform, download_type, count) VALUES (?, ?, 1) '
+                'ON CONFLICT (platform, download_type) DO UPDATE SET count = count + 1',
+                (platform or 'unknown', download_type)
+            )
+    
+    def add_user(self, user_id: int):
+        """Menambah user unik"""
+        with self.db:
+            inserted = self.db.execute(
+                'INSERT OR IGNORE INTO users (user_id, first_seen) VALUES (?, ?)',
+                (user_id, datetime.now().timestamp())
+            ).rowcount
+            if inserted:
+                self.db.execute("UPDATE counters SET value = value + 1 WHERE name = 'users'")
     
     def get_stats(self) -> tuple:
-        """Mendapatkan statistik"""
-        try:
-            with open(self.stats_file, 'r') as f:
-                lines = f.read().splitlines()
-                return int(lines[0]), int(lines[1])
-        except:
-            return 0, 0
\ No newline at end of file
+        """Mendapatkan statistik (total_downloads, total_users)"""
+        counters = dict(self.db.execute(
+            "SELECT name, value FROM counters WHERE name IN ('downloads', 'users')"
+        ).fetchall())
+        return counters.get('downloads', 0), counters.get('users', 0)
+    
+    def get_download_breakdown(self) -> list:
+        """Jumlah download per (platform, tipe), terbanyak dulu"""
+        return self.db.execute(
+            'SELECT platform, download_type, count FROM downloads ORDER BY count DESC'
+        ).fetchall()
@@ -0,0 +1,70 @@
+"""
+Mode webhook: server aiohttp yang menerima update Telegram
+"""
+
+import hmac
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from config import WEBHOOK_LISTEN, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL
+from utils import logger, wait_for_shutdown
+
+
+def build_webhook_app(application: Application) -> web.Application:
+    """
+    Aplikasi aiohttp dengan endpoint webhook dan health check.
+    Update langsung dimasukkan ke update_queue PTB, sehingga respon ke
+    Telegram tidak menunggu handler selesai.
+    """
+
+    async def telegram_update(request: web.Request) -> web.Response:
+        token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if WEBHOOK_SECRET and not hmac.compare_digest(token, WEBHOOK_SECRET):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except ValueError:
+            return web.Response(status=400)
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({
+            'status': 'ok' if application.running else 'starting',
+            'pending_updates': application.update_queue.qsize(),
+        })
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, telegram_update)
+    app.router.add_get('/healthz', health)
+    return app
+
+
+async def serve_webhook(application: Application):
+    """Jalankan bot dalam mode webhook sampai menerima SIGINT/SIGTERM"""
+    runner = web.AppRunner(build_webhook_app(application))
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        await application.bot.set_webhook(
+            url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        await application.start()
+
+        await runner.setup()
+        await web.TCPSite(runner, WEBHOOK_LISTEN, WEBHOOK_PORT).start()
+        logger.info(f"Webhook aktif di {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        await wait_for_shutdown()
+    finally:
+        # Urutan sama dengan run_polling PTB: stop, shutdown, baru post_shutdown
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,174 @@
+"""
+Pool instance yt-dlp per profil opsi (info, video, audio, tiktok)
+
+Jalankan ``python ydlpool.py`` untuk micro-benchmark overhead per request.
+"""
+
+import contextlib
+import threading
+from typing import Dict, Iterator, List, Optional
+
+import yt_dlp
+
+from config import BATCH_MAX_ITEMS, FIT_SOURCE_MAX_SIZE, MAX_VIDEO_DURATION, YDL_POOL_IDLE
+
+# Opsi dasar tiap profil; opsi per job (format, outtmpl, hook) dipasang saat checkout.
+# 'playlist' hanya membaca daftar entry (extract_flat), tanpa ekstraksi tiap video
+PROFILES: Dict[str, Dict] = {
+    'info': {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': False,
+    },
+    'playlist': {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': 'in_playlist',
+        'playlistend': BATCH_MAX_ITEMS,
+    },
+    'video': {
+        'quiet': True,
+        'no_warnings': True,
+        'merge_output_format': 'mp4',
+    },
+    # Track audio didownload apa adanya; remux/encode dilakukan transcode.MediaProcessor
+    'audio': {
+        'quiet': True,
+        'no_warnings': True,
+    },
+    'tiktok': {
+        'quiet': True,
+        'no_warnings': True,
+        'cookiesfrombrowser': None,  # Bisa ditambahkan cookies jika perlu
+    },
+}
+
+# Batas keras ukuran dan durasi (jaring pengaman setelah planner), untuk profil download.
+# File sampai FIT_SOURCE_MAX_SIZE masih boleh didownload untuk diperkecil sesudahnya
+LIMIT_OPTS = {
+    'max_filesize': FIT_SOURCE_MAX_SIZE,
+    'match_filter': yt_dlp.utils.match_filter_func(f'duration <=? {MAX_VIDEO_DURATION}'),
+}
+
+
+class YoutubeDLPool:
+    """
+    Menyimpan instance ``YoutubeDL`` yang sudah jadi (extractor, cookie jar
+    dan koneksi HTTP keep-alive tetap hangat) per profil opsi.
+
+    ``checkout`` meminjamkan satu instance secara eksklusif untuk satu job;
+    opsi per job dipasang saat dipinjam dan dikembalikan ke opsi profil
+    saat dilepas. Instance yang dipakai job yang gagal dibuang, bukan
+    dikembalikan, agar state setengah jalan tidak terbawa ke job lain.
+    """
+
+    def __init__(self, max_idle: int = YDL_POOL_IDLE):
+        self.max_idle = max_idle
+        self.created = 0
+        self.reused = 0
+        self._idle: Dict[str, List[yt_dlp.YoutubeDL]] = {profile: [] for profile in PROFILES}
+        self._base: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _create(self, profile: str) -> yt_dlp.YoutubeDL:
+        options = dict(PROFILES[profile])
+        if profile not in ('info', 'playlist'):
+            options.update(LIMIT_OPTS)
+        ydl = yt_dlp.YoutubeDL(options)
+        self._base[id(ydl)] = dict(ydl.params)
+        self.created += 1
+        return ydl
+
+    @contextlib.contextmanager
+    def checkout(self, profile: str, format: Optional[str] = None, outtmpl: Optional[str] = None,
+                 progress_hooks: Optional[List] = None,
+                 postprocessor_hooks: Optional[List] = None) -> Iterator[yt_dlp.YoutubeDL]:
+        """Pinjam instance ``profile`` yang sudah diatur untuk satu job"""
+        with self._lock:
+            idle = self._idle[profile]
+            ydl = idle.pop() if idle else None
+            if ydl is not None:
+                self.reused += 1
+        if ydl is None:
+            ydl = self._create(profile)
+
+        if format is not None:
+            ydl.params['format'] = format
+            ydl.format_selector = ydl.build_format_selector(format)
+        if outtmpl is not None:
+            ydl.params['outtmpl'] = {'default': outtmpl}
+            ydl._parse_outtmpl()
+        ydl._progress_hooks = list(progress_hooks or [])
+        ydl._postprocessor_hooks = list(postprocessor_hooks or [])
+
+        try:
+            yield ydl
+        except BaseException:
+            self._discard(ydl)
+            raise
+        self._release(profile, ydl)
+
+    def _release(self, profile: str, ydl: yt_dlp.YoutubeDL):
+        # Kembalikan ke opsi profil
+        ydl.params.clear()
+        ydl.params.update(self._base[id(ydl)])
+        ydl.format_selector = (
+            ydl.build_format_selector(ydl.params['format']) if ydl.params.get('format') else None
+        )
+        ydl._progress_hooks = []
+        ydl._postprocessor_hooks = []
+        with self._lock:
+            if len(self._idle[profile]) < self.max_idle:
+                self._idle[profile].append(ydl)
+                return
+        self._discard(ydl)
+
+    def _discard(self, ydl: yt_dlp.YoutubeDL):
+        self._base.pop(id(ydl), None)
+        with contextlib.suppress(Exception):
+            ydl.close()
+
+    def idle(self) -> int:
+        """Jumlah instance yang siap dipakai"""
+        with self._lock:
+            return sum(len(instances) for instances in self._idle.values())
+
+
+_pool: Optional[YoutubeDLPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> YoutubeDLPool:
+    """Pool per proses (worker process membuat instance sendiri)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = YoutubeDLPool()
+        return _pool
+
+
+if __name__ == '__main__':
+    import time
+
+    def bench(label: str, run, rounds: int = 50):
+        run()  # pemanasan (import extractor lazy, dll.)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            run()
+        elapsed = (time.perf_counter() - started) / rounds
+        print(f"{label:<28} {elapsed * 1000:8.2f} ms/request")
+
+    def fresh():
+        options = dict(PROFILES['video'], **LIMIT_OPTS, format='best', outtmpl='bench.%(ext)s')
+        with yt_dlp.YoutubeDL(options):
+            pass
+
+    pool = YoutubeDLPool()
+
+    def pooled():
+        with pool.checkout('video', format='best', outtmpl='bench.%(ext)s'):
+            pass
+
+    print("Overhead setup YoutubeDL per request (tanpa jaringan):")
+    bench("YoutubeDL baru tiap request", fresh)
+    bench("YoutubeDLPool.checkout", pooled)